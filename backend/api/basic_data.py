@@ -1,50 +1,100 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, conint
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 
-from db import get_db
+from cache import cached
+from db import DbSession, fetch_all, fetch_one, get_db
+from formats import formatted, response_format
+from gazetteer import gazetteer
 
 app = APIRouter()
 
 ### Additional endpoints for distinct area names
+# served from the region gazetteer (see gazetteer.py); the SQL only runs until it has loaded
 
-@app.get("/distinct_sa2", response_model=List[str])
-def get_distinct_sa2(db: Session = Depends(get_db)):
-    result = db.execute(text("""
-        SELECT DISTINCT sa2_name21
-        FROM mesh_block_vic_21
-        WHERE sa2_name21 IS NOT NULL
-        ORDER BY sa2_name21
-    """)).fetchall()
+# the same regions the gazetteer loads (sa_region), so both paths list the same names
+DISTINCT_NAME_SQL = """
+    SELECT DISTINCT sa_name
+    FROM sa_region
+    WHERE sa_level = :sa_level
+    ORDER BY sa_name
+"""
+
+async def distinct_names(db: DbSession, sa_level: str) -> List[str]:
+    if gazetteer.ready:
+        return gazetteer.names(sa_level)
+    result = await fetch_all(db, text(DISTINCT_NAME_SQL), {"sa_level": sa_level})
     return [row[0] for row in result]
 
+@app.get("/distinct_sa2", response_model=List[str])
+@cached
+async def get_distinct_sa2(db: DbSession = Depends(get_db)):
+    return await distinct_names(db, "sa2")
+
 @app.get("/distinct_sa3", response_model=List[str])
-def get_distinct_sa3(db: Session = Depends(get_db)):
-    result = db.execute(text("""
-        SELECT DISTINCT sa3_name21
-        FROM mesh_block_vic_21
-        WHERE sa3_name21 IS NOT NULL
-        ORDER BY sa3_name21
-    """)).fetchall()
-    return [row[0] for row in result]
+@cached
+async def get_distinct_sa3(db: DbSession = Depends(get_db)):
+    return await distinct_names(db, "sa3")
 
 @app.get("/distinct_sa4", response_model=List[str])
-def get_distinct_sa4(db: Session = Depends(get_db)):
-    result = db.execute(text("""
-        SELECT DISTINCT sa4_name21
-        FROM mesh_block_vic_21
-        WHERE sa4_name21 IS NOT NULL
-        ORDER BY sa4_name21
-    """)).fetchall()
-    return [row[0] for row in result]
+@cached
+async def get_distinct_sa4(db: DbSession = Depends(get_db)):
+    return await distinct_names(db, "sa4")
 
 @app.get('/max_accident_date', response_model=str)
-def get_max_accident_date(db: Session = Depends(get_db)):
-    result = db.execute(text("""
-        SELECT MAX(accident_date) FROM accident
-    """)).fetchone()
-    return result[0].isoformat() if result and result[0] else None
+@cached
+async def get_max_accident_date(db: DbSession = Depends(get_db)):
+    if gazetteer.ready:
+        max_date = gazetteer.max_accident_date()
+    else:
+        result = await fetch_one(db, text("""
+            SELECT MAX(accident_date) FROM accident
+        """))
+        max_date = result[0] if result else None
+    return max_date.isoformat() if max_date else None
+
+### Region search / hierarchy (autocomplete)
+
+class RegionMatch(BaseModel):
+    sa_level: Literal["sa2", "sa3", "sa4"]
+    sa_code: int
+    sa_name: str
+    sa3_name: Optional[str] = None  # parents, for telling same-named regions apart
+    sa4_name: Optional[str] = None
+    match: Literal["prefix", "word", "fuzzy"]
+
+class RegionHierarchy(BaseModel):
+    sa_level: Literal["sa2", "sa3", "sa4"]
+    sa_code: int
+    sa_name: str
+    sa3_name: Optional[str] = None
+    sa4_name: Optional[str] = None
+    children: Dict[str, List[str]]  # smaller level -> names inside this region
+
+def require_gazetteer():
+    if not gazetteer.ready:
+        raise HTTPException(status_code=503, detail="Region lookups are not loaded yet")
+
+@app.get("/regions/search", response_model=List[RegionMatch])
+async def search_regions(
+    q: str = Query(..., min_length=1, max_length=100),
+    levels: Optional[List[Literal["sa2", "sa3", "sa4"]]] = Query(default=None),
+    limit: conint(ge=1, le=50) = 10,
+):
+    require_gazetteer()
+    return gazetteer.search(q, levels, limit)
+
+@app.get("/regions/hierarchy", response_model=RegionHierarchy)
+async def get_region_hierarchy(
+    sa_level: Literal["sa2", "sa3", "sa4"],
+    sa_name: str,
+):
+    require_gazetteer()
+    region = gazetteer.get(sa_level, sa_name)
+    if region is None:
+        raise HTTPException(status_code=404, detail=f"Unknown {sa_level} region: {sa_name}")
+    return {**region, "children": gazetteer.children(sa_level, sa_name)}
 
 VALID_ROAD_TYPES = [
     "commerical_and_civic",
@@ -55,10 +105,16 @@ VALID_ROAD_TYPES = [
 ]
 
 @app.get("/roads_by_region")
-def get_roads_by_region(
-    sa2_name: str,
+@formatted()
+@cached
+async def get_roads_by_region(
+    sa2_name: Optional[str] = None,
+    sa3_name: Optional[str] = None,
     road_types: Optional[List[str]] = Query(default=None),
-    db: Session = Depends(get_db)
+    limit: Optional[conint(ge=1, le=1000)] = None,
+    offset: conint(ge=0) = 0,
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db)
 ):
     # Mapping of road_type to frontend labels
     ROAD_TYPE_LABELS = {
@@ -72,41 +128,53 @@ def get_roads_by_region(
         "-NULL-": "Unclassified"
     }
 
+    if bool(sa2_name) == bool(sa3_name):
+        raise HTTPException(status_code=400, detail="Give exactly one of sa2_name and sa3_name")
+
     # Validate road_types
     if road_types:
         invalid = [rt for rt in road_types if rt not in ROAD_TYPE_LABELS]
         if invalid:
             return {"error": f"Invalid road_types: {invalid}"}
 
-    # Build dynamic SQL
-    region_column = "vr.sa2_name21"  # fixed at SA2 for now
-    
-    if road_types:
-        quoted_types = ",".join(f"'{rt}'" for rt in road_types)
-        road_type_filter = f"AND vr.h_road_type IN ({quoted_types})"
+    # Roads come precomputed per SA2 from road_summary (see data/final_db_updates.sql) - an SA3
+    # adds up its SA2s. Names are matched on their indexed keys (see data/name_key.sql)
+    if sa2_name:
+        query = """
+            SELECT rs.road_name, rs.h_road_type, rs.length_km AS road_length_km, rs.segments
+            FROM road_summary rs
+            WHERE rs.sa2_key = name_key(:region_name)
+        """
     else:
-        road_type_filter = ""
-
-    query = f"""
-        SELECT DISTINCT vr.ezirdnmlbl AS road_name,
-                        vr.h_road_type,
-                        ST_Length(ST_Union(vr.geom)::geography)/1000 AS road_length_km
-        FROM vicmap_road vr
-        WHERE LOWER({region_column}) = LOWER(:region_name)
-        AND vr.h_road_type IS NOT NULL
-        {road_type_filter}
-        GROUP BY vr.ezirdnmlbl, vr.h_road_type
-        ORDER BY ST_Length(ST_Union(vr.geom)::geography)/1000 DESC;
-    """
-
-    result = db.execute(text(query), {"region_name": sa2_name}).fetchall()
+        query = """
+            SELECT rs.road_name, rs.h_road_type, SUM(rs.length_km) AS road_length_km, SUM(rs.segments) AS segments
+            FROM road_summary rs
+            WHERE rs.sa3_key = name_key(:region_name)
+        """
+    if road_types:
+        query += " AND rs.h_road_type = ANY(:road_types)"
+    if sa3_name:
+        query += " GROUP BY rs.road_name, rs.h_road_type"
+    # road name as tie-breaker, so pages don't overlap
+    query += " ORDER BY road_length_km DESC, rs.road_name, rs.h_road_type"
+    if limit:
+        query += " LIMIT :limit"
+    if offset:
+        query += " OFFSET :offset"
+
+    result = await fetch_all(db, text(query), {
+        "region_name": sa2_name or sa3_name,
+        "road_types": road_types,
+        "limit": limit,
+        "offset": offset,
+    })
 
     return [
         {
             "road_name": row[0],
             "road_type": ROAD_TYPE_LABELS.get(row[1], row[1]),
-            "road_length_km": round(row[2], 2) if row[2] else None
+            "road_length_km": round(row[2], 2) if row[2] else None,
+            "segment_count": row[3]
         }
         for row in result
     ]
-
@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy import text
-from sqlalchemy.orm import Session
 from typing import Optional, Literal, List
 from datetime import date, time
-from db import get_db
+from cache import cached
+from db import DbSession, fetch_all, get_db
+from formats import formatted, geometry_sql, response_format
 
 router = APIRouter()
 
 @router.get("/corridor_crash_density")
-def get_corridor_crash_density(
+@formatted(geometry="segment_geom_wkt")
+@cached
+async def get_corridor_crash_density(
     region_level: Literal["sa2", "sa3"],
     region_name: str,
     road_name: str,
@@ -19,7 +22,8 @@ def get_corridor_crash_density(
     order_by: Literal["density", "count"] = "density",
     order_dir_asc: bool = False,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db)
 ):
     # Mapping of segment_type to frontend labels
     SEGMENT_LABELS = {
@@ -34,8 +38,8 @@ def get_corridor_crash_density(
         "tunnel": "Tunnel"
     }
 
-    # Build dynamic filters
-    region_column = f"vr.{region_level}_name21"
+    # Build dynamic filters - names are matched on their indexed keys (see data/name_key.sql)
+    region_column = f"vr.{region_level}_key"
     time_filter = ""
     if start_time and end_time:
         time_filter = "AND a.accident_time BETWEEN :start_time AND :end_time"
@@ -45,14 +49,16 @@ def get_corridor_crash_density(
 
     query = f"""
         WITH road_segments_in_sax AS (
-            SELECT vr.geom,
-                   ST_Length(vr.geom::geography)/1000 AS seg_length_km,
+            SELECT vr.ogc_fid AS seg_id,
+                   vr.geom,
+                   ST_Length(vr.geom_vg)/1000 AS seg_length_km,
                    vr.ezirdnmlbl AS road_name,
                    vr.ftype_code AS seg_type
             FROM vicmap_road vr
-            WHERE LOWER({region_column}) = LOWER(:region_name)
-              AND LOWER(vr.ezirdnmlbl) = LOWER(:road_name)
+            WHERE {region_column} = name_key(:region_name)
+              AND vr.road_key = name_key(:road_name)
         ),
+        -- accidents are pre-snapped to their nearest segment (see data/accident_road_snap.sql)
         acc_in_rs AS (
             SELECT a.geom AS acc_geom,
                    a.accident_no,
@@ -62,13 +68,14 @@ def get_corridor_crash_density(
                    rs.road_name,
                    rs.seg_length_km,
                    rs.seg_type
-            FROM accident a
-            JOIN road_segments_in_sax rs
-              ON ST_DWithin(a.geom::geography, rs.geom::geography, 10)
-            WHERE a.accident_date BETWEEN :start_date AND :end_date
+            FROM road_segments_in_sax rs
+            JOIN accident_road_snap snap ON snap.road_seg_id = rs.seg_id
+            JOIN accident a ON a.accident_no = snap.accident_no
+            WHERE snap.distance_m <= 10
+              AND a.accident_date BETWEEN :start_date AND :end_date
               {time_filter}
         )
-        SELECT ST_AsText(a.rs_geom) rs_geom,
+        SELECT {geometry_sql('a.rs_geom', fmt)} rs_geom,
                a.road_name,
                a.seg_type,
                COUNT(a.accident_no) AS num_accs,
@@ -90,7 +97,7 @@ def get_corridor_crash_density(
         params["start_time"] = start_time
         params["end_time"] = end_time
 
-    result = db.execute(text(query), params).fetchall()
+    result = await fetch_all(db, text(query), params)
 
     return [
         {
@@ -105,7 +112,9 @@ def get_corridor_crash_density(
 
 
 @router.get("/blackspot_crash_density")
-def get_blackspot_crash_density(
+@formatted(geometry="structure_geom_wkt")
+@cached
+async def get_blackspot_crash_density(
     region_level: Literal["sa2", "sa3"],
     region_name: str,
     road_name: str,
@@ -116,7 +125,8 @@ def get_blackspot_crash_density(
     structure_types: Optional[List[str]] = Query(default=None),
     order_dir_asc: bool = False,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db)
 ):
     # Mapping of structure_type to frontend labels
     STRUCTURE_LABELS = {
@@ -136,8 +146,8 @@ def get_blackspot_crash_density(
         "tunnel": "Tunnel"
     }
 
-    # Dynamic region column
-    region_column = f"vr.{region_level}_name21"
+    # Dynamic region column (indexed name key, see data/name_key.sql)
+    region_column = f"vr.{region_level}_key"
 
     # Optional filters
     time_filter = ""
@@ -154,26 +164,28 @@ def get_blackspot_crash_density(
     query = f"""
         WITH road AS (
             SELECT ST_Union(vr.geom) AS geom,
+                   ST_Union(vr.geom_vg) AS geom_vg,
                    vr.ezirdnmlbl AS road_name
             FROM vicmap_road vr
-            WHERE LOWER(vr.ezirdnmlbl) = LOWER(:road_name)
-              AND LOWER({region_column}) = LOWER(:region_name)
+            WHERE vr.road_key = name_key(:road_name)
+              AND {region_column} = name_key(:region_name)
             GROUP BY vr.ezirdnmlbl
         ),
         rs_in_road AS (
             SELECT vrs.geom,
+                   vrs.geom_vg,
                    vrs.ftype_code AS struct_type,
                    road.road_name
             FROM vicmap_road_structures vrs
-            JOIN road ON ST_DWithin(vrs.geom::geography, road.geom::geography, 5)
+            JOIN road ON ST_DWithin(vrs.geom_vg, road.geom_vg, 5)
             {struct_type_filter}
         )
         SELECT COUNT(a.accident_no) AS num_accidents,
-               ST_AsText(rs.geom) AS rs_geom,
+               {geometry_sql('rs.geom', fmt)} AS rs_geom,
                rs.road_name,
                rs.struct_type
         FROM accident a
-        JOIN rs_in_road rs ON ST_DWithin(a.geom::geography, rs.geom::geography, 10)
+        JOIN rs_in_road rs ON ST_DWithin(a.geom_vg, rs.geom_vg, 10)
         WHERE a.accident_date BETWEEN :start_date AND :end_date
         {time_filter}
         GROUP BY rs_geom, rs.road_name, rs.struct_type
@@ -192,7 +204,7 @@ def get_blackspot_crash_density(
         params["start_time"] = start_time
         params["end_time"] = end_time
 
-    result = db.execute(text(query), params).fetchall()
+    result = await fetch_all(db, text(query), params)
 
     return [
         {
@@ -1,19 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
-from db import get_db
+from cache import cached
+from db import DbSession, fetch_all, get_db
+from formats import formatted, response_format
+from memory_engine import memory_engine
 
 app = APIRouter()
 
-def build_sql(source: str, sax_level_name: str, sax_name: str, category_expr: str, table: str, joins: str = "", filters: str = "") -> str:
+def build_sql(source: str, sa_level: str, category_expr: str, table: str, joins: str = "", filters: str = "") -> str:
+    # region is bound via :sa_level / :sa_name and matched on the accident's precomputed region code
     return f"""
         WITH sax AS (
-            select st_union(mbv.geom ) geom
-            from mesh_block_vic_21 mbv
-            where lower(mbv.{sax_level_name}) = lower('{sax_name}') -- param, required and no default value
+            select s.sa_code
+            from sa_region s
+            where s.sa_level = :sa_level
+              and s.sa_key = name_key(:sa_name) -- param, required and no default value
         ),
         {source}_prepared AS (
           SELECT
@@ -26,7 +30,7 @@ def build_sql(source: str, sax_level_name: str, sax_name: str, category_expr: st
             {category_expr} AS category
           FROM {table}
           {joins}
-          JOIN sax ON st_contains(sax.geom, a.geom)
+          JOIN sax ON sax.sa_code = a.{sa_level}_code21
           WHERE a.severity IN ('Other injury accident', 'Serious injury accident')
           {filters}
         )
@@ -135,113 +139,165 @@ class FactorCountItem(BaseModel):
     severity: str
     count: int
 
-ORDER_CASES = {
-    "time_bucket": """
-        CASE category
-          WHEN 'Late Night' THEN 1
-          WHEN 'Morning'    THEN 2
-          WHEN 'Afternoon'  THEN 3
-          WHEN 'Evening'    THEN 4
-          ELSE 99
-        END
-    """,
-    "light_condition": """
-        CASE category
-          WHEN 'Day'                      THEN 1
-          WHEN 'Dusk/Dawn'                THEN 2
-          WHEN 'Dark Street light on'     THEN 3
-          WHEN 'Dark Street light off'    THEN 4
-          WHEN 'Dark Street light unknown' THEN 5
-          WHEN 'Dark No street lights'    THEN 6
-          ELSE 99
-        END
-    """,
-    "road_geometry": """
-        CASE category
-          WHEN 'Cross intersection'    THEN 1
-          WHEN 'Not at intersection'   THEN 2
-          WHEN 'Y intersection'        THEN 3
-          WHEN 'T intersection'        THEN 4
-          WHEN 'Multiple intersection' THEN 5
-          WHEN 'Private property'      THEN 6
-          WHEN 'Dead end'              THEN 7
-          WHEN 'Road closure'          THEN 8
-          ELSE 99
-        END
-    """,
-    "speed_zone": """
-        CASE category
-          WHEN 'below 40'  THEN 1
-          WHEN '50 to 60'  THEN 2
-          WHEN '70 to 80'  THEN 3
-          WHEN '80 to 90'  THEN 4
-          WHEN 'above 100' THEN 5
-          ELSE 99
-        END
-    """,
-    "atmospheric_condition": """
-        CASE category
-          WHEN 'Clear'        THEN 1
-          WHEN 'Fog'          THEN 2
-          WHEN 'Snowing'      THEN 3
-          WHEN 'Smoke'        THEN 4
-          WHEN 'Raining'      THEN 5
-          WHEN 'Strong winds' THEN 6
-          WHEN 'Dust'         THEN 7
-          ELSE 99
-        END
-    """,
-    "sex": """
-        CASE category
-          WHEN 'M' THEN 1
-          WHEN 'F' THEN 2
-          ELSE 99
-        END
-    """,
-    "age_group": """
-        CASE category
-          WHEN '0-17' THEN 1
-          WHEN '18-25' THEN 2
-          WHEN '26-39' THEN 3
-          WHEN '40-59' THEN 4
-          WHEN '60-69' THEN 5
-          WHEN '70+'   THEN 6
-          ELSE 99
-        END
-    """,
-    "helmet_belt_worn": """
+# display order of each factor's categories - anything not listed sorts last
+CATEGORY_ORDER = {
+    "time_bucket": ["Late Night", "Morning", "Afternoon", "Evening"],
+    "light_condition": [
+        "Day", "Dusk/Dawn", "Dark Street light on", "Dark Street light off",
+        "Dark Street light unknown", "Dark No street lights"
+    ],
+    "road_geometry": [
+        "Cross intersection", "Not at intersection", "Y intersection", "T intersection",
+        "Multiple intersection", "Private property", "Dead end", "Road closure"
+    ],
+    "speed_zone": ["below 40", "50 to 60", "70 to 80", "80 to 90", "above 100"],
+    "atmospheric_condition": ["Clear", "Fog", "Snowing", "Smoke", "Raining", "Strong winds", "Dust"],
+    "sex": ["M", "F"],
+    "age_group": ["0-17", "18-25", "26-39", "40-59", "60-69", "70+"],
+    "helmet_belt_worn": ["worn", "not worn"]
+}
+
+def order_case(categories: List[str]) -> str:
+    whens = "\n".join(f"          WHEN '{c}' THEN {i}" for i, c in enumerate(categories, start=1))
+    return f"""
         CASE category
-          WHEN 'worn'     THEN 1
-          WHEN 'not worn' THEN 2
+{whens}
           ELSE 99
         END
     """
-}
+
+ORDER_CASES = {factor: order_case(categories) for factor, categories in CATEGORY_ORDER.items()}
+
+def category_sql(factor: str) -> str:
+    # category expression with the factor's filters folded in (NULL when a row is filtered out)
+    config = FACTOR_SQL_CONFIG[factor]
+    return f"CASE WHEN TRUE {config.get('filters', '')} THEN {config['category_expr']} END"
+
+def factor_groups(factors: List[str]) -> Dict[tuple, List[str]]:
+    # factors living on the same (table, joins) can be counted in one scan
+    groups: Dict[tuple, List[str]] = {}
+    for factor in factors:
+        config = FACTOR_SQL_CONFIG[factor]
+        groups.setdefault((config["table"], config.get("joins", "")), []).append(factor)
+    return groups
+
+def build_profile_sql(sa_level: str, factors: List[str], table: str, joins: str = "") -> str:
+    # every factor of one (table, joins) group counted in a single scan, one grouping set per factor
+    categories = ",\n            ".join(f"{category_sql(f)} AS c{i}" for i, f in enumerate(factors))
+    grouping_sets = ", ".join(f"(c{i}, severity)" for i in range(len(factors)))
+    factor_case = "\n".join(
+        f"              WHEN GROUPING(c{i}) = 0 THEN '{f}'" for i, f in enumerate(factors)
+    )
+    coalesced = ", ".join(f"c{i}" for i in range(len(factors)))
+    return f"""
+        WITH sax AS (
+            select s.sa_code
+            from sa_region s
+            where s.sa_level = :sa_level
+              and s.sa_key = name_key(:sa_name)
+        ),
+        prepared AS (
+          SELECT
+            CASE
+              WHEN a.severity = 'Other injury accident' THEN 'Injury'
+              WHEN a.severity = 'Serious injury accident' THEN 'SeriousInjury'
+            END AS severity,
+            {categories}
+          FROM {table}
+          {joins}
+          JOIN sax ON sax.sa_code = a.{sa_level}_code21
+          WHERE a.severity IN ('Other injury accident', 'Serious injury accident')
+        )
+        SELECT
+            CASE
+{factor_case}
+            END AS factor,
+            COALESCE({coalesced}) AS category,
+            severity,
+            COUNT(*) AS count
+        FROM prepared
+        GROUP BY GROUPING SETS ({grouping_sets})
+        HAVING COALESCE({coalesced}) IS NOT NULL;
+    """
+
+def category_rank(factor: str, category: str) -> int:
+    order = CATEGORY_ORDER[factor]
+    return order.index(category) if category in order else len(order)
 
 VALID_FACTORS = set(ORDER_CASES.keys())
+VALID_SA_LEVELS = {"sa2", "sa3", "sa4"}
 
 @app.get("/factor_counts", response_model=List[FactorCountItem])
-def get_factor_counts(
+@formatted()
+@cached
+async def get_factor_counts(
     factor: str = Query(..., description="factor: time_bucket | light_condition | road_geometry | speed_zone | atmospheric_condition | sex | age_group | helmet_belt_worn"),
     sa_level: str = Query(..., description="SA region level : sa2 | sa3 | sa4"),
     sa_name: str = Query(..., description="SA2/3/4 region name - supplied value must be something from one of the /distinct_saX endpoints"),
-    db: Session = Depends(get_db),
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db),
 ):
     if factor not in VALID_FACTORS:
         raise HTTPException(status_code=400, detail=f"Invalid factor: {factor}")
 
+    sa_level = sa_level.lower()
+    if sa_level not in VALID_SA_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Invalid sa_level: {sa_level}")
+
+    if memory_engine.ready:
+        return memory_engine.factor_counts(factor, sa_level, sa_name)
+
     config = FACTOR_SQL_CONFIG[factor]
     order_by = ORDER_CASES[factor]
 
     sql = build_sql(
         source = config["source"],
-        sax_level_name = sa_level.lower() + '_name21',
-        sax_name = sa_name,
+        sa_level = sa_level,
         category_expr = config["category_expr"],
         table=config["table"],
         joins=config.get("joins", ""),
         filters=config.get("filters", "")
     ).format(order_by=order_by)
 
-    rows = db.execute(text(sql)).fetchall()
-    return [dict(r._mapping) for r in rows]
\ No newline at end of file
+    rows = await fetch_all(db, text(sql), {"sa_level": sa_level, "sa_name": sa_name})
+    return [dict(r._mapping) for r in rows]
+
+def profile_rows(profile: Dict[str, List[dict]]) -> List[dict]:
+    """A factor profile as one flat list of rows (with a `factor` column), for the non-JSON formats."""
+    return [{"factor": factor, **item} for factor, items in profile.items() for item in items]
+
+@app.get("/factor_profile", response_model=Dict[str, List[FactorCountItem]])
+@formatted()
+@cached
+async def get_factor_profile(
+    sa_level: str = Query(..., description="SA region level : sa2 | sa3 | sa4"),
+    sa_name: str = Query(..., description="SA2/3/4 region name - supplied value must be something from one of the /distinct_saX endpoints"),
+    factors: Optional[List[str]] = Query(default=None, description="factors to include - all of them by default"),
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db),
+):
+    # every factor's /factor_counts for a region in one response - one query per base table
+    # instead of one per factor. JSON keys the items by factor, the other formats are flat rows
+    factors = list(dict.fromkeys(factors or FACTOR_SQL_CONFIG))  # a factor asked for twice is counted once
+    invalid = [f for f in factors if f not in VALID_FACTORS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid factors: {invalid}")
+
+    sa_level = sa_level.lower()
+    if sa_level not in VALID_SA_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Invalid sa_level: {sa_level}")
+
+    if memory_engine.ready:
+        profile = {f: memory_engine.factor_counts(f, sa_level, sa_name) for f in factors}
+        return profile if fmt == "json" else profile_rows(profile)
+
+    profile: Dict[str, List[dict]] = {f: [] for f in factors}
+    params = {"sa_level": sa_level, "sa_name": sa_name}
+    for (table, joins), group in factor_groups(factors).items():
+        rows = await fetch_all(db, text(build_profile_sql(sa_level, group, table, joins)), params)
+        for factor, category, severity, count in rows:
+            profile[factor].append({"category": category, "severity": severity, "count": count})
+
+    for factor, items in profile.items():
+        items.sort(key=lambda item: (category_rank(factor, item["category"]), item["severity"]))
+    return profile if fmt == "json" else profile_rows(profile)
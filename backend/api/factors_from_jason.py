@@ -5,6 +5,7 @@ from typing import List
 from pydantic import BaseModel
 
 from db import get_db
+from memory_engine import memory_engine
 
 app = APIRouter()
 
@@ -106,6 +107,9 @@ def get_factor_counts(
     if factor not in VALID_FACTORS:
         raise HTTPException(status_code=400, detail=f"Invalid factor: {factor}")
 
+    if memory_engine.ready:
+        return memory_engine.factor_counts(factor)
+
     order_by = ORDER_CASES[factor]
 
     # --- Accident-based factors ---
@@ -0,0 +1,342 @@
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from pydantic import confloat, conint
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional, Tuple
+from datetime import date, time, timedelta
+
+import kde
+from api.stats_trends import AtmosphericCondition, Severity, SpeedZone
+from cache import cached
+from db import DbSession, fetch_all, get_db
+from formats import formatted, geometry_sql, response_format
+
+app = APIRouter()
+
+## heatmap grid endpoint
+# Crash counts on a square grid in GDA2020 / Vicgrid metres (EPSG 7899). The coarse cell sizes are
+# rolled up per month in crash_grid (see data/crash_grid.sql): a request sums the whole months of its
+# date range from there and only counts the partial months at either end from accident. Finer
+# cells and time-of-day filters (not in the rollup) are counted from accident on request.
+
+CELL_SIZES = [250, 500, 1000, 2000, 5000, 10000, 20000]  # metres
+PREAGGREGATED_CELLS = {5000, 10000, 20000}  # keep in sync with data/crash_grid.sql
+
+def cell_for_zoom(zoom: int) -> int:
+    # roughly 20 screen pixels per cell at Victoria's latitude
+    if zoom >= 13:
+        return 250
+    if zoom <= 7:
+        return 20000
+    return {8: 10000, 9: 5000, 10: 2000, 11: 1000, 12: 500}[zoom]
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+def next_month(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+MAX_LATITUDE = 85.0511  # degrees - web mercator's limit, the density rasters are laid out in it
+
+DateRange = Tuple[Optional[date], Optional[date]]  # None = unbounded
+
+def split_months(start_date: Optional[date], end_date: Optional[date]) -> Tuple[Optional[DateRange], List[DateRange]]:
+    """
+    The whole months inside [start_date, end_date] as month starts [month_from, month_until) - None
+    if there is no whole month - and the day ranges left over at either end.
+    """
+    month_from = None
+    if start_date:
+        month_from = start_date if start_date.day == 1 else next_month(start_date)
+    month_until = month_start(end_date + timedelta(days=1)) if end_date else None
+
+    if month_from and month_until and month_from >= month_until:
+        return None, [(start_date, end_date)]
+
+    partial = []
+    if start_date and start_date < month_from:
+        partial.append((start_date, month_from - timedelta(days=1)))
+    if end_date and month_until <= end_date:
+        partial.append((month_until, end_date))
+    return (month_from, month_until), partial
+
+def date_range_sql(column: str, start_param: str, end_param: str, start: Optional[date], end: Optional[date]) -> str:
+    bounds = []
+    if start:
+        bounds.append(f"{column} >= :{start_param}")
+    if end:
+        bounds.append(f"{column} <= :{end_param}")
+    return " AND ".join(bounds) or "TRUE"
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if west >= east or south >= north:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if west < -180 or east > 180 or south < -MAX_LATITUDE or north > MAX_LATITUDE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"bbox must lie within longitudes -180..180 and latitudes -{MAX_LATITUDE}..{MAX_LATITUDE}",
+        )
+    return west, south, east, north
+
+@app.get("/heatmap/grid")
+@formatted(geometry="geom")
+@cached
+async def get_heatmap_grid(
+    cell_m: Optional[int] = None,
+    zoom: Optional[int] = Query(default=None, ge=0, le=22),
+    bbox: Optional[str] = Query(default=None, description="west,south,east,north in degrees"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    start_time: Optional[time] = None,
+    end_time: Optional[time] = None,
+    severity: Optional[List[Severity]] = Query(default=None),
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db)
+):
+    # cell size: given directly, else picked for the map zoom, else statewide
+    if cell_m is None:
+        cell_m = cell_for_zoom(zoom) if zoom is not None else 10000
+    if cell_m not in CELL_SIZES:
+        raise HTTPException(status_code=400, detail=f"cell_m must be one of {CELL_SIZES}")
+
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if bool(start_time) != bool(end_time):
+        raise HTTPException(status_code=400, detail="start_time and end_time go together")
+
+    params = {"severities": severity}
+
+    env_cte, env_join, raw_bbox, grid_bbox = "", "", "", ""
+    if bbox:
+        params["west"], params["south"], params["east"], params["north"] = parse_bbox(bbox)
+        env_cte = """
+        env AS (
+            SELECT ST_Transform(ST_MakeEnvelope(:west, :south, :east, :north, 7844), 7899) AS geom
+        ),"""
+        env_join = "CROSS JOIN env"
+        raw_bbox = "AND a.geom_vg && env.geom"
+        grid_bbox = f"""
+              AND g.ix BETWEEN floor(ST_XMin(env.geom) / {cell_m}) AND floor(ST_XMax(env.geom) / {cell_m})
+              AND g.iy BETWEEN floor(ST_YMin(env.geom) / {cell_m}) AND floor(ST_YMax(env.geom) / {cell_m})"""
+
+    # the rollup has no time of day - with a time filter everything comes from accident
+    if cell_m in PREAGGREGATED_CELLS and not start_time:
+        months, raw_ranges = split_months(start_date, end_date)
+    else:
+        months, raw_ranges = None, [(start_date, end_date)]
+
+    parts = []
+    if months:
+        month_from, month_until = months
+        params.update(month_from=month_from, month_until=month_until)
+        month_bounds = []
+        if month_from:
+            month_bounds.append("g.crash_month >= :month_from")
+        if month_until:
+            month_bounds.append("g.crash_month < :month_until")
+        parts.append(f"""
+            SELECT g.ix, g.iy, g.crashes, g.injuries, g.serious_injuries, g.fatalities
+            FROM crash_grid g {env_join}
+            WHERE g.cell_m = {cell_m}
+              AND {" AND ".join(month_bounds) or "TRUE"}
+              {"AND lower(g.severity) = ANY(:severities)" if severity else ""}{grid_bbox}""")
+
+    if raw_ranges:
+        range_filters = []
+        for i, (start, end) in enumerate(raw_ranges):
+            params[f"from_{i}"], params[f"to_{i}"] = start, end
+            range_filters.append(f"({date_range_sql('a.accident_date', f'from_{i}', f'to_{i}', start, end)})")
+        if start_time:
+            params.update(start_time=start_time, end_time=end_time)
+        parts.append(f"""
+            SELECT floor(ST_X(a.geom_vg) / {cell_m})::int AS ix,
+                   floor(ST_Y(a.geom_vg) / {cell_m})::int AS iy,
+                   1 AS crashes,
+                   COALESCE(a.inj_or_fatal, 0) AS injuries,
+                   COALESCE(a.seriousinjury, 0) AS serious_injuries,
+                   COALESCE(a.fatality, 0) AS fatalities
+            FROM accident a {env_join}
+            WHERE a.geom_vg IS NOT NULL
+              AND ({" OR ".join(range_filters)})
+              {"AND a.accident_time BETWEEN :start_time AND :end_time" if start_time else ""}
+              {"AND lower(a.severity) = ANY(:severities)" if severity else ""}
+              {raw_bbox}""")
+
+    # cells ship as their GDA2020 square, plus its centre for point-based heatmap layers
+    cell_geom = (
+        f"ST_Transform(ST_MakeEnvelope(c.ix * {cell_m}, c.iy * {cell_m}, "
+        f"(c.ix + 1) * {cell_m}, (c.iy + 1) * {cell_m}, 7899), 7844)"
+    )
+    sql = text(f"""
+        WITH {env_cte}
+        counts AS ({" UNION ALL ".join(parts)}
+        ),
+        cells AS (
+            SELECT ix, iy,
+                   SUM(crashes)::int          AS crashes,
+                   SUM(injuries)::int         AS injuries,
+                   SUM(serious_injuries)::int AS serious_injuries,
+                   SUM(fatalities)::int       AS fatalities
+            FROM counts
+            GROUP BY ix, iy
+        )
+        SELECT c.ix, c.iy, {cell_m} AS cell_m,
+               c.crashes, c.injuries, c.serious_injuries, c.fatalities,
+               ST_X(ctr.geom) AS lon,
+               ST_Y(ctr.geom) AS lat,
+               {geometry_sql(cell_geom, fmt, 6)} AS geom
+        FROM cells c
+        CROSS JOIN LATERAL (
+            SELECT ST_Transform(ST_SetSRID(ST_MakePoint((c.ix + 0.5) * {cell_m}, (c.iy + 0.5) * {cell_m}), 7899), 7844) AS geom
+        ) ctr
+        ORDER BY c.crashes DESC, c.ix, c.iy
+    """)
+
+    result = await fetch_all(db, sql, params)
+    return [dict(row._mapping) for row in result]
+
+## density raster endpoint
+# A kernel density estimate of the filtered crashes over a bbox (see kde.py): the crashes are counted
+# per raster pixel here in SQL, so only the occupied pixels leave Postgres, and smoothed with one FFT
+# convolution in NumPy. Rasters are cached per parameters and dataset version like every response.
+
+MAX_RASTER_SIDE = 1024  # pixels
+MAX_KERNEL_SIGMA_PX = 64  # larger kernels mean a bbox too small for the bandwidth
+
+DENSITY_SQL = """
+    WITH pts AS (
+        SELECT ST_Transform(a.geom, 3857) AS geom
+        FROM accident a
+        WHERE a.geom && ST_Transform(ST_MakeEnvelope(:x0, :y0, :x1, :y1, 3857), 7844)
+          {filters}
+    )
+    SELECT floor((ST_X(pts.geom) - :x0) / :pixel)::int AS col,
+           floor((ST_Y(pts.geom) - :y0) / :pixel)::int AS row,
+           COUNT(*) AS crashes
+    FROM pts
+    GROUP BY 1, 2
+"""
+
+@cached
+async def density_raster(
+    west: float, south: float, east: float, north: float,
+    width: int,
+    bandwidth_m: int,
+    date_from: Optional[date],
+    date_to: Optional[date],
+    time_from: Optional[time],
+    time_to: Optional[time],
+    severity: Optional[str],
+    speed_zone: Optional[str],
+    atmosph_cond_desc: Optional[str],
+    raster: str,
+    scale_max: Optional[float],
+    db: DbSession,
+) -> dict:
+    # square pixels in web mercator, `width` of them across - the height follows from the bbox, and
+    # for a bbox taller than wide it is capped at MAX_RASTER_SIDE, narrowing the raster to match
+    bx0, by0 = kde.mercator(west, south)
+    bx1, by1 = kde.mercator(east, north)
+    pixel = max((bx1 - bx0) / width, (by1 - by0) / MAX_RASTER_SIDE)
+    cols, rows = max(1, round((bx1 - bx0) / pixel)), max(1, round((by1 - by0) / pixel))
+
+    # mercator stretches distances by 1/cos(latitude) - the bandwidth is in metres on the ground
+    ground_pixel_m = pixel * math.cos(math.radians((south + north) / 2))
+    sigma_px = bandwidth_m / ground_pixel_m
+    if sigma_px > MAX_KERNEL_SIGMA_PX:
+        raise HTTPException(status_code=400, detail="bandwidth_m is too large for this bbox - zoom out or lower it")
+    margin = math.ceil(kde.KERNEL_SIGMAS * sigma_px)
+
+    filters = []
+    if date_from:
+        filters.append("AND a.accident_date >= :date_from")
+    if date_to:
+        filters.append("AND a.accident_date <= :date_to")
+    if time_from and time_to:
+        filters.append("AND a.accident_time BETWEEN :time_from AND :time_to")
+    if severity:
+        filters.append("AND lower(a.severity) = lower(:severity)")
+    if speed_zone:
+        filters.append("AND lower(a.speed_zone) = lower(:speed_zone)")
+    if atmosph_cond_desc:
+        # one point per crash, however many conditions it had
+        filters.append("""AND EXISTS (
+            SELECT 1 FROM accident_conditions ac
+            WHERE ac.accident_no = a.accident_no AND lower(ac.atmosph_cond_desc) = lower(:atmosph_cond_desc)
+          )""")
+
+    # counted over the bbox plus the kernel's reach, so crashes just outside still spill in
+    x0, y0 = bx0 - margin * pixel, by0 - margin * pixel
+    result = await fetch_all(db, text(DENSITY_SQL.format(filters="\n          ".join(filters))), {
+        "x0": x0, "y0": y0,
+        "x1": x0 + (cols + 2 * margin) * pixel, "y1": y0 + (rows + 2 * margin) * pixel,
+        "pixel": pixel,
+        "date_from": date_from, "date_to": date_to,
+        "time_from": time_from, "time_to": time_to,
+        "severity": severity, "speed_zone": speed_zone, "atmosph_cond_desc": atmosph_cond_desc,
+    })
+
+    def render():
+        np = kde.np
+        counts = np.zeros((rows + 2 * margin, cols + 2 * margin), dtype=np.float64)
+        if result:
+            col, row, crashes = (np.array(v) for v in zip(*result))
+            inside = (col >= 0) & (col < counts.shape[1]) & (row >= 0) & (row < counts.shape[0])
+            counts[row[inside], col[inside]] = crashes[inside]
+
+        values = kde.density(counts, sigma_px, margin, (ground_pixel_m / 1000) ** 2)
+        top = scale_max if scale_max else float(values.max())
+        if raster == "png":
+            content = kde.encode_png(kde.colorize(values, top))
+        else:
+            content = kde.to_uint16(values, top).astype("<u2").tobytes()
+        return {"content": content, "scale_max": top, "width": cols, "height": rows}
+
+    # FFTs of up to a few million cells - kept off the event loop
+    return await run_in_threadpool(render)
+
+@app.get("/heatmap/density")
+async def get_heatmap_density(
+    bbox: str = Query(..., description="west,south,east,north in degrees"),
+    width: conint(ge=16, le=MAX_RASTER_SIDE) = 512,
+    bandwidth_m: conint(ge=10, le=5000) = 250,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    time_from: Optional[time] = None,
+    time_to: Optional[time] = None,
+    severity: Optional[Severity] = None,
+    speed_zone: Optional[SpeedZone] = None,
+    atmosph_cond_desc: Optional[AtmosphericCondition] = None,
+    raster: Literal["png", "uint16"] = "png",
+    scale_max: Optional[confloat(gt=0)] = None,
+    db: DbSession = Depends(get_db)
+):
+    if kde.np is None:
+        raise HTTPException(status_code=503, detail="Density rasters need numpy installed on the server")
+    if bool(time_from) != bool(time_to):
+        raise HTTPException(status_code=400, detail="time_from and time_to go together")
+
+    west, south, east, north = parse_bbox(bbox)
+    result = await density_raster(
+        west=west, south=south, east=east, north=north,
+        width=width, bandwidth_m=bandwidth_m,
+        date_from=date_from, date_to=date_to, time_from=time_from, time_to=time_to,
+        severity=severity, speed_zone=speed_zone, atmosph_cond_desc=atmosph_cond_desc,
+        raster=raster, scale_max=scale_max,
+        db=db,
+    )
+    return Response(
+        content=result["content"],
+        media_type="image/png" if raster == "png" else "application/octet-stream",
+        headers={
+            "X-Raster-Size": f"{result['width']}x{result['height']}",
+            "X-Raster-Bbox": f"{west},{south},{east},{north}",
+            "X-Density-Max": f"{result['scale_max']:.6g}",  # crashes/km² at the top of the scale
+        },
+    )
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy import text
-from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field, model_validator, conint
 from fastapi import HTTPException
 
 from typing import List, Literal, Optional, Dict, Tuple
 from datetime import date, time
 
-from db import get_db
+import forecasting
+from cache import cached
+from db import DbSession, fetch_all, get_db
+from formats import formatted, geometry_sql, response_format
+from gazetteer import SA_LEVELS, gazetteer
+from memory_engine import memory_engine
+from names import name_key
 
 app = APIRouter()
 
@@ -17,106 +22,171 @@ app = APIRouter()
 class AccidentStatsRequest(BaseModel):
     filter_area_level: Literal["sa2", "sa3", "sa4"]
     filter_area_name: str
-    group_by_area_level: Literal["sa2", "sa3"]
+    group_by_area_level: Literal["sa2", "sa3", "sa4"]
     date_from: Optional[date] = None
     date_to: Optional[date] = None
     order_by: Literal["count", "density"] = "count"
     order_dir: Literal["asc", "desc"] = "desc"
     limit: conint(ge=1, le=100) = 10
-
-@model_validator(mode="before")
-def validate_area_hierarchy(cls, values):
-    hierarchy = ["sa2", "sa3", "sa4"]
-    filter_level = values.get("filter_area_level")
-    group_level = values.get("group_by_area_level")
-
-    # Allow equal; only forbid strictly higher
-    if hierarchy.index(group_level) > hierarchy.index(filter_level):
-        raise ValueError("EW RULE: group_by must NOT be higher")
-
-    return values
+    # geometry detail: pick a resolution directly, or pass the map zoom and let the API pick one
+    resolution: Optional[Literal["full", "high", "medium", "low"]] = None
+    zoom: Optional[conint(ge=0, le=22)] = None
+
+    @model_validator(mode="after")
+    def validate_area_hierarchy(self):
+        # Allow equal; only forbid grouping by a level larger than the filter area
+        if SA_LEVELS.index(self.group_by_area_level) > SA_LEVELS.index(self.filter_area_level):
+            raise ValueError("group_by_area_level must not be larger than filter_area_level")
+        # a memory lookup once the gazetteer is loaded - unknown names would just return no rows
+        if gazetteer.ready and gazetteer.get(self.filter_area_level, self.filter_area_name) is None:
+            raise ValueError(f"Unknown {self.filter_area_level} region: {self.filter_area_name}")
+        return self
+
+# resolution -> (sa_region_simplified.resolution, decimal digits kept in the WKT)
+# see data/sa_regions.sql for the simplification tolerances
+GEOM_RESOLUTIONS: Dict[str, Tuple[int, int]] = {
+    "full":   (0, 7),
+    "high":   (1, 5),
+    "medium": (2, 4),
+    "low":    (3, 3),
+}
+
+def resolution_for_zoom(zoom: int) -> str:
+    if zoom >= 13:
+        return "high"
+    if zoom >= 10:
+        return "medium"
+    return "low"
+
+def resolution_for(req: AccidentStatsRequest) -> str:
+    if req.resolution:
+        return req.resolution
+    if req.zoom is None:
+        return "full"
+    return resolution_for_zoom(req.zoom)
 
 @app.post("/accident_stats")
-def get_accident_stats(req: AccidentStatsRequest, db: Session = Depends(get_db)):
+@formatted(geometry="geom")
+@cached
+async def get_accident_stats(
+    req: AccidentStatsRequest,
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db)
+):
     filter_column = {
-        "sa2": "sa2_name21",
-        "sa3": "sa3_name21",
-        "sa4": "sa4_name21"
+        "sa2": "sa2_key",
+        "sa3": "sa3_key",
+        "sa4": "sa4_key"
     }[req.filter_area_level]
 
-    group_column = {
-        "sa2": "sa2_name21",
-        "sa3": "sa3_name21"
+    group_key = {
+        "sa2": "sa2_code21",
+        "sa3": "sa3_code21",
+        "sa4": "sa4_code21"
     }[req.group_by_area_level]
 
-    # Mesh block filter clause
-    mb_where = f"""
-        WHERE lower(mbv.{filter_column}) = lower(:filter_area_name)
-        AND lower(mbv.{group_column}) IS NOT NULL
-    """
-
     # Accident date filter clause
     acc_where = []
     if req.date_from:
-        acc_where.append("a.accident_date >= :date_from")
+        acc_where.append("AND a.accident_date >= :date_from")
     if req.date_to:
-        acc_where.append("a.accident_date <= :date_to")
-    acc_where_clause = " AND ".join(acc_where)
-    if acc_where_clause:
-        acc_where_clause = "WHERE " + acc_where_clause
+        acc_where.append("AND a.accident_date <= :date_to")
+    acc_where_clause = " ".join(acc_where)
 
     # Ordering clause
     direction = "DESC" if req.order_dir.lower() == "desc" else "ASC"
     order_clause = {
-        "count": f"ORDER BY COUNT(a.accident_no) {direction}",
-        "density": f"ORDER BY COUNT(a.accident_no)/(ST_Area(s.geom::geography)/1000000) {direction}"
+        "count": f"ORDER BY num_accs {direction}",
+        "density": f"ORDER BY acc_per_sq_km {direction}"
     }[req.order_by]
 
-    # Final SQL
+    # Geometry - simplified copies are precomputed, full resolution comes straight from sa_region
+    resolution, digits = GEOM_RESOLUTIONS[resolution_for(req)]
+    geom_join = ""
+    geom_expr = "s.geom"
+    if resolution:
+        geom_join = """
+        LEFT JOIN sa_region_simplified ss
+          ON ss.sa_level = :group_area_level AND ss.sa_code = s.sa_code AND ss.resolution = :resolution"""
+        geom_expr = "COALESCE(ss.geom, s.geom)"
+
+    # Final SQL - region geometries come precomputed from sa_region (see data/sa_regions.sql)
+    # and accidents are already stamped with their region codes (see data/accident_regions.sql)
     sql = text(f"""
         WITH sas AS (
             SELECT
-                ST_Union(mbv.geom) AS geom,
-                mbv.{group_column} AS sa_name
-            FROM mesh_block_vic_21 mbv
-            {mb_where}
-            GROUP BY sa_name
+                s.sa_code,
+                s.geom,
+                s.sa_name,
+                s.area_sq_km,
+                s.centroid_lat,
+                s.centroid_lon
+            FROM sa_region s
+            WHERE s.sa_level = :group_area_level
+            AND s.{filter_column} = name_key(:filter_area_name)
+        ),
+        accs AS (
+            SELECT
+                a.{group_key} AS sa_code,
+                COUNT(a.accident_no) AS num_accs
+            FROM accident a
+            WHERE a.{group_key} IN (SELECT sa_code FROM sas)
+            {acc_where_clause}
+            GROUP BY a.{group_key}
         )
         SELECT 
-            COUNT(a.accident_no) AS num_accs,
-            ST_Area(s.geom::geography)/1000000 AS geom_area_sq_km,
-            COUNT(a.accident_no)/(ST_Area(s.geom::geography)/1000000) AS acc_per_sq_km,
-            ST_Y(
-              ST_Centroid(
-                ST_Transform(s.geom, 4326)
-              )
-            ) AS centroid_lat,
-            ST_X(
-              ST_Centroid(
-                ST_Transform(s.geom, 4326)
-              )
-            ) AS centroid_lon,
+            accs.num_accs,
+            s.area_sq_km AS geom_area_sq_km,
+            accs.num_accs/s.area_sq_km AS acc_per_sq_km,
+            s.centroid_lat,
+            s.centroid_lon,
             s.sa_name,
-            ST_AsText(s.geom) AS geom
-        FROM accident a
-        JOIN sas s ON ST_Contains(s.geom, a.geom)
-        {acc_where_clause}
-        GROUP BY s.sa_name, s.geom
+            {geometry_sql(geom_expr, fmt, digits)} AS geom
+        FROM accs
+        JOIN sas s ON s.sa_code = accs.sa_code{geom_join}
         {order_clause}
         LIMIT :limit
     """)
 
     params = {
         "filter_area_name": req.filter_area_name,
+        "group_area_level": req.group_by_area_level,
         "date_from": req.date_from,
         "date_to": req.date_to,
-        "limit": req.limit
+        "limit": req.limit,
+        "resolution": resolution,
     }
 
-    result = db.execute(sql, params).fetchall()
+    result = await fetch_all(db, sql, params)
     return [dict(row._mapping) for row in result]
 
 ## trends endpoint
+# trends and forecasts read the daily rollup (see data/crash_daily.sql) rather than raw accidents,
+# which also makes an SA2/SA3/SA4 filter free - the rollup carries every region code
+
+def region_filter(sa_level: Optional[str], sa_name: Optional[str]) -> str:
+    if bool(sa_level) != bool(sa_name):
+        raise HTTPException(status_code=400, detail="sa_level and sa_name go together")
+    if not sa_level:
+        return ""
+    return f"""
+        AND cd.{sa_level}_code21 = (
+            SELECT s.sa_code FROM sa_region s
+            WHERE s.sa_level = :sa_level AND s.sa_key = name_key(:sa_name)
+        )"""
+
+YEARLY_SQL = """
+    SELECT
+      EXTRACT(YEAR FROM cd.crash_date)::int AS year,
+      SUM(cd.crashes)                        AS crashes,
+      SUM(cd.injuries)                       AS total_injuries,
+      SUM(cd.serious_injuries)               AS serious_injuries
+    FROM crash_daily cd
+    WHERE cd.crash_date BETWEEN :start_date AND :end_date
+    {region_filter}
+    GROUP BY year
+    ORDER BY year;
+"""
 
 class YearlyTrendItem(BaseModel):
     year: conint(ge=1900, le=2100)
@@ -125,29 +195,31 @@ class YearlyTrendItem(BaseModel):
     serious_injuries: int
 
 @app.get("/trends/yearly", response_model=List[YearlyTrendItem])
-def get_yearly_trend(
+@formatted()
+@cached
+async def get_yearly_trend(
     year_from: conint(ge=1900, le=2100) = 2020,
     year_to:   conint(ge=1900, le=2100) = 2024,
-    db: Session = Depends(get_db),
+    sa_level: Optional[Literal["sa2", "sa3", "sa4"]] = None,
+    sa_name: Optional[str] = None,
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db),
 ):
-    sql = text("""
-        SELECT
-          EXTRACT(YEAR FROM accident_date)::int AS year,
-          COUNT(*)                               AS crashes,
-          COALESCE(SUM(inj_or_fatal), 0)         AS total_injuries,
-          COALESCE(SUM(seriousinjury), 0)        AS serious_injuries
-        FROM accident
-        WHERE accident_date BETWEEN :start_date AND :end_date
-        GROUP BY year
-        ORDER BY year;
-    """)
+    where_region = region_filter(sa_level, sa_name)
+
+    if memory_engine.ready:
+        return [YearlyTrendItem(**r) for r in memory_engine.yearly_totals(year_from, year_to, sa_level, sa_name)]
+
+    sql = text(YEARLY_SQL.format(region_filter=where_region))
 
     params = {
-        "start_date": f"{year_from}-01-01",
-        "end_date":   f"{year_to}-12-31",
+        "start_date": date(year_from, 1, 1),
+        "end_date":   date(year_to, 12, 31),
+        "sa_level": sa_level,
+        "sa_name": sa_name,
     }
 
-    rows = db.execute(sql, params).fetchall()
+    rows = await fetch_all(db, sql, params)
     return [YearlyTrendItem(**dict(r._mapping)) for r in rows]
 
 ## monthly trends endpoint (accidents + serious injuries + injuries total)
@@ -163,20 +235,33 @@ class MonthlyTrendResponse(BaseModel):
     data: List[MonthlyTrendItem]
 
 @app.get("/trends/monthly", response_model=MonthlyTrendResponse)
-def get_monthly_trend(year: conint(ge=1900, le=2100), db: Session = Depends(get_db)):
+@cached
+async def get_monthly_trend(
+    year: conint(ge=1900, le=2100),
+    sa_level: Optional[Literal["sa2", "sa3", "sa4"]] = None,
+    sa_name: Optional[str] = None,
+    db: DbSession = Depends(get_db),
+):
+    where_region = region_filter(sa_level, sa_name)
+
+    if memory_engine.ready:
+        data = [MonthlyTrendItem(**r) for r in memory_engine.monthly_totals(year, sa_level, sa_name)]
+        return MonthlyTrendResponse(year=year, data=data)
 
-    sql = text("""
+    # a date range rather than EXTRACT(YEAR ...) = :year, so the crash_date index applies
+    sql = text(f"""
         WITH months AS (
             SELECT generate_series(1, 12) AS m
         ),
         agg AS (
             SELECT
-              EXTRACT(MONTH FROM accident_date)::int AS m,
-              COUNT(*)                                AS crashes,
-              COALESCE(SUM(inj_or_fatal), 0)          AS total_injuries,
-              COALESCE(SUM(seriousinjury), 0)         AS serious_injuries
-            FROM accident
-            WHERE EXTRACT(YEAR FROM accident_date) = :year
+              EXTRACT(MONTH FROM cd.crash_date)::int AS m,
+              SUM(cd.crashes)                         AS crashes,
+              SUM(cd.injuries)                        AS total_injuries,
+              SUM(cd.serious_injuries)                AS serious_injuries
+            FROM crash_daily cd
+            WHERE cd.crash_date BETWEEN :start_date AND :end_date
+            {where_region}
             GROUP BY 1
         )
         SELECT
@@ -189,7 +274,13 @@ def get_monthly_trend(year: conint(ge=1900, le=2100), db: Session = Depends(get_
         ORDER BY period;
     """)
 
-    rows = db.execute(sql, {"year": year}).fetchall()
+    rows = await fetch_all(db, sql, {
+        "year": year,
+        "start_date": date(year, 1, 1),
+        "end_date": date(year, 12, 31),
+        "sa_level": sa_level,
+        "sa_name": sa_name,
+    })
     data = [MonthlyTrendItem(**dict(row._mapping)) for row in rows]
     return MonthlyTrendResponse(year=year, data=data)
 
@@ -212,35 +303,34 @@ def ols_fit(xs: List[int], ys: List[float]) -> Tuple[float, float]:
     return a, b
 
 @app.get("/forecast/yearly", response_model=ForecastYearlyResponse)
-def forecast_yearly(
+@cached
+async def forecast_yearly(
     year_from: conint(ge=1900, le=2100) = 2012,
     year_to:   conint(ge=1900, le=2100) = 2024,
     target_year: conint(ge=1900, le=2100) = 2025,
     method: Literal["ols", "mean"] = "ols",
-    db: Session = Depends(get_db),
+    sa_level: Optional[Literal["sa2", "sa3", "sa4"]] = None,
+    sa_name: Optional[str] = None,
+    db: DbSession = Depends(get_db),
 ):
-    sql = text("""
-        SELECT
-          EXTRACT(YEAR FROM accident_date)::int AS y,
-          COUNT(*)                               AS crashes,
-          COALESCE(SUM(inj_or_fatal), 0)         AS total_injuries,
-          COALESCE(SUM(seriousinjury), 0)        AS serious_injuries
-        FROM accident
-        WHERE accident_date BETWEEN :start_date AND :end_date
-        GROUP BY y
-        ORDER BY y;
-    """)
-    rows = db.execute(sql, {
-        "start_date": f"{year_from}-01-01",
-        "end_date":   f"{year_to}-12-31",
-    }).fetchall()
+    where_region = region_filter(sa_level, sa_name)
+
+    if memory_engine.ready:
+        rows = memory_engine.yearly_totals(year_from, year_to, sa_level, sa_name)
+    else:
+        sql = text(YEARLY_SQL.format(region_filter=where_region))
+        rows = [dict(r._mapping) for r in await fetch_all(db, sql, {
+            "start_date": date(year_from, 1, 1),
+            "end_date":   date(year_to, 12, 31),
+            "sa_level": sa_level,
+            "sa_name": sa_name,
+        })]
 
     # Pack history
     years = list(range(year_from, year_to + 1))
     by_year: Dict[int, Dict[str, int]] = {y: {"crashes": 0, "total_injuries": 0, "serious_injuries": 0} for y in years}
-    for r in rows:
-        m = r._mapping
-        by_year[m["y"]] = {
+    for m in rows:
+        by_year[m["year"]] = {
             "crashes": m["crashes"],
             "total_injuries": m["total_injuries"],
             "serious_injuries": m["serious_injuries"],
@@ -284,6 +374,21 @@ def forecast_yearly(
     )
 
 ## roads within region endpoint
+# filter vocabulary (lowercased values) - shared with the density raster (see api/heatmap.py)
+Severity = Literal["fatal accident", "non injury accident", "other injury accident", "serious injury accident"]
+
+SpeedZone = Literal[
+    "100 km/hr", "110 km/hr", "30km/hr", "40 km/hr", "50 km/hr", "60 km/hr",
+    "70 km/hr", "75 km/hr", "80 km/hr", "90 km/hr", "camping grounds or off road"
+]
+
+RoadUserType = Literal[
+    "bicyclists", "drivers", "e-scooter rider", "motorcyclists", "not known",
+    "passengers", "pedestrians", "pillion passengers"
+]
+
+AtmosphericCondition = Literal["clear", "dust", "fog", "not known", "raining", "smoke", "snowing", "strong winds"]
+
 class RoadAccidentDensityRequest(BaseModel):
     sa_level: Literal["sa2", "sa3"]  # required param
     sa_name: str  # required - SA2/SA3 name
@@ -299,31 +404,17 @@ class RoadAccidentDensityRequest(BaseModel):
     time_from: Optional[time] = None
     time_to: Optional[time] = None
 
-    severity: Optional[
-        Literal["fatal accident", "non injury accident", "other injury accident", "serious injury accident"]
-    ] = None
+    severity: Optional[Severity] = None
 
-    speed_zone: Optional[
-        Literal[
-            "100 km/hr", "110 km/hr", "30km/hr", "40 km/hr", "50 km/hr", "60 km/hr",
-            "70 km/hr", "75 km/hr", "80 km/hr", "90 km/hr", "camping grounds or off road"
-        ]
-    ] = None
+    speed_zone: Optional[SpeedZone] = None
 
     age_group: Optional[str] = None
     sex: Optional[Literal["M", "F", "U"]] = None
-    road_user_type_desc: Optional[
-        Literal[
-            "bicyclists", "drivers", "e-scooter rider", "motorcyclists", "not known",
-            "passengers", "pedestrians", "pillion passengers"
-        ]
-    ] = None
+    road_user_type_desc: Optional[RoadUserType] = None
 
     victims_hospitalised: Optional[Literal["y", "n"]] = None
 
-    atmosph_cond_desc: Optional[
-        Literal["clear", "dust", "fog", "not known", "raining", "smoke", "snowing", "strong winds"]
-    ] = None
+    atmosph_cond_desc: Optional[AtmosphericCondition] = None
 
     min_accidents_per_road: Optional[int] = None
     min_road_length_km: Optional[float] = 0.2
@@ -343,18 +434,17 @@ class RoadAccidentDensityRequest(BaseModel):
         return values
 
 @app.post("/road_accident_density")
-def get_road_accident_density(req: RoadAccidentDensityRequest, db: Session = Depends(get_db)):
+@formatted(geometry="road_geom", geometries=["acc_geom_union"])
+@cached
+async def get_road_accident_density(
+    req: RoadAccidentDensityRequest,
+    fmt: str = Depends(response_format),
+    db: DbSession = Depends(get_db)
+):
     
-    sa_column = {
-        "sa2": "sa2_name21",
-        "sa3": "sa3_name21",
-        # "sa4": "sa4_name21"
-    }[req.sa_level]
-
     filters = [
-        f"lower(mbv.{sa_column}) = lower(:sa_name)",
-        "h_road_type = :road_type",
-        "accident_date BETWEEN :date_from AND :date_to"
+        "s.sa_level = :sa_level AND s.sa_key = name_key(:sa_name)",
+        "a.accident_date BETWEEN :date_from AND :date_to"
     ]
 
     if req.time_from and req.time_to:
@@ -378,52 +468,305 @@ def get_road_accident_density(req: RoadAccidentDensityRequest, db: Session = Dep
     if req.min_accidents_per_road:
         having_clause.append("COUNT(*) > :min_accidents_per_road")
     if req.min_road_length_km is not None:
-        having_clause.append("st_length(r.geom::geography)/1000 > :min_road_length_km")
+        having_clause.append("st_length(r.geom_vg)/1000 > :min_road_length_km")
+
+    accident_filters = "\n              AND ".join(filters[1:])
 
     sql = text(f"""
         WITH sax AS (
-            SELECT ST_Union(mbv.geom) AS geom
-            FROM mesh_block_vic_21 mbv
+            SELECT s.sa_code, s.geom
+            FROM sa_region s
             WHERE {filters[0]}
         ),
         roads_in_sax AS (
-            SELECT ST_Union(vr.geom) AS geom, vr.ezirdnmlbl AS road_name
+            SELECT ST_Union(vr.geom) AS geom, ST_Union(vr.geom_vg) AS geom_vg, vr.ezirdnmlbl AS road_name
             FROM vicmap_road vr, sax
             WHERE ST_Intersects(vr.geom, sax.geom)
-              AND {filters[1]}
+              AND vr.h_road_type = :road_type
             GROUP BY road_name
         ),
+        -- accidents are pre-snapped to their nearest road segment (see data/accident_road_snap.sql)
+        -- one row per accident, however many persons and conditions matched the filters
         accidents_in_sax AS (
-            SELECT a.geom
+            SELECT DISTINCT ON (a.accident_no) a.accident_no, a.geom, snap.road_name
             FROM accident a
+            JOIN accident_road_snap snap ON snap.accident_no = a.accident_no
+            JOIN vicmap_road vr ON vr.ogc_fid = snap.road_seg_id
             JOIN person p ON a.accident_no = p.accident_no
             JOIN accident_conditions ac ON a.accident_no = ac.accident_no,
             sax
-            WHERE ST_Intersects(a.geom, sax.geom)
-              AND {filters[2]}
-              {"AND " + " AND ".join(filters[3:]) if len(filters) > 3 else ""}
+            WHERE a.{req.sa_level}_code21 = sax.sa_code
+              AND snap.distance_m <= 5
+              AND vr.h_road_type = :road_type
+              AND {accident_filters}
         )
         SELECT
             r.road_name,
-            ST_AsText(ST_Union(a.geom)::geography) AS acc_geom_union,
-            ST_AsText(r.geom::geography) AS road_geom,
+            {geometry_sql("ST_Union(a.geom)::geography", fmt)} AS acc_geom_union,
+            {geometry_sql("r.geom::geography", fmt)} AS road_geom,
             COUNT(*) AS accident_count,
-            ST_Length(r.geom::geography)/1000 AS road_length_km,
-            COUNT(*)/(ST_Length(r.geom::geography)/1000) AS accident_density_per_km
+            ST_Length(r.geom_vg)/1000 AS road_length_km,
+            COUNT(*)/(ST_Length(r.geom_vg)/1000) AS accident_density_per_km
         FROM accidents_in_sax a
-        JOIN LATERAL (
-            SELECT road_name, rm.geom
-            FROM roads_in_sax rm
-            ORDER BY rm.geom <-> a.geom
-            LIMIT 1
-        ) r ON true
-        WHERE ST_DWithin(a.geom::geography, r.geom::geography, 5)
-        GROUP BY r.road_name, r.geom
+        JOIN roads_in_sax r ON r.road_name = a.road_name
+        GROUP BY r.road_name, r.geom, r.geom_vg
         {"HAVING " + " AND ".join(having_clause) if having_clause else ""}
         ORDER BY {req.order_by} {"DESC" if req.order_desc else "ASC"}
         LIMIT :limit
     """)
 
     params = req.model_dump()
-    result = db.execute(sql, params).fetchall()
+    result = await fetch_all(db, sql, params)
     return [dict(row._mapping) for row in result]
+
+## per-region forecast endpoint
+
+METRICS = ["crashes", "total_injuries", "serious_injuries"]
+
+class ForecastInterval(BaseModel):
+    forecast: float
+    lower: float
+    upper: float
+
+class RegionForecast(BaseModel):
+    sa_name: str
+    forecasts: Dict[str, ForecastInterval]  # metric -> forecast
+
+class ForecastRegionsResponse(BaseModel):
+    method: Literal["ols", "mean", "poisson", "seasonal"]
+    sa_level: Literal["sa2", "sa3", "sa4"]
+    history_from: int
+    history_to: int
+    forecast_year: int
+    interval: float
+    regions: List[RegionForecast]  # by name
+
+@app.get("/forecast/regions", response_model=ForecastRegionsResponse)
+@cached
+async def forecast_regions(
+    sa_level: Literal["sa2", "sa3", "sa4"] = "sa2",
+    within_level: Optional[Literal["sa2", "sa3", "sa4"]] = None,
+    within_name: Optional[str] = None,
+    year_from: conint(ge=1900, le=2100) = 2012,
+    year_to:   conint(ge=1900, le=2100) = 2024,
+    target_year: conint(ge=1900, le=2100) = 2025,
+    method: Literal["ols", "mean", "poisson", "seasonal"] = "ols",
+    interval: float = Query(0.95, gt=0, lt=1, description="coverage of the prediction intervals"),
+    db: DbSession = Depends(get_db),
+):
+    # forecasts for every region of sa_level (optionally within a larger region) and metric,
+    # fitted together in one vectorized pass (see forecasting.py) from one history query
+    if forecasting.np is None:
+        raise HTTPException(status_code=503, detail="Region forecasts need numpy installed on the server")
+    if bool(within_level) != bool(within_name):
+        raise HTTPException(status_code=400, detail="within_level and within_name go together")
+    if within_level and ["sa2", "sa3", "sa4"].index(within_level) < ["sa2", "sa3", "sa4"].index(sa_level):
+        raise HTTPException(status_code=400, detail="within_level must not be lower than sa_level")
+    if year_to - year_from < 2:
+        raise HTTPException(status_code=400, detail="Need at least 3 years of history")
+
+    np = forecasting.np
+    seasonal = method == "seasonal"
+    group_key = f"{sa_level}_code21"
+    within_filter = f"AND s.{within_level}_key = name_key(:within_name)" if within_level else ""
+    month_expr = "EXTRACT(MONTH FROM cd.crash_date)::int" if seasonal else "1"
+
+    sql = text(f"""
+        WITH sas AS (
+            SELECT s.sa_code, s.sa_name
+            FROM sa_region s
+            WHERE s.sa_level = :sa_level
+            {within_filter}
+        ),
+        history AS (
+            SELECT
+              cd.{group_key}                        AS sa_code,
+              EXTRACT(YEAR FROM cd.crash_date)::int AS year,
+              {month_expr}                          AS month,
+              SUM(cd.crashes)                       AS crashes,
+              SUM(cd.injuries)                      AS total_injuries,
+              SUM(cd.serious_injuries)              AS serious_injuries
+            FROM crash_daily cd
+            WHERE cd.{group_key} IN (SELECT sa_code FROM sas)
+              AND cd.crash_date BETWEEN :start_date AND :end_date
+            GROUP BY 1, 2, 3
+        )
+        SELECT s.sa_name, h.year, h.month, h.crashes, h.total_injuries, h.serious_injuries
+        FROM sas s
+        LEFT JOIN history h ON h.sa_code = s.sa_code
+        ORDER BY s.sa_name
+    """)
+    rows = await fetch_all(db, sql, {
+        "sa_level": sa_level,
+        "within_name": within_name,
+        "start_date": date(year_from, 1, 1),
+        "end_date": date(year_to, 12, 31),
+    })
+
+    # one row per (region, metric), one column per year (or month)
+    names = list(dict.fromkeys(row.sa_name for row in rows))
+    index = {name: i for i, name in enumerate(names)}
+    periods = (year_to - year_from + 1) * (12 if seasonal else 1)
+    series = np.zeros((len(names), len(METRICS), periods))
+    for row in rows:
+        if row.year is None:
+            continue
+        period = (row.year - year_from) * 12 + row.month - 1 if seasonal else row.year - year_from
+        series[index[row.sa_name], :, period] = [row.crashes, row.total_injuries, row.serious_injuries]
+
+    regions = []
+    if names:
+        fitted = forecasting.forecast(method, year_from, year_to, target_year, series.reshape(-1, periods), interval)
+        fitted = {k: v.reshape(len(names), len(METRICS)) for k, v in fitted.items()}
+        regions = [
+            RegionForecast(
+                sa_name=name,
+                forecasts={
+                    metric: ForecastInterval(**{k: round(float(v[i, j]), 2) for k, v in fitted.items()})
+                    for j, metric in enumerate(METRICS)
+                },
+            )
+            for i, name in enumerate(names)
+        ]
+
+    return ForecastRegionsResponse(
+        method=method,
+        sa_level=sa_level,
+        history_from=year_from,
+        history_to=year_to,
+        forecast_year=target_year,
+        interval=interval,
+        regions=regions,
+    )
+
+## region comparison endpoint
+
+class CompareRegionsRequest(BaseModel):
+    sa_level: Literal["sa2", "sa3", "sa4"]
+    # either the regions by name...
+    sa_names: List[str] = Field(default_factory=list, max_length=1000)
+    # ...or every sa_level region within a larger one, e.g. all SA2s of an SA4
+    within_level: Optional[Literal["sa2", "sa3", "sa4"]] = None
+    within_name: Optional[str] = None
+    year_from: conint(ge=1900, le=2100) = 2020
+    year_to: conint(ge=1900, le=2100) = 2024
+
+    @model_validator(mode="after")
+    def check_regions(self):
+        hierarchy = ["sa2", "sa3", "sa4"]
+        if bool(self.within_level) != bool(self.within_name):
+            raise ValueError("within_level and within_name go together")
+        if not self.sa_names and not self.within_level:
+            raise ValueError("Give sa_names or within_level/within_name")
+        if self.within_level and hierarchy.index(self.within_level) < hierarchy.index(self.sa_level):
+            raise ValueError("within_level must not be lower than sa_level")
+        if self.year_from > self.year_to:
+            raise ValueError("year_from must not be after year_to")
+        return self
+
+class RegionComparison(BaseModel):
+    sa_name: str
+    num_accs: int
+    geom_area_sq_km: Optional[float]
+    acc_per_sq_km: Optional[float]
+    centroid_lat: Optional[float]
+    centroid_lon: Optional[float]
+    yearly: List[YearlyTrendItem]
+
+class CompareRegionsResponse(BaseModel):
+    regions: List[RegionComparison]  # by name
+    unmatched: List[str]  # requested names that aren't sa_level regions
+
+@app.post("/compare_regions", response_model=CompareRegionsResponse)
+async def compare_regions(req: CompareRegionsRequest, db: DbSession = Depends(get_db)):
+    results = await region_comparisons(req=req, db=db)
+
+    # worked out per request: the cache folds the case and order of sa_names, and these echo them
+    matched = {name_key(r.sa_name) for r in results}
+    unmatched = [name for name in req.sa_names if name_key(name) not in matched]
+
+    return CompareRegionsResponse(regions=results, unmatched=unmatched)
+
+@cached
+async def region_comparisons(req: CompareRegionsRequest, db: DbSession) -> List[RegionComparison]:
+    # counts, density and yearly series of many regions in one query - the regions are matched
+    # with = ANY(array) on the (sa_level, sa_key) index, the daily rollup on their region code
+    group_key = f"{req.sa_level}_code21"
+
+    region_filters = ["s.sa_level = :sa_level"]
+    if req.sa_names:
+        region_filters.append("s.sa_key = ANY(:sa_keys)")
+    if req.within_level:
+        region_filters.append(f"s.{req.within_level}_key = name_key(:within_name)")
+
+    sql = text(f"""
+        WITH sas AS (
+            SELECT s.sa_code, s.sa_name, s.area_sq_km, s.centroid_lat, s.centroid_lon
+            FROM sa_region s
+            WHERE {" AND ".join(region_filters)}
+        ),
+        yearly AS (
+            SELECT
+              cd.{group_key}                          AS sa_code,
+              EXTRACT(YEAR FROM cd.crash_date)::int   AS year,
+              SUM(cd.crashes)                         AS crashes,
+              SUM(cd.injuries)                        AS total_injuries,
+              SUM(cd.serious_injuries)                AS serious_injuries
+            FROM crash_daily cd
+            WHERE cd.{group_key} IN (SELECT sa_code FROM sas)
+              AND cd.crash_date BETWEEN :start_date AND :end_date
+            GROUP BY 1, 2
+        )
+        SELECT s.sa_name, s.area_sq_km, s.centroid_lat, s.centroid_lon,
+               y.year, y.crashes, y.total_injuries, y.serious_injuries
+        FROM sas s
+        LEFT JOIN yearly y ON y.sa_code = s.sa_code
+        ORDER BY s.sa_name, y.year
+    """)
+
+    params = {
+        "sa_level": req.sa_level,
+        "sa_keys": [name_key(name) for name in req.sa_names],
+        "within_name": req.within_name,
+        "start_date": date(req.year_from, 1, 1),
+        "end_date": date(req.year_to, 12, 31),
+    }
+    rows = await fetch_all(db, sql, params)
+
+    years = range(req.year_from, req.year_to + 1)
+    regions: Dict[str, dict] = {}
+    for row in rows:
+        region = regions.get(row.sa_name)
+        if region is None:
+            region = regions[row.sa_name] = {
+                "sa_name": row.sa_name,
+                "geom_area_sq_km": row.area_sq_km,
+                "centroid_lat": row.centroid_lat,
+                "centroid_lon": row.centroid_lon,
+                "by_year": {},
+            }
+        if row.year is not None:
+            region["by_year"][row.year] = row
+
+    results = []
+    for region in regions.values():
+        by_year = region.pop("by_year")
+        yearly = [
+            YearlyTrendItem(
+                year=year,
+                crashes=by_year[year].crashes if year in by_year else 0,
+                total_injuries=by_year[year].total_injuries if year in by_year else 0,
+                serious_injuries=by_year[year].serious_injuries if year in by_year else 0,
+            )
+            for year in years
+        ]
+        num_accs = sum(item.crashes for item in yearly)
+        area = region["geom_area_sq_km"]
+        results.append(RegionComparison(
+            **region,
+            num_accs=num_accs,
+            acc_per_sq_km=num_accs / area if area else None,
+            yearly=yearly,
+        ))
+
+    return results
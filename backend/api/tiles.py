@@ -0,0 +1,170 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from typing import Literal
+
+from api.stats_trends import GEOM_RESOLUTIONS, resolution_for_zoom
+from dataset import dataset_version
+from db import DbSession, fetch_one, get_db
+from tile_cache import tile_cache
+
+app = APIRouter()
+
+## vector tile endpoint
+# Mapbox Vector Tiles (ST_AsMVT) so the map only pulls what is visible at the current zoom.
+# Tiles are cached on disk per dataset version (see tile_cache.py).
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+MAX_ZOOM = 22
+CLUSTER_BELOW_ZOOM = 12  # accidents are aggregated into grid clusters below this zoom
+CLUSTER_CELLS = 32  # clusters per tile side
+WEB_MERCATOR_WIDTH = 40075016.68557849  # metres, EPSG:3857
+
+# road classes drawn at each zoom - minor roads only appear once zoomed in
+ROAD_TYPES_BY_ZOOM = [
+    (13, None),  # everything
+    (10, ("major", "suburban")),
+    (0, ("major",)),
+]
+
+# common CTE - the tile in web mercator, and in GDA2020 to hit the geometry indexes
+BOUNDS_CTE = """
+    bounds AS (
+        SELECT ST_TileEnvelope(:z, :x, :y) AS geom,
+               ST_Transform(ST_TileEnvelope(:z, :x, :y), 7844) AS geom_7844
+    )
+"""
+
+def accident_points_sql() -> str:
+    return f"""
+        WITH {BOUNDS_CTE},
+        mvt AS (
+            SELECT a.accident_no,
+                   a.accident_date::text AS accident_date,
+                   a.severity,
+                   ST_AsMVTGeom(ST_Transform(a.geom, 3857), bounds.geom) AS geom
+            FROM accident a, bounds
+            WHERE a.geom && bounds.geom_7844
+        )
+        SELECT ST_AsMVT(mvt.*, :layer, 4096, 'geom') FROM mvt
+    """
+
+def accident_clusters_sql() -> str:
+    return f"""
+        WITH {BOUNDS_CTE},
+        pts AS (
+            SELECT ST_Transform(a.geom, 3857) AS geom,
+                   a.severity
+            FROM accident a, bounds
+            WHERE a.geom && bounds.geom_7844
+        ),
+        clusters AS (
+            SELECT ST_Centroid(ST_Collect(pts.geom)) AS geom,
+                   COUNT(*) AS crashes,
+                   COUNT(*) FILTER (WHERE pts.severity = 'Serious injury accident') AS serious
+            FROM pts
+            GROUP BY ST_SnapToGrid(pts.geom, :cell)
+        ),
+        mvt AS (
+            SELECT c.crashes,
+                   c.serious,
+                   ST_AsMVTGeom(c.geom, bounds.geom) AS geom
+            FROM clusters c, bounds
+        )
+        SELECT ST_AsMVT(mvt.*, :layer, 4096, 'geom') FROM mvt
+    """
+
+def regions_sql(sa_level: str) -> str:
+    return f"""
+        WITH {BOUNDS_CTE},
+        regions AS (
+            SELECT s.sa_code,
+                   s.sa_name,
+                   COALESCE(ss.geom, s.geom) AS geom
+            FROM sa_region s
+            JOIN bounds ON s.geom && bounds.geom_7844
+            LEFT JOIN sa_region_simplified ss
+              ON ss.sa_level = s.sa_level AND ss.sa_code = s.sa_code AND ss.resolution = :resolution
+            WHERE s.sa_level = :sa_level
+        ),
+        counts AS (
+            SELECT a.{sa_level}_code21 AS sa_code,
+                   COUNT(*) AS crashes
+            FROM accident a
+            WHERE a.{sa_level}_code21 IN (SELECT sa_code FROM regions)
+            GROUP BY a.{sa_level}_code21
+        ),
+        mvt AS (
+            SELECT r.sa_code,
+                   r.sa_name,
+                   COALESCE(c.crashes, 0) AS crashes,
+                   ST_AsMVTGeom(ST_Transform(r.geom, 3857), bounds.geom) AS geom
+            FROM regions r
+            LEFT JOIN counts c ON c.sa_code = r.sa_code
+            CROSS JOIN bounds
+        )
+        SELECT ST_AsMVT(mvt.*, :layer, 4096, 'geom') FROM mvt WHERE mvt.geom IS NOT NULL
+    """
+
+def roads_sql(road_types) -> str:
+    road_type_filter = "AND vr.h_road_type = ANY(:road_types)" if road_types else ""
+    return f"""
+        WITH {BOUNDS_CTE},
+        mvt AS (
+            SELECT vr.ogc_fid AS seg_id,
+                   vr.ezirdnmlbl AS road_name,
+                   vr.h_road_type,
+                   ST_AsMVTGeom(ST_Transform(vr.geom, 3857), bounds.geom) AS geom
+            FROM vicmap_road vr, bounds
+            WHERE vr.geom && bounds.geom_7844
+            {road_type_filter}
+        )
+        SELECT ST_AsMVT(mvt.*, :layer, 4096, 'geom') FROM mvt WHERE mvt.geom IS NOT NULL
+    """
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.pbf")
+async def get_tile(
+    layer: Literal["accidents", "sa2", "sa3", "sa4", "roads"],
+    z: int,
+    x: int,
+    y: int,
+    cluster: bool = True,
+    db: DbSession = Depends(get_db)
+):
+    if not 0 <= z <= MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"Zoom must be between 0 and {MAX_ZOOM}")
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    params = {"z": z, "x": x, "y": y, "layer": layer}
+    variant = ""
+    if layer == "accidents":
+        if cluster and z < CLUSTER_BELOW_ZOOM:
+            sql = accident_clusters_sql()
+            params["cell"] = WEB_MERCATOR_WIDTH / 2 ** z / CLUSTER_CELLS
+        else:
+            sql = accident_points_sql()
+            variant = "points"
+    elif layer == "roads":
+        road_types = next(types for min_zoom, types in ROAD_TYPES_BY_ZOOM if z >= min_zoom)
+        sql = roads_sql(road_types)
+        params["road_types"] = list(road_types) if road_types else None
+    else:
+        sql = regions_sql(layer)
+        params["sa_level"] = layer
+        params["resolution"] = GEOM_RESOLUTIONS[resolution_for_zoom(z)][0]
+
+    version = None
+    if tile_cache.enabled:
+        version = dataset_version.fresh() or await run_in_threadpool(dataset_version.get)
+        tile = await run_in_threadpool(tile_cache.get, version, layer, z, x, y, variant)
+        if tile is not None:
+            return Response(content=tile, media_type=MVT_MEDIA_TYPE)
+
+    row = await fetch_one(db, text(sql), params)
+    tile = bytes(row[0]) if row and row[0] is not None else b""
+
+    if version is not None:
+        await run_in_threadpool(tile_cache.put, version, layer, z, x, y, tile, variant)
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE)
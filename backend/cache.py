@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import json
+import threading
+from collections import OrderedDict
+from datetime import date, time
+from typing import Any, Hashable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from dataset import dataset_version
+
+# --- Response cache ---
+# Responses are fully determined by the endpoint, its parameters and the data load, so they are
+# cached per (endpoint, normalized parameters) and the whole cache is dropped whenever the dataset
+# version changes. Memory is bounded by the (JSON) size of the cached responses, evicting LRU first.
+
+# parameters matched case-insensitively by the queries - folded so 'Monash' and 'monash' share an entry
+CASE_INSENSITIVE_PARAMS = {
+    "sa_name", "sa2_name", "filter_area_name", "region_name", "road_name", "sa_names", "within_name",
+}
+
+_MISSING = object()
+
+# binary columns (WKB geometries) only need sizing, not a readable encoding
+_SIZE_ENCODERS = {bytes: bytes.hex, memoryview: memoryview.hex}
+
+
+def normalize(value: Any, name: Optional[str] = None) -> Hashable:
+    """Turn endpoint parameters into a hashable key, equal for requests that must give equal responses."""
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize(v, k)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted((normalize(v, name) for v in value), key=repr))
+    if isinstance(value, str) and name in CASE_INSENSITIVE_PARAMS:
+        return value.strip().casefold()
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._version: Optional[str] = None
+        self._retired: set = set()  # versions the cache has moved on from
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self, version: str) -> bool:
+        """Move the cache on to `version` if it's new; False for a version it has already left behind."""
+        if version == self._version:
+            return True
+        if version in self._retired:
+            return False
+        if self._version is not None:
+            self._retired.add(self._version)
+        self._entries.clear()
+        self._bytes = 0
+        self._version = version
+        return True
+
+    def get(self, key: Hashable, version: str) -> Any:
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return _MISSING
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, version: str):
+        size = len(json.dumps(jsonable_encoder(value, custom_encoder=_SIZE_ENCODERS), default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # computed under a version the cache has since left (a data load finished meanwhile) - only
+            # get() moves the cache forward, so a late put can't clear what the new version cached
+            if version != self._version:
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self._version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = ResponseCache(settings.response_cache_mb * 1024 * 1024)
+
+
+def cached(func):
+    """Cache an endpoint's return value in response_cache, keyed on its (non-db) parameters."""
+    endpoint = f"{func.__module__}.{func.__name__}"
+
+    def cache_key(kwargs) -> Hashable:
+        params = {k: v for k, v in kwargs.items() if not isinstance(v, (Session, AsyncSession))}
+        return (endpoint, normalize(params))
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not response_cache.max_bytes:
+                return await func(*args, **kwargs)
+
+            key = cache_key(kwargs)
+            version = dataset_version.fresh() or await run_in_threadpool(dataset_version.get)
+
+            value = response_cache.get(key, version)
+            if value is _MISSING:
+                value = await func(*args, **kwargs)
+                response_cache.put(key, value, version)
+            return value
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not response_cache.max_bytes:
+            return func(*args, **kwargs)
+
+        key = cache_key(kwargs)
+        version = dataset_version.get()
+
+        value = response_cache.get(key, version)
+        if value is _MISSING:
+            value = func(*args, **kwargs)
+            response_cache.put(key, value, version)
+        return value
+
+    return wrapper
@@ -1,14 +1,34 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     database_url: str
     allowed_origins_raw: str = ""  # Raw string from .env
+    memory_engine: bool = False  # serve factor counts/trends from in-memory NumPy arrays
+    response_cache_mb: int = 64  # memory budget of the response cache, 0 disables it
+    dataset_version_ttl_s: int = 60  # how often to re-check the dataset version (cache invalidation)
+    async_db: bool = False  # run queries through asyncpg instead of the threadpool
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    statement_timeout_ms: int = 30000  # default server-side statement_timeout, 0 = none
+    statement_timeouts_raw: str = ""  # per-endpoint overrides, e.g. "corridor_crash_density=15000,trends/yearly=5000"
+    disconnect_poll_ms: int = 250  # how often to check for a dropped client while a query runs
+    tile_cache_dir: str = "tile_cache"  # where generated vector tiles are kept, empty disables
+    compress_min_bytes: int = 1024  # responses at least this big are gzip/brotli compressed
+    static_max_age_s: int = 86400  # Cache-Control max-age of the /distinct_sa* and /max_accident_date lookups
+    sql_echo: bool = False  # log every SQL statement (SQLAlchemy echo)
+    slow_query_ms: int = 1000  # log statements at least this slow, 0 disables
+    sql_log_sample_rate: float = 0.0  # fraction of the other statements to log
 
     @property
     def allowed_origins(self) -> List[str]:
         return [origin.strip() for origin in self.allowed_origins_raw.split(",") if origin.strip()]
 
+    @property
+    def statement_timeouts(self) -> Dict[str, int]:
+        pairs = (item.split("=", 1) for item in self.statement_timeouts_raw.split(",") if "=" in item)
+        return {endpoint.strip().strip("/"): int(ms) for endpoint, ms in pairs}
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+
+from config import settings
+from db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- Dataset version ---
+# The data only changes when the data/ import pipeline reruns, which stamps dataset_version
+# (see data/dataset_version.sql). Anything derived from the data (response cache, memory engine, ...)
+# is keyed on this version and gets invalidated/reloaded when it changes.
+
+VERSION_SQL = """
+    SELECT
+      (SELECT MAX(accident_date) FROM accident) AS max_accident_date,
+      (SELECT loaded_at FROM dataset_version)   AS loaded_at
+"""
+
+
+class DatasetVersion:
+    def __init__(self, ttl_s: float):
+        self._ttl_s = ttl_s
+        self._value: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+
+    def on_change(self, listener: Callable[[str], None]):
+        """Run `listener(new_version)` in a background thread whenever the version changes."""
+        self._listeners.append(listener)
+
+    def fresh(self) -> Optional[str]:
+        """Current version if it doesn't need re-reading (so async callers can skip the threadpool)."""
+        if self._value is not None and time.monotonic() - self._checked_at < self._ttl_s:
+            return self._value
+        return None
+
+    def get(self) -> str:
+        """Current version - re-read from the database at most every ttl_s seconds."""
+        value = self.fresh()
+        if value is not None:
+            return value
+
+        with self._lock:
+            if self._value is None or time.monotonic() - self._checked_at >= self._ttl_s:
+                self._refresh()
+        return self._value
+
+    def _refresh(self):
+        with SessionLocal() as db:
+            row = db.execute(text(VERSION_SQL)).fetchone()
+        value = f"{row.max_accident_date}/{row.loaded_at.timestamp() if row.loaded_at else 0}"
+        self._checked_at = time.monotonic()
+
+        previous, self._value = self._value, value
+        if previous is not None and previous != value:
+            logger.info("dataset version changed: %s -> %s", previous, value)
+            for listener in self._listeners:
+                threading.Thread(target=listener, args=(value,), daemon=True).start()
+
+
+dataset_version = DatasetVersion(settings.dataset_version_ttl_s)
@@ -1,15 +1,143 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import time
+from collections import Counter
+from typing import Optional, Union
+
+from fastapi import HTTPException, Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from starlette.concurrency import run_in_threadpool
 
 from config import settings
+from metrics import current_route, instrument_engine, observe_fetch, observe_pool_wait
 
 # --- Database setup ---
-engine = create_engine(settings.database_url, echo=True)
+# SQL is logged by the metrics hooks (slow/sampled statements) - SQL_ECHO=true logs every statement
+engine = create_engine(
+    settings.database_url,
+    echo=settings.sql_echo,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+)
+instrument_engine(engine)
 SessionLocal = sessionmaker(bind=engine)
 
-def get_db():
-    db = SessionLocal()
+# --- Async database setup (ASYNC_DB=true) ---
+# same database through asyncpg, so one worker can keep many slow PostGIS queries in flight
+# without tying up a threadpool thread per query
+async_engine = None
+AsyncSessionLocal = None
+if settings.async_db:
+    async_engine = create_async_engine(
+        make_url(settings.database_url).set(drivername="postgresql+asyncpg"),
+        echo=settings.sql_echo,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+    )
+    instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# unpooled, so cancelling a query never has to wait for the (possibly starved) pool
+cancel_engine = create_engine(settings.database_url, poolclass=NullPool)
+
+DbSession = Union[Session, AsyncSession]
+
+def get_sync_db(request: Request):
+    db = SessionLocal(info={"request": request})
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal(info={"request": request}) as db:
+        yield db
+
+get_db = get_async_db if settings.async_db else get_sync_db
+
+# --- Query execution ---
+# handlers are `async def` and go through these, so they work with either kind of session -
+# sync sessions run the query in the threadpool exactly like a plain `def` handler would.
+# Every query runs under its endpoint's statement_timeout and is cancelled server-side
+# (pg_cancel_backend) as soon as the client that asked for it goes away.
+
+QUERY_CANCELED = "57014"  # SQLSTATE for both statement timeouts and pg_cancel_backend
+
+# {"cancelled": {endpoint: n}, "timed_out": {endpoint: n}}
+query_stats = {"cancelled": Counter(), "timed_out": Counter()}
+
+def endpoint_name(request: Optional[Request]) -> str:
+    route = request.scope.get("route") if request is not None else None
+    return route.path.strip("/") if route is not None else ""
+
+async def _run(db: DbSession, statement, params=None):
+    if isinstance(db, AsyncSession):
+        return await db.execute(statement, params)
+    return await run_in_threadpool(db.execute, statement, params)
+
+async def _checkout(db: DbSession):
+    # the session's first statement is what waits on the pool - time it separately
+    if db.in_transaction():
+        return
+    start = time.perf_counter()
+    if isinstance(db, AsyncSession):
+        await db.connection()
+    else:
+        await run_in_threadpool(db.connection)
+    observe_pool_wait(time.perf_counter() - start)
+
+def _cancel_backend(pid: int):
+    with cancel_engine.connect() as conn:
+        conn.execute(text("SELECT pg_cancel_backend(:pid)"), {"pid": pid})
+
+async def execute(db: DbSession, statement, params=None):
+    request: Optional[Request] = db.info.get("request")
+    endpoint = endpoint_name(request)
+    timeout_ms = settings.statement_timeouts.get(endpoint, settings.statement_timeout_ms)
+    current_route.set(endpoint)  # labels this request's statements in the metrics
+    await _checkout(db)
+
+    # transaction-local timeout + the backend pid to cancel, in one round trip
+    setup = await _run(
+        db,
+        text("SELECT set_config('statement_timeout', :timeout, true), pg_backend_pid()"),
+        {"timeout": str(timeout_ms)},
+    )
+    pid = setup.fetchone()[1]
+
+    query = asyncio.ensure_future(_run(db, statement, params))
+    cancelled = False
+    try:
+        while True:
+            done, _ = await asyncio.wait({query}, timeout=settings.disconnect_poll_ms / 1000)
+            if done:
+                return query.result()
+            if request is not None and not cancelled and await request.is_disconnected():
+                cancelled = True
+                await run_in_threadpool(_cancel_backend, pid)
+    except DBAPIError as e:
+        if getattr(e.orig, "pgcode", None) != QUERY_CANCELED:
+            raise
+        if cancelled:
+            query_stats["cancelled"][endpoint] += 1
+            raise HTTPException(status_code=499, detail="Client closed request")
+        query_stats["timed_out"][endpoint] += 1
+        raise HTTPException(status_code=504, detail=f"Query exceeded the {timeout_ms} ms statement timeout")
+
+async def fetch_all(db: DbSession, statement, params=None):
+    result = await execute(db, statement, params)
+    start = time.perf_counter()
+    rows = result.fetchall()
+    observe_fetch(statement, time.perf_counter() - start, len(rows))
+    return rows
+
+async def fetch_one(db: DbSession, statement, params=None):
+    result = await execute(db, statement, params)
+    start = time.perf_counter()
+    row = result.fetchone()
+    observe_fetch(statement, time.perf_counter() - start, int(row is not None))
+    return row
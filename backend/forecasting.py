@@ -0,0 +1,120 @@
+from statistics import NormalDist
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional - /forecast/regions answers 503 without it
+    np = None
+
+# --- Batched forecasting ---
+# Fits one model to many series at once: every (region, metric) history is a row of a matrix and
+# all rows are fitted together with vectorized least squares, so forecasting every SA2 of the
+# state costs about as much as forecasting one. Each forecast comes with a prediction interval.
+#
+#   ols       y = a + b*year                      (linear trend)
+#   mean      y = a                               (flat)
+#   poisson   log E[y] = a + b*year               (multiplicative trend on counts, fitted by IRLS)
+#   seasonal  y = a + b*month + season[month]     (monthly series, summed over the target year)
+
+METHODS = ("ols", "mean", "poisson", "seasonal")
+POISSON_ITERATIONS = 25
+
+
+def z_score(level: float) -> float:
+    # normal rather than Student-t quantiles - fine for the 10+ year histories used here
+    return NormalDist().inv_cdf(0.5 + level / 2)
+
+
+def _linear(design: "np.ndarray", ys: "np.ndarray", target: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """Least squares of every row of ys on the shared design matrix.
+
+    Returns the prediction at the `target` design row and its standard error per series.
+    """
+    n, p = design.shape
+    coef, *_ = np.linalg.lstsq(design, ys.T, rcond=None)  # (p, series)
+    residuals = ys - (design @ coef).T
+    dof = max(n - p, 1)
+    sigma2 = (residuals ** 2).sum(axis=1) / dof
+
+    xtx_inv = np.linalg.pinv(design.T @ design)
+    leverage = target @ xtx_inv @ target
+    # the target row may aggregate several periods (seasonal) - `weight` of them carry fresh noise
+    weight = target[0]
+    yhat = target @ coef
+    se = np.sqrt(sigma2 * (weight + leverage))
+    return yhat, se
+
+
+def _poisson(xs: "np.ndarray", ys: "np.ndarray", x_target: float) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Log-linear Poisson trend for every row of ys, by iteratively reweighted least squares."""
+    eta = np.log(ys + 0.5)
+    for _ in range(POISSON_ITERATIONS):
+        mu = np.exp(eta)
+        z = eta + (ys - mu) / mu
+        s0 = mu.sum(axis=1)
+        s1 = (mu * xs).sum(axis=1)
+        s2 = (mu * xs ** 2).sum(axis=1)
+        t0 = (mu * z).sum(axis=1)
+        t1 = (mu * z * xs).sum(axis=1)
+        det = np.maximum(s0 * s2 - s1 ** 2, 1e-12)
+        a = (s2 * t0 - s1 * t1) / det
+        b = (s0 * t1 - s1 * t0) / det
+        eta = np.clip(a[:, None] + b[:, None] * xs, -30, 30)
+
+    mu = np.exp(eta)
+    s0, s1, s2 = mu.sum(axis=1), (mu * xs).sum(axis=1), (mu * xs ** 2).sum(axis=1)
+    det = np.maximum(s0 * s2 - s1 ** 2, 1e-12)
+    var_eta = (s2 - 2 * x_target * s1 + x_target ** 2 * s0) / det
+    yhat = np.exp(np.clip(a + b * x_target, -30, 30))
+    # count noise plus parameter uncertainty (delta method)
+    se = np.sqrt(yhat + yhat ** 2 * var_eta)
+    return yhat, se
+
+
+def fit_yearly(method: str, years: List[int], ys: "np.ndarray", target_year: int):
+    """Forecast `target_year` of every yearly series (rows of ys, one column per year)."""
+    xs = np.asarray(years, dtype=float) - np.mean(years)  # centred for conditioning
+    x_target = target_year - np.mean(years)
+
+    if method == "poisson":
+        return _poisson(xs, ys, x_target)
+    if method == "mean":
+        design, target = np.ones((len(xs), 1)), np.array([1.0])
+    else:  # ols
+        design = np.column_stack([np.ones_like(xs), xs])
+        target = np.array([1.0, x_target])
+    return _linear(design, ys, target)
+
+
+def fit_seasonal(year_from: int, ys: "np.ndarray", target_year: int):
+    """Forecast the `target_year` total of every monthly series (rows of ys, 12 columns a year)."""
+    n = ys.shape[1]
+    t = np.arange(n, dtype=float) - (n - 1) / 2
+    months = np.arange(n) % 12
+    # intercept + trend + 11 month effects (January is the baseline)
+    design = np.column_stack([np.ones(n), t] + [(months == m).astype(float) for m in range(1, 12)])
+
+    first = (target_year - year_from) * 12
+    future_t = np.arange(first, first + 12, dtype=float) - (n - 1) / 2
+    future = np.column_stack([np.ones(12), future_t] + [(np.arange(12) == m).astype(float) for m in range(1, 12)])
+    # the annual total is the sum of the 12 monthly predictions
+    return _linear(design, ys, future.sum(axis=0))
+
+
+def forecast(method: str, year_from: int, year_to: int, target_year: int,
+             series: "np.ndarray", level: float) -> Dict[str, "np.ndarray"]:
+    """Point forecasts and `level` prediction intervals for every row of `series`.
+
+    `series` holds yearly values (one column per year) or, for `seasonal`, monthly values.
+    """
+    if method == "seasonal":
+        yhat, se = fit_seasonal(year_from, series, target_year)
+    else:
+        yhat, se = fit_yearly(method, list(range(year_from, year_to + 1)), series, target_year)
+
+    z = z_score(level)
+    return {
+        "forecast": np.maximum(yhat, 0),
+        "lower": np.maximum(yhat - z * se, 0),
+        "upper": np.maximum(yhat + z * se, 0),
+    }
@@ -0,0 +1,166 @@
+import functools
+from datetime import date, time
+from decimal import Decimal
+from typing import Any, Iterable, List, Literal, Optional
+
+import orjson
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional - format=arrow answers 406 without it
+    pa = None
+
+try:
+    import msgpack
+except ImportError:  # optional - format=msgpack answers 406 without it
+    msgpack = None
+
+# --- Response formats ---
+# List endpoints can answer in more compact formats than the default JSON, picked with the
+# `format` query parameter or the Accept header:
+#   json     - plain JSON (orjson), geometries as WKT - the default
+#   geojson  - a FeatureCollection, geometries from ST_AsGeoJSON
+#   arrow    - an Arrow IPC stream, geometries as WKB (ST_AsBinary)
+#   msgpack  - MessagePack, geometries as WKB (ST_AsBinary)
+# Endpoints take `fmt: str = Depends(response_format)`, build their geometry columns with
+# geometry_sql() and are wrapped in @formatted, which renders the (cached) rows.
+
+Format = Literal["json", "geojson", "arrow", "msgpack"]
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "geojson": "application/geo+json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "msgpack": "application/msgpack",
+}
+
+# Accept header media type -> format, including the common aliases
+ACCEPTED = {
+    **{media_type: fmt for fmt, media_type in MEDIA_TYPES.items()},
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/x-msgpack": "msgpack",
+    "application/*": "json",
+    "*/*": "json",
+}
+
+
+def _accepted_formats(accept: str) -> List[str]:
+    """Formats named in an Accept header, best quality first."""
+    ranked = []
+    for i, part in enumerate(accept.split(",")):
+        media_type, *options = (p.strip() for p in part.split(";"))
+        quality = 1.0
+        for option in options:
+            if option.startswith("q="):
+                try:
+                    quality = float(option[2:])
+                except ValueError:
+                    pass
+        if media_type.lower() in ACCEPTED and quality > 0:
+            ranked.append((-quality, i, ACCEPTED[media_type.lower()]))
+    return [fmt for _, _, fmt in sorted(ranked)]
+
+
+def response_format(request: Request, format: Optional[Format] = None) -> str:
+    """Dependency picking the response format - `format` wins over the Accept header."""
+    if format is None:
+        accepted = _accepted_formats(request.headers.get("accept", ""))
+        format = accepted[0] if accepted else "json"
+
+    if format == "arrow" and pa is None:
+        raise HTTPException(status_code=406, detail="Arrow responses need pyarrow installed on the server")
+    if format == "msgpack" and msgpack is None:
+        raise HTTPException(status_code=406, detail="MessagePack responses need msgpack installed on the server")
+    return format
+
+
+def geometry_sql(expr: str, fmt: str, digits: Optional[int] = None) -> str:
+    """SQL serializing the geometry `expr` the way `fmt` ships it."""
+    if fmt == "geojson":
+        return f"ST_AsGeoJSON({expr}, {digits})" if digits is not None else f"ST_AsGeoJSON({expr})"
+    if fmt in ("arrow", "msgpack"):
+        return f"ST_AsBinary({expr})"
+    return f"ST_AsText({expr}, {digits})" if digits is not None else f"ST_AsText({expr})"
+
+
+def _plain(value: Any) -> Any:
+    # psycopg2 hands bytea (ST_AsBinary) back as memoryview
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return value
+
+
+def _records(rows: Iterable[Any]) -> List[dict]:
+    return [
+        {k: _plain(v) for k, v in (row.model_dump() if isinstance(row, BaseModel) else row).items()}
+        for row in rows
+    ]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def to_geojson(rows: List[dict], geometry: Optional[str], geometries: Iterable[str] = ()) -> bytes:
+    features = []
+    for row in rows:
+        properties = dict(row)
+        geom = properties.pop(geometry, None) if geometry else None
+        for column in geometries:
+            if properties.get(column) is not None:
+                properties[column] = orjson.loads(properties[column])
+        features.append({
+            "type": "Feature",
+            "geometry": orjson.loads(geom) if geom else None,
+            "properties": properties,
+        })
+    return orjson.dumps({"type": "FeatureCollection", "features": features}, default=_default)
+
+
+def to_arrow(rows: List[dict]) -> bytes:
+    table = pa.Table.from_pylist(rows)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_msgpack(rows: List[dict]) -> bytes:
+    return msgpack.packb(rows, default=_default, use_bin_type=True)
+
+
+def render(result: Any, fmt: str, geometry: Optional[str] = None, geometries: Iterable[str] = ()) -> Any:
+    """Render an endpoint's list of rows in `fmt`; JSON is left to FastAPI (and its response_model)."""
+    if fmt == "json" or not isinstance(result, list):
+        return result
+
+    rows = _records(result)
+    if fmt == "geojson":
+        content = to_geojson(rows, geometry, geometries)
+    elif fmt == "arrow":
+        content = to_arrow(rows)
+    else:
+        content = to_msgpack(rows)
+    return Response(content=content, media_type=MEDIA_TYPES[fmt])
+
+
+def formatted(geometry: Optional[str] = None, geometries: Iterable[str] = ()):
+    """Render the endpoint's rows in the negotiated format.
+
+    `geometry` is the column that becomes the GeoJSON feature geometry, `geometries` any further
+    geometry columns (parsed into GeoJSON objects among the feature's properties).
+    Goes above @cached, so the cache holds rows rather than rendered responses.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            return render(result, kwargs.get("fmt", "json"), geometry, geometries)
+        return wrapper
+    return decorator
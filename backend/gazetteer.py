@@ -0,0 +1,172 @@
+import difflib
+import logging
+import re
+from bisect import bisect_left
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from db import SessionLocal
+from names import name_key
+
+logger = logging.getLogger(__name__)
+
+# --- Region gazetteer ---
+# Every SA2/SA3/SA4 with its place in the hierarchy, loaded from sa_region (a few hundred rows, see
+# data/sa_regions.sql) at startup and again whenever the dataset version changes. Answers the
+# /distinct_sa* lists, /max_accident_date, region search (autocomplete) and parent/child lookups
+# from memory; the endpoints fall back to SQL whenever it isn't loaded.
+
+SA_LEVELS = ["sa2", "sa3", "sa4"]  # smallest to largest
+
+REGION_SQL = """
+    SELECT sa_level, sa_code, sa_name, sa3_name21, sa4_name21
+    FROM sa_region
+"""
+
+MAX_DATE_SQL = "SELECT MAX(accident_date) FROM accident"
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def _normalize(name: str) -> str:
+    """Lowercase, punctuation and runs of spaces folded to one space ("CBD - East" -> "cbd east")."""
+    return _NON_ALNUM.sub(" ", name.lower()).strip()
+
+
+class Gazetteer:
+    def __init__(self):
+        self._data: Optional[dict] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._data is not None
+
+    def load(self):
+        """(Re)load the hierarchy from the database; the previous snapshot keeps serving until done."""
+        with SessionLocal() as db:
+            rows = db.execute(text(REGION_SQL)).fetchall()
+            max_date = db.execute(text(MAX_DATE_SQL)).scalar()
+
+        regions: Dict[tuple, dict] = {}
+        for level, code, name, sa3_name, sa4_name in rows:
+            regions[(level, name_key(name))] = {
+                "sa_level": level,
+                "sa_code": code,
+                "sa_name": name,
+                "sa3_name": sa3_name if level == "sa2" else None,
+                "sa4_name": sa4_name if level != "sa4" else None,
+            }
+
+        children: Dict[tuple, Dict[str, List[str]]] = {}
+        for region in regions.values():
+            for parent_level in SA_LEVELS[SA_LEVELS.index(region["sa_level"]) + 1:]:
+                parent = region[f"{parent_level}_name"]
+                if parent:
+                    children.setdefault((parent_level, name_key(parent)), {}) \
+                        .setdefault(region["sa_level"], []).append(region["sa_name"])
+        for by_level in children.values():
+            for names in by_level.values():
+                names.sort()
+
+        # sorted (key, region) pairs for prefix search by bisection: whole names, and every word in
+        # them so "east" finds "Melbourne CBD - East"
+        by_name, by_word = [], []
+        for region in regions.values():
+            key = _normalize(region["sa_name"])
+            entry = (region["sa_level"], name_key(region["sa_name"]))
+            by_name.append((key, entry))
+            words = key.split()
+            for i in range(1, len(words)):
+                by_word.append((" ".join(words[i:]), entry))
+        by_name.sort()
+        by_word.sort()
+
+        self._data = {
+            "regions": regions,
+            "children": children,
+            "names": {
+                level: sorted(r["sa_name"] for r in regions.values() if r["sa_level"] == level)
+                for level in SA_LEVELS
+            },
+            "by_name": by_name,
+            "by_word": by_word,
+            "max_accident_date": max_date,
+        }
+        logger.info("region gazetteer loaded %d regions", len(regions))
+
+    # --- lookups ---
+    def names(self, sa_level: str) -> List[str]:
+        return self._data["names"][sa_level]
+
+    def max_accident_date(self) -> Optional[date]:
+        return self._data["max_accident_date"]
+
+    def get(self, sa_level: str, sa_name: str) -> Optional[dict]:
+        return self._data["regions"].get((sa_level.lower(), name_key(sa_name)))
+
+    def children(self, sa_level: str, sa_name: str) -> Dict[str, List[str]]:
+        """Names of the regions inside one, per smaller level (an SA4's SA3s and SA2s)."""
+        return self._data["children"].get((sa_level.lower(), name_key(sa_name)), {})
+
+    def contains(self, parent_level: str, parent_name: str, sa_level: str, sa_name: str) -> bool:
+        """Whether sa_name lies inside parent_name (a region contains itself)."""
+        region = self.get(sa_level, sa_name)
+        if region is None:
+            return False
+        if parent_level == region["sa_level"]:
+            return name_key(region["sa_name"]) == name_key(parent_name)
+        parent = region.get(f"{parent_level}_name")
+        return parent is not None and name_key(parent) == name_key(parent_name)
+
+    # --- search ---
+    def _prefixed(self, index: list, key: str, levels: List[str]) -> List[tuple]:
+        entries = []
+        i = bisect_left(index, (key,))
+        while i < len(index) and index[i][0].startswith(key):
+            if index[i][1][0] in levels:
+                entries.append(index[i][1])
+            i += 1
+        return entries
+
+    def search(self, query: str, levels: Optional[List[str]] = None, limit: int = 10) -> List[dict]:
+        """
+        Regions matching what's been typed so far: names starting with it first, then names with a
+        word starting with it, then (for typos) close matches. Shorter names first within each group.
+        """
+        levels = levels or SA_LEVELS
+        key = _normalize(query)
+        if not key:
+            return []
+
+        results, seen = [], set()
+
+        def add(entries, match):
+            for entry in sorted(entries, key=lambda e: (len(e[1]), e[1], SA_LEVELS.index(e[0]))):
+                if entry not in seen and len(results) < limit:
+                    seen.add(entry)
+                    results.append({**self._data["regions"][entry], "match": match})
+
+        add(self._prefixed(self._data["by_name"], key, levels), "prefix")
+        add(self._prefixed(self._data["by_word"], key, levels), "word")
+
+        if len(results) < limit:
+            candidates: Dict[str, List[tuple]] = {}
+            for normalized, entry in self._data["by_name"]:
+                if entry[0] in levels:
+                    candidates.setdefault(normalized, []).append(entry)
+            # compare against names cut to the query's length too, so a misspelt prefix still matches
+            close = difflib.get_close_matches(key, list(candidates), n=limit, cutoff=0.75)
+            partial: Dict[str, List[str]] = {}
+            for normalized in candidates:
+                partial.setdefault(normalized[:len(key)], []).append(normalized)
+            for cut in difflib.get_close_matches(key, list(partial), n=limit, cutoff=0.75):
+                close += partial[cut]
+            for normalized in close:
+                add(candidates[normalized], "fuzzy")
+
+        return results
+
+
+gazetteer = Gazetteer()
@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+from typing import List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from cache import normalize
+from dataset import dataset_version
+
+try:
+    import brotli
+except ImportError:  # optional - gzip only without it
+    brotli = None
+
+# --- HTTP caching ---
+# Responses are fully determined by the request and the data load, so every GET carries a strong
+# ETag of (dataset version, normalized request). A matching If-None-Match is answered with 304
+# before the request reaches a handler (let alone the database). Large bodies are compressed
+# (brotli if the client takes it, else gzip), and Cache-Control lets browsers/nginx keep
+# responses: the static lookups for a day, everything else only with revalidation.
+
+# lookups that only change with a data load
+STATIC_PATHS = {
+    "/distinct_sa2", "/distinct_sa3", "/distinct_sa4", "/max_accident_date",
+    "/regions/search", "/regions/hierarchy",
+}
+
+# live counters/health - never validated or cached
+UNCACHED_PATHS = {"/health", "/cache/stats", "/db/stats", "/metrics"}
+
+# bodies that don't get smaller by compressing them again
+INCOMPRESSIBLE_TYPES = ("image/png", "image/jpeg", "application/zip", "application/gzip")
+
+
+def request_etag(scope: Scope, version: str) -> str:
+    request = Request(scope)
+    params = {}
+    for key, value in request.query_params.multi_items():
+        params.setdefault(key, []).append(value)
+    key = (
+        version,
+        scope["method"],
+        scope["path"],
+        normalize(params),
+        request.headers.get("accept", ""),  # picks the response format
+    )
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def _etag_matches(if_none_match: str, etags: List[str]) -> Optional[str]:
+    """The etag of `etags` that If-None-Match names (weak or strong), if any.
+
+    `*` never matches: the etags are computed, not looked up, so they say nothing about whether
+    the client holds a representation.
+    """
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return next((etag for etag in etags if etag in candidates), None)
+
+
+def _data_route(scope: Scope) -> Optional[BaseRoute]:
+    """The route a request is for if its response derives from the data - None for unknown paths and
+    the API docs, which must keep working (and not read the dataset version) without the database."""
+    app = scope.get("app")
+    docs = {getattr(app, attr, None) for attr in ("docs_url", "redoc_url", "openapi_url", "swagger_ui_oauth2_redirect_url")}
+    if scope["path"] in docs:
+        return None
+    for route in getattr(getattr(app, "router", None), "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def _encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, *options = (p.strip() for p in part.split(";"))
+        quality = 1.0
+        for option in options:
+            if option.startswith("q="):
+                try:
+                    quality = float(option[2:])
+                except ValueError:
+                    pass
+        if quality > 0:
+            accepted.add(coding.lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class HttpCacheMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, static_max_age: int = 86400):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.static_max_age = static_max_age
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in UNCACHED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = _encoding(headers.get("accept-encoding", ""))
+        cache_control = (
+            f"public, max-age={self.static_max_age}" if scope["path"] in STATIC_PATHS else "no-cache"
+        )
+
+        etag = None
+        route = _data_route(scope) if scope["method"] in ("GET", "HEAD") else None
+        if route is not None:
+            version = dataset_version.fresh() or await run_in_threadpool(dataset_version.get)
+            etag = request_etag(scope, version)
+            # one representation per content coding, so the tags have to differ too
+            etags = [f'"{etag}"'] + [f'"{etag}-{coding}"' for coding in ("gzip", "br")]
+            matched = _etag_matches(headers.get("if-none-match", ""), etags)
+            if matched:
+                scope["route"] = route  # answered before routing - label it for the metrics all the same
+                await send({
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": [
+                        (b"etag", matched.encode()),
+                        (b"cache-control", cache_control.encode()),
+                        (b"vary", b"Accept, Accept-Encoding"),
+                    ],
+                })
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def send_buffered(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            response_headers = MutableHeaders(scope=start)
+            coding = None
+            if (
+                encoding
+                and scope["method"] != "HEAD"
+                and len(body) >= self.minimum_size
+                and "content-encoding" not in response_headers
+                and not response_headers.get("content-type", "").startswith(INCOMPRESSIBLE_TYPES)
+            ):
+                coding = encoding
+                body = brotli.compress(body, quality=5) if coding == "br" else gzip.compress(body, compresslevel=6)
+                response_headers["content-encoding"] = coding
+                response_headers["content-length"] = str(len(body))
+
+            response_headers.append("vary", "Accept, Accept-Encoding")
+            if start["status"] == 200 and etag is not None:
+                response_headers["etag"] = f'"{etag}-{coding}"' if coding else f'"{etag}"'
+                response_headers["cache-control"] = cache_control
+
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_buffered)
@@ -0,0 +1,98 @@
+import math
+import struct
+import zlib
+from typing import Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional - /heatmap/density answers 503 without it
+    np = None
+
+# --- Kernel density rasters ---
+# Smooth crash-density surfaces: crashes are counted per raster pixel (in SQL, see api/heatmap.py)
+# and the count grid is convolved with a Gaussian kernel in one FFT pass, so the cost depends on the
+# raster and kernel size rather than on how many crashes there are. Rasters are laid out in web
+# mercator (EPSG 3857) so they overlay a web map's bbox exactly, north row first.
+
+EARTH_RADIUS = 6378137.0  # metres, EPSG 3857
+KERNEL_SIGMAS = 3  # the kernel is cut off this many bandwidths out
+
+# colour ramp of the PNG rasters: (position, RGBA) - transparent where there are no crashes
+RAMP = [
+    (0.0, (255, 255, 178, 0)),
+    (0.15, (254, 217, 118, 120)),
+    (0.35, (254, 178, 76, 170)),
+    (0.55, (253, 141, 60, 200)),
+    (0.75, (240, 59, 32, 225)),
+    (1.0, (189, 0, 38, 255)),
+]
+
+
+def mercator(lon: float, lat: float) -> Tuple[float, float]:
+    x = math.radians(lon) * EARTH_RADIUS
+    y = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) * EARTH_RADIUS
+    return x, y
+
+
+def gaussian_kernel(sigma_px: float) -> "np.ndarray":
+    """Normalized 2D Gaussian, the outer product of the 1D kernel with itself."""
+    radius = max(1, math.ceil(KERNEL_SIGMAS * sigma_px))
+    offsets = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel_1d = np.exp(-0.5 * (offsets / sigma_px) ** 2)
+    kernel = np.outer(kernel_1d, kernel_1d)
+    return kernel / kernel.sum()
+
+
+def convolve(counts: "np.ndarray", kernel: "np.ndarray") -> "np.ndarray":
+    """`counts` convolved with `kernel` through real FFTs, cropped back to the shape of `counts`."""
+    kh, kw = kernel.shape
+    shape = (counts.shape[0] + kh - 1, counts.shape[1] + kw - 1)
+    full = np.fft.irfft2(np.fft.rfft2(counts, shape) * np.fft.rfft2(kernel, shape), shape)
+    cropped = full[kh // 2:kh // 2 + counts.shape[0], kw // 2:kw // 2 + counts.shape[1]]
+    return np.clip(cropped, 0, None)  # FFT round-off leaves tiny negatives
+
+
+def density(counts: "np.ndarray", sigma_px: float, margin: int, pixel_km2: float) -> "np.ndarray":
+    """
+    Crashes per km² of every pixel. `counts` carries `margin` extra pixels on each side (crashes just
+    outside the raster that still spill into it), which are cut off again after smoothing.
+    """
+    smoothed = convolve(counts, gaussian_kernel(sigma_px)) / pixel_km2
+    inner = smoothed[margin:smoothed.shape[0] - margin, margin:smoothed.shape[1] - margin]
+    return inner[::-1]  # counts are south row first, rasters north row first
+
+
+def to_uint16(values: "np.ndarray", scale_max: float) -> "np.ndarray":
+    """Linear scale with scale_max at 65535."""
+    if scale_max <= 0:
+        return np.zeros(values.shape, dtype=np.uint16)
+    return np.round(np.clip(values / scale_max, 0, 1) * 65535).astype(np.uint16)
+
+
+def colorize(values: "np.ndarray", scale_max: float) -> "np.ndarray":
+    """RGBA image of the ramp, scale_max (and above) at the hot end."""
+    positions = [p for p, _ in RAMP]
+    table = np.stack(
+        [np.interp(np.linspace(0, 1, 256), positions, [c[band] for _, c in RAMP]) for band in range(4)],
+        axis=1,
+    ).round().astype(np.uint8)
+    return table[(to_uint16(values, scale_max) >> 8)]
+
+
+def encode_png(image: "np.ndarray") -> bytes:
+    """PNG of an RGBA uint8 (height, width, 4) image, written with zlib alone."""
+    height, width = image.shape[:2]
+    # every scanline starts with its filter type - 0, none
+    scanlines = np.zeros((height, 1 + width * 4), dtype=np.uint8)
+    scanlines[:, 1:] = image.reshape(height, width * 4)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)  # 8-bit RGBA
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
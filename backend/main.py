@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+import logging
+
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -9,9 +12,24 @@ load_dotenv(".env")  # Load variables from .env file
 from typing import List
 
 from config import settings
+from memory_engine import memory_engine
+from gazetteer import gazetteer
+from dataset import dataset_version
+from cache import response_cache
+from tile_cache import tile_cache
+from db import query_stats
+from http_cache import HttpCacheMiddleware
+import metrics
 
 # --- FastAPI app ---
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# ETags/304s, compression and Cache-Control (added first so CORS still wraps its responses)
+app.add_middleware(
+    HttpCacheMiddleware,
+    minimum_size=settings.compress_min_bytes,
+    static_max_age=settings.static_max_age_s,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,19 +43,66 @@ app.add_middleware(
     allow_origins = (settings.allowed_origins or ["*"]),
     allow_methods=["*"],
     allow_headers=["*"],
+    # describe the /heatmap/density rasters to browser clients
+    expose_headers=["X-Raster-Size", "X-Raster-Bbox", "X-Density-Max"],
 )
 
+# outermost, so latency and sizes include the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.on_event("startup")
+def load_memory_engine():
+    if settings.memory_engine:
+        try:
+            memory_engine.load()
+        except Exception:
+            # stay on the SQL paths rather than refusing to start
+            logging.exception("failed to load memory engine")
+        # pick up new data loads without a restart
+        dataset_version.on_change(lambda version: memory_engine.load())
+
+@app.on_event("startup")
+def load_gazetteer():
+    try:
+        gazetteer.load()
+    except Exception:
+        # the region lookups fall back to SQL until the next data load
+        logging.exception("failed to load region gazetteer")
+    dataset_version.on_change(lambda version: gazetteer.load())
+
+@app.on_event("startup")
+def prune_tile_cache():
+    # each worker prunes towards the version it has just read - the newest, so none of them removes
+    # tiles of a version its neighbours are already on
+    if tile_cache.enabled:
+        dataset_version.on_change(tile_cache.prune)
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/cache/stats")
+def get_cache_stats():
+    return response_cache.stats()
+
+@app.get("/metrics")
+def get_metrics():
+    content, media_type = metrics.render()
+    return Response(content=content, media_type=media_type)
+
+@app.get("/db/stats")
+def get_db_stats():
+    return {outcome: dict(counts) for outcome, counts in query_stats.items()}
+
 # Registering endpoints from different modules/groups of endpoints
-from api import basic_data, stats_trends, factors_dry as factors, blackspot_corridor
+from api import basic_data, stats_trends, factors_dry as factors, blackspot_corridor, tiles, heatmap
 
 app.include_router(basic_data.app)
 app.include_router(stats_trends.app)
 app.include_router(factors.app)
 app.include_router(blackspot_corridor.router)
+app.include_router(tiles.app)
+app.include_router(heatmap.app)
 
 ### Additional endpoints for distinct area names
 
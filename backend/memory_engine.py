@@ -0,0 +1,208 @@
+import logging
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from db import SessionLocal
+from names import name_key
+
+try:
+    import numpy as np
+except ImportError:  # optional - the SQL paths are used when numpy isn't installed
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# --- In-memory aggregation engine ---
+# Loads the accident/person columns behind /factor_counts, /trends/* and /forecast/yearly once into
+# NumPy arrays (categories and regions integer-coded) and answers those endpoints with masking and
+# bincount instead of a Postgres round trip. Switched on with MEMORY_ENGINE=true; every endpoint keeps
+# its SQL path as the fallback whenever the engine isn't loaded.
+
+SEVERITIES = ["Injury", "SeriousInjury"]  # same labels (and order) as the factor SQL
+SA_LEVELS = ["sa2", "sa3", "sa4"]
+
+ACCIDENT_SQL = """
+    SELECT
+      accident_date,
+      COALESCE(inj_or_fatal, 0)  AS inj_or_fatal,
+      COALESCE(seriousinjury, 0) AS seriousinjury,
+      CASE
+        WHEN severity = 'Other injury accident'   THEN 0
+        WHEN severity = 'Serious injury accident' THEN 1
+        ELSE -1
+      END AS severity,
+      COALESCE(sa2_code21, -1) AS sa2,
+      COALESCE(sa3_code21, -1) AS sa3,
+      COALESCE(sa4_code21, -1) AS sa4
+    FROM accident
+    ORDER BY accident_no
+"""
+
+# rows of every other table are tied back to the accident arrays by position
+FACTOR_SQL = """
+    WITH accident_index AS (
+        SELECT accident_no, (row_number() OVER (ORDER BY accident_no) - 1)::int AS i
+        FROM accident
+    )
+    SELECT idx.i, {categories}
+    FROM {table}
+    {joins}
+    JOIN accident_index idx ON idx.accident_no = a.accident_no
+"""
+
+REGION_SQL = "SELECT sa_level, sa_code, sa_name FROM sa_region"
+
+
+def _encode(values: list, order: List[str]):
+    """Integer-code a column of category strings in display order; NULL becomes -1."""
+    extra = sorted({v for v in values if v is not None and v not in order})
+    categories = list(order) + extra
+    lookup = {c: i for i, c in enumerate(categories)}
+    codes = np.fromiter((lookup.get(v, -1) for v in values), dtype=np.int16, count=len(values))
+    return codes, categories
+
+
+class MemoryEngine:
+    def __init__(self):
+        self._data: Optional[dict] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._data is not None
+
+    def load(self):
+        """(Re)load every array from the database; the previous snapshot keeps serving until done."""
+        if np is None:
+            logger.warning("memory engine requested but numpy is not installed - using SQL")
+            return
+
+        # imported here as the routers import this module
+        from api.factors_dry import CATEGORY_ORDER, FACTOR_SQL_CONFIG, category_sql, factor_groups
+
+        with SessionLocal() as db:
+            rows = db.execute(text(ACCIDENT_SQL)).fetchall()
+            dates, inj, serious, sev, sa2, sa3, sa4 = zip(*rows) if rows else ([],) * 7
+
+            data = {
+                "year": np.array([d.year if d else 0 for d in dates], dtype=np.int16),
+                "month": np.array([d.month if d else 0 for d in dates], dtype=np.int8),
+                "inj_or_fatal": np.array(inj, dtype=np.int32),
+                "seriousinjury": np.array(serious, dtype=np.int32),
+                "severity": np.array(sev, dtype=np.int8),
+                "region": {
+                    "sa2": np.array(sa2, dtype=np.int32),
+                    "sa3": np.array(sa3, dtype=np.int32),
+                    "sa4": np.array(sa4, dtype=np.int32),
+                },
+                "factors": {},
+                "region_codes": {},
+            }
+
+            # one scan per (table, joins) combination covers all factors living on it
+            for (table, joins), factors in factor_groups(list(FACTOR_SQL_CONFIG)).items():
+                sql = FACTOR_SQL.format(
+                    categories=", ".join(category_sql(f) for f in factors),
+                    table=table,
+                    joins=joins,
+                )
+                columns = list(zip(*db.execute(text(sql)).fetchall())) or [[]] * (len(factors) + 1)
+                acc_idx = np.array(columns[0], dtype=np.int64)
+                # gathered once per table so a request never has to index through acc_idx
+                severity = data["severity"][acc_idx]
+                region = {lvl: data["region"][lvl][acc_idx] for lvl in SA_LEVELS}
+                for factor, values in zip(factors, columns[1:]):
+                    codes, categories = _encode(list(values), CATEGORY_ORDER[factor])
+                    data["factors"][factor] = {
+                        "codes": codes,
+                        "categories": categories,
+                        "severity": severity,
+                        "region": region,
+                    }
+
+            for level, code, name in db.execute(text(REGION_SQL)).fetchall():
+                data["region_codes"][(level, name_key(name))] = code
+
+        self._data = data
+        logger.info("memory engine loaded %d accidents", len(data["year"]))
+
+    def region_code(self, sa_level: str, sa_name: str) -> Optional[int]:
+        return self._data["region_codes"].get((sa_level.lower(), name_key(sa_name)))
+
+    # --- /factor_counts ---
+    def factor_counts(self, factor: str, sa_level: Optional[str] = None, sa_name: Optional[str] = None) -> List[dict]:
+        f = self._data["factors"][factor]
+        mask = (f["codes"] >= 0) & (f["severity"] >= 0)
+        if sa_level:
+            code = self.region_code(sa_level, sa_name)
+            if code is None:
+                return []
+            mask &= f["region"][sa_level.lower()] == code
+
+        n_sev = len(SEVERITIES)
+        keys = f["codes"][mask].astype(np.int64) * n_sev + f["severity"][mask]
+        counts = np.bincount(keys, minlength=len(f["categories"]) * n_sev)
+        return [
+            {"category": category, "severity": severity, "count": int(counts[i * n_sev + j])}
+            for i, category in enumerate(f["categories"])
+            for j, severity in enumerate(SEVERITIES)
+            if counts[i * n_sev + j]
+        ]
+
+    def _region_mask(self, mask, sa_level: Optional[str], sa_name: Optional[str]):
+        """Narrow an accident mask to a region; None if the region doesn't exist."""
+        if not sa_level:
+            return mask
+        code = self.region_code(sa_level, sa_name)
+        if code is None:
+            return None
+        return mask & (self._data["region"][sa_level.lower()] == code)
+
+    # --- /trends/yearly, /forecast/yearly ---
+    def yearly_totals(self, year_from: int, year_to: int,
+                      sa_level: Optional[str] = None, sa_name: Optional[str] = None) -> List[dict]:
+        n = year_to - year_from + 1
+        if n <= 0:
+            return []
+        d = self._data
+        mask = self._region_mask((d["year"] >= year_from) & (d["year"] <= year_to), sa_level, sa_name)
+        if mask is None:
+            return []
+        offset = d["year"][mask].astype(np.int64) - year_from
+        crashes = np.bincount(offset, minlength=n)
+        injuries = np.bincount(offset, weights=d["inj_or_fatal"][mask], minlength=n)
+        serious = np.bincount(offset, weights=d["seriousinjury"][mask], minlength=n)
+        return [
+            {
+                "year": year_from + i,
+                "crashes": int(crashes[i]),
+                "total_injuries": int(injuries[i]),
+                "serious_injuries": int(serious[i]),
+            }
+            for i in range(n)
+            if crashes[i]
+        ]
+
+    # --- /trends/monthly ---
+    def monthly_totals(self, year: int, sa_level: Optional[str] = None, sa_name: Optional[str] = None) -> List[dict]:
+        d = self._data
+        mask = self._region_mask(d["year"] == year, sa_level, sa_name)
+        if mask is None:
+            mask = np.zeros_like(d["year"], dtype=bool)
+        month = d["month"][mask].astype(np.int64)
+        crashes = np.bincount(month, minlength=13)
+        injuries = np.bincount(month, weights=d["inj_or_fatal"][mask], minlength=13)
+        serious = np.bincount(month, weights=d["seriousinjury"][mask], minlength=13)
+        return [
+            {
+                "period": date(year, m, 1).strftime("%Y-%m"),
+                "crashes": int(crashes[m]),
+                "total_injuries": int(injuries[m]),
+                "serious_injuries": int(serious[m]),
+            }
+            for m in range(1, 13)
+        ]
+
+
+memory_engine = MemoryEngine()
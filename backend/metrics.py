@@ -0,0 +1,133 @@
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+
+logger = logging.getLogger("sql")
+
+# --- Metrics ---
+# Prometheus metrics served on /metrics: request latency and response size per route, and per SQL
+# statement the execution time (SQLAlchemy cursor events), fetch time and rows returned, plus how
+# long requests wait for a pooled connection. Statements are labelled by route and by their first
+# CTE (or table), e.g. route="corridor_crash_density", statement="road_segments_in_sax".
+# SQL is only logged when it is slow (SLOW_QUERY_MS) or sampled (SQL_LOG_SAMPLE_RATE).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    "http_response_bytes", "Response body size (as sent)", ["route"], buckets=SIZE_BUCKETS,
+)
+STATEMENT_LATENCY = Histogram(
+    "db_statement_duration_seconds", "SQL execution time", ["route", "statement"], buckets=LATENCY_BUCKETS,
+)
+FETCH_LATENCY = Histogram(
+    "db_fetch_duration_seconds", "Time to fetch a statement's rows", ["route", "statement"], buckets=LATENCY_BUCKETS,
+)
+ROWS_RETURNED = Histogram(
+    "db_rows_returned", "Rows returned per statement", ["route", "statement"], buckets=ROW_BUCKETS,
+)
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting for a pooled connection", ["route"], buckets=LATENCY_BUCKETS,
+)
+SLOW_STATEMENTS = Counter(
+    "db_slow_statements_total", "Statements slower than SLOW_QUERY_MS", ["route", "statement"],
+)
+
+# route of the request a statement runs for - set by db.execute, copied into threadpool workers
+current_route: ContextVar[str] = ContextVar("current_route", default="")
+
+_CTE = re.compile(r"^\s*WITH\s+(?:RECURSIVE\s+)?(\w+)", re.IGNORECASE)
+_FROM = re.compile(r"\bFROM\s+(\w+)", re.IGNORECASE)
+_label_cache = {}
+
+
+def statement_label(sql: str) -> str:
+    """Short, low-cardinality name of a statement: its first CTE, else its first table."""
+    label = _label_cache.get(sql)
+    if label is None:
+        match = _CTE.search(sql) or _FROM.search(sql)
+        label = match.group(1).lower() if match else sql.split(None, 1)[0].lower() if sql.strip() else "?"
+        if len(_label_cache) < 10000:
+            _label_cache[sql] = label
+    return label
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    route, label = current_route.get(), statement_label(statement)
+    STATEMENT_LATENCY.labels(route, label).observe(elapsed)
+
+    if settings.slow_query_ms and elapsed * 1000 >= settings.slow_query_ms:
+        SLOW_STATEMENTS.labels(route, label).inc()
+        logger.warning("slow query (%.0f ms) on /%s:\n%s\nparams: %r", elapsed * 1000, route, statement, parameters)
+    elif settings.sql_log_sample_rate and random.random() < settings.sql_log_sample_rate:
+        logger.info("sampled query (%.0f ms) on /%s:\n%s\nparams: %r", elapsed * 1000, route, statement, parameters)
+
+
+def instrument_engine(engine):
+    """Time every statement run through `engine` (the sync engine behind an AsyncEngine too)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def observe_fetch(statement, seconds: float, rows: int):
+    route, label = current_route.get(), statement_label(str(statement))
+    FETCH_LATENCY.labels(route, label).observe(seconds)
+    ROWS_RETURNED.labels(route, label).observe(rows)
+
+
+def observe_pool_wait(seconds: float):
+    POOL_WAIT.labels(current_route.get()).observe(seconds)
+
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Latency and response size per route - outermost, so both are as the client sees them."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_measured(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            # templated path, so /tiles/... doesn't make a label per tile; unrouted requests share one
+            route = scope.get("route")
+            label = route.path.strip("/") if route is not None else "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], label, str(status)).observe(time.perf_counter() - start)
+            RESPONSE_BYTES.labels(label).observe(size)
@@ -0,0 +1,9 @@
+# --- Name keys ---
+# Region and road names are matched case-insensitively on a normalized key, stored and indexed next
+# to the names in the database (see data/name_key.sql). Queries mostly call the SQL name_key() on
+# their parameter; this is the same normalization for lookups done in Python.
+
+
+def name_key(name: str) -> str:
+    """Lowercased, trimmed, runs of whitespace folded to one space - as name_key() in SQL."""
+    return " ".join(name.split()).lower()
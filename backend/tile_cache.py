@@ -0,0 +1,71 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from typing import Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# --- Vector tile cache ---
+# Tiles only change with a data load, so once generated they are written to disk under
+# <tile_cache_dir>/<dataset version>/<layer>/<z>/<x>/<y>[.<variant>].pbf and served from there
+# until the dataset version changes, surviving restarts. Directories of older versions are
+# removed when a worker sees the version change (prune, hooked to dataset_version.on_change in
+# main.py) - never on a write, as during a reload a worker still on the old version would remove
+# the tiles its neighbours already store under the new one.
+
+
+class TileCache:
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _version_dir(self, version: str) -> str:
+        return hashlib.sha1(version.encode()).hexdigest()[:16]
+
+    def _path(self, version: str, layer: str, z: int, x: int, y: int, variant: str = "") -> str:
+        version_dir = self._version_dir(version)
+        name = f"{y}.{variant}.pbf" if variant else f"{y}.pbf"
+        return os.path.join(self.root, version_dir, layer, str(z), str(x), name)
+
+    def get(self, version: str, layer: str, z: int, x: int, y: int, variant: str = "") -> Optional[bytes]:
+        try:
+            with open(self._path(version, layer, z, x, y, variant), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, version: str, layer: str, z: int, x: int, y: int, tile: bytes, variant: str = ""):
+        path = self._path(version, layer, z, x, y, variant)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write-then-rename so concurrent readers never see a partial tile
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(tile)
+            os.replace(tmp, path)
+        except FileNotFoundError:
+            # an old version's directory, pruned by a worker already on the new one - just not kept
+            logger.debug("tile cache directory of %s removed while storing a tile", version)
+
+    def prune(self, version: str):
+        """Remove the tiles of every version but `version` - the current one, just read from the database."""
+        keep = self._version_dir(version)
+        with self._lock:
+            try:
+                entries = os.listdir(self.root)
+            except FileNotFoundError:
+                return
+            for entry in entries:
+                if entry != keep:
+                    logger.info("removing tiles of old dataset version %s", entry)
+                    shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+
+tile_cache = TileCache(settings.tile_cache_dir)
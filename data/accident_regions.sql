@@ -0,0 +1,26 @@
+-- stamp every accident with the SA2/SA3/SA4 it falls in
+-- region membership never changes once a crash is loaded, so only unassigned rows are touched:
+-- rerun after every crash data load (needs mesh_block_vic_21)
+--   psql -U postgres -d strek -f /data/accident_regions.sql
+
+ALTER TABLE accident
+ADD COLUMN IF NOT EXISTS sa2_code21 INTEGER,
+ADD COLUMN IF NOT EXISTS sa3_code21 INTEGER,
+ADD COLUMN IF NOT EXISTS sa4_code21 INTEGER;
+
+UPDATE accident a
+SET
+    sa2_code21 = m.sa2_code21::int,
+    sa3_code21 = m.sa3_code21::int,
+    sa4_code21 = m.sa4_code21::int
+FROM mesh_block_vic_21 m
+WHERE a.sa2_code21 IS NULL
+  AND a.geom IS NOT NULL
+  AND ST_Intersects(m.geom, a.geom);
+
+-- indexes
+CREATE INDEX IF NOT EXISTS idx_accident_sa2_code ON accident(sa2_code21);
+CREATE INDEX IF NOT EXISTS idx_accident_sa3_code ON accident(sa3_code21);
+CREATE INDEX IF NOT EXISTS idx_accident_sa4_code ON accident(sa4_code21);
+
+VACUUM ANALYZE accident;
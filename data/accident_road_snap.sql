@@ -0,0 +1,37 @@
+-- snap every accident to its nearest vicmap_road segment
+-- the first run bulk-builds the table; afterwards only accidents that haven't been snapped yet are added,
+-- so rerun after every crash data load (TRUNCATE accident_road_snap first if vicmap_road was re-imported -
+-- loader.py drops it whenever it imports the roads)
+--   psql -U postgres -d strek -f /data/accident_road_snap.sql
+
+CREATE TABLE IF NOT EXISTS accident_road_snap (
+    accident_no  CHAR(12) PRIMARY KEY,
+    road_seg_id  INTEGER NOT NULL,        -- vicmap_road.ogc_fid
+    road_name    VARCHAR(100),            -- vicmap_road.ezirdnmlbl
+    distance_m   DOUBLE PRECISION NOT NULL
+);
+
+-- drop snaps of accidents that no longer exist
+DELETE FROM accident_road_snap s
+WHERE NOT EXISTS (SELECT 1 FROM accident a WHERE a.accident_no = s.accident_no);
+
+INSERT INTO accident_road_snap (accident_no, road_seg_id, road_name, distance_m)
+SELECT a.accident_no,
+       r.ogc_fid,
+       r.ezirdnmlbl,
+       ST_Distance(a.geom_vg, r.geom_vg)
+FROM accident a
+CROSS JOIN LATERAL (
+    SELECT vr.ogc_fid, vr.ezirdnmlbl, vr.geom_vg
+    FROM vicmap_road vr
+    ORDER BY vr.geom_vg <-> a.geom_vg
+    LIMIT 1
+) r
+WHERE a.geom_vg IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM accident_road_snap s WHERE s.accident_no = a.accident_no)
+ON CONFLICT (accident_no) DO NOTHING;
+
+-- indexes
+CREATE INDEX IF NOT EXISTS idx_accident_road_snap_seg ON accident_road_snap(road_seg_id);
+
+VACUUM ANALYZE accident_road_snap;
@@ -0,0 +1,69 @@
+-- daily crash rollup: one row per day x SA2 x severity with the crash/injury sums the trend and
+-- forecast endpoints need, so they never aggregate raw accident rows (needs accident_regions.sql first)
+-- rerun after every crash data load - only days from the last rolled-up day onwards are recomputed:
+--   psql -U postgres -d strek -f /data/crash_daily.sql
+-- after loading crashes older than that, refresh from their earliest date instead:
+--   psql -U postgres -d strek -v since=2019-01-01 -f /data/crash_daily.sql
+
+CREATE TABLE IF NOT EXISTS crash_daily (
+    crash_date        DATE         NOT NULL,
+    sa2_code21        INTEGER      NOT NULL,   -- 0 for crashes outside every SA2
+    sa3_code21        INTEGER      NOT NULL,
+    sa4_code21        INTEGER      NOT NULL,
+    severity          VARCHAR(100) NOT NULL,
+
+    crashes           INTEGER      NOT NULL,
+    injuries          INTEGER      NOT NULL,   -- SUM(inj_or_fatal)
+    serious_injuries  INTEGER      NOT NULL,   -- SUM(seriousinjury)
+    fatalities        INTEGER      NOT NULL,   -- SUM(fatality)
+
+    PRIMARY KEY (crash_date, sa2_code21, severity)
+);
+
+CREATE INDEX IF NOT EXISTS idx_crash_daily_sa2 ON crash_daily(sa2_code21, crash_date);
+CREATE INDEX IF NOT EXISTS idx_crash_daily_sa3 ON crash_daily(sa3_code21, crash_date);
+CREATE INDEX IF NOT EXISTS idx_crash_daily_sa4 ON crash_daily(sa4_code21, crash_date);
+
+-- recompute every day from `since` on (default: the last day already rolled up, or everything
+-- on the first run) - returns the number of rollup rows written
+CREATE OR REPLACE FUNCTION refresh_crash_daily(since DATE DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    written INTEGER;
+BEGIN
+    since := COALESCE(since, (SELECT MAX(crash_date) FROM crash_daily), '-infinity'::date);
+
+    DELETE FROM crash_daily WHERE crash_date >= since;
+
+    INSERT INTO crash_daily (
+        crash_date, sa2_code21, sa3_code21, sa4_code21, severity,
+        crashes, injuries, serious_injuries, fatalities
+    )
+    SELECT a.accident_date,
+           COALESCE(a.sa2_code21, 0),
+           COALESCE(MAX(a.sa3_code21), 0),
+           COALESCE(MAX(a.sa4_code21), 0),
+           COALESCE(a.severity, ''),
+           COUNT(*),
+           COALESCE(SUM(a.inj_or_fatal), 0),
+           COALESCE(SUM(a.seriousinjury), 0),
+           COALESCE(SUM(a.fatality), 0)
+    FROM accident a
+    WHERE a.accident_date >= since
+    GROUP BY a.accident_date, COALESCE(a.sa2_code21, 0), COALESCE(a.severity, '');
+
+    GET DIAGNOSTICS written = ROW_COUNT;
+    RETURN written;
+END;
+$$;
+
+-- -v since=YYYY-MM-DD refreshes from that day instead (ingest_crashes.sh passes the earliest changed day)
+\if :{?since}
+SELECT refresh_crash_daily(:'since');
+\else
+SELECT refresh_crash_daily();
+\endif
+
+ANALYZE crash_daily;
@@ -0,0 +1,71 @@
+-- crash heatmap grid rollup: crashes counted on square grid cells in GDA2020 / Vicgrid (EPSG 7899)
+-- metres, one row per cell size x cell x month x severity, so a statewide heatmap (/heatmap/grid)
+-- sums a few thousand rows instead of spatially joining every accident.
+-- only the coarse cell sizes are rolled up here - finer cells are counted from accident on request
+-- (keep the sizes in sync with PREAGGREGATED_CELLS in backend/api/heatmap.py)
+-- cell (ix, iy) of size cell_m covers x in [ix * cell_m, (ix + 1) * cell_m), likewise y.
+-- rerun after every crash data load - only months from the last rolled-up month onwards are recomputed:
+--   psql -U postgres -d strek -f /data/crash_grid.sql
+-- after loading crashes older than that, refresh from their earliest date instead:
+--   psql -U postgres -d strek -v since=2019-01-01 -f /data/crash_grid.sql
+
+CREATE TABLE IF NOT EXISTS crash_grid (
+    cell_m            INTEGER      NOT NULL,   -- cell size in metres
+    crash_month       DATE         NOT NULL,   -- first day of the month
+    ix                INTEGER      NOT NULL,   -- floor(x / cell_m)
+    iy                INTEGER      NOT NULL,   -- floor(y / cell_m)
+    severity          VARCHAR(100) NOT NULL,
+
+    crashes           INTEGER      NOT NULL,
+    injuries          INTEGER      NOT NULL,   -- SUM(inj_or_fatal)
+    serious_injuries  INTEGER      NOT NULL,   -- SUM(seriousinjury)
+    fatalities        INTEGER      NOT NULL,   -- SUM(fatality)
+
+    PRIMARY KEY (cell_m, crash_month, ix, iy, severity)
+);
+
+-- recompute every month from the one containing `since` on (default: the last month already
+-- rolled up, or everything on the first run) - returns the number of rollup rows written
+CREATE OR REPLACE FUNCTION refresh_crash_grid(since DATE DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    written INTEGER;
+BEGIN
+    since := date_trunc('month', COALESCE(since, (SELECT MAX(crash_month) FROM crash_grid), '-infinity'::date))::date;
+
+    DELETE FROM crash_grid WHERE crash_month >= since;
+
+    INSERT INTO crash_grid (
+        cell_m, crash_month, ix, iy, severity,
+        crashes, injuries, serious_injuries, fatalities
+    )
+    SELECT c.cell_m,
+           date_trunc('month', a.accident_date)::date,
+           floor(ST_X(a.geom_vg) / c.cell_m)::int,
+           floor(ST_Y(a.geom_vg) / c.cell_m)::int,
+           COALESCE(a.severity, ''),
+           COUNT(*),
+           COALESCE(SUM(a.inj_or_fatal), 0),
+           COALESCE(SUM(a.seriousinjury), 0),
+           COALESCE(SUM(a.fatality), 0)
+    FROM accident a
+    CROSS JOIN (VALUES (5000), (10000), (20000)) AS c(cell_m)
+    WHERE a.accident_date >= since
+      AND a.geom_vg IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5;
+
+    GET DIAGNOSTICS written = ROW_COUNT;
+    RETURN written;
+END;
+$$;
+
+-- -v since=YYYY-MM-DD refreshes from that month instead (ingest_crashes.sh passes the earliest changed day)
+\if :{?since}
+SELECT refresh_crash_grid(:'since');
+\else
+SELECT refresh_crash_grid();
+\endif
+
+ANALYZE crash_grid;
@@ -0,0 +1,17 @@
+-- indexes of the crash tables, built after loading (see read_csvs.sql / loader.py)
+-- one statement per line - loader.py builds them concurrently, one session each
+
+-- accident (created on every partition)
+-- btree rather than BRIN on the date: MAX(accident_date) (dataset version, /max_accident_date)
+-- needs an ordered index, and rows are loaded in date order so range scans stay sequential anyway
+CREATE INDEX IF NOT EXISTS crash_date_idx ON accident(accident_date);
+CREATE INDEX IF NOT EXISTS crash_geom_gix ON accident USING GIST (geom);
+CREATE INDEX IF NOT EXISTS crash_geom_vg_gix ON accident USING GIST (geom_vg);
+
+-- person
+CREATE INDEX IF NOT EXISTS person_accident_idx ON person(accident_no);
+CREATE INDEX IF NOT EXISTS person_role_idx     ON person(road_user_type);
+CREATE INDEX IF NOT EXISTS person_injury_idx   ON person(inj_level);
+
+-- accident_conditions
+CREATE INDEX IF NOT EXISTS accident_conditions_accident_idx ON accident_conditions(accident_no);
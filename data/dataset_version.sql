@@ -0,0 +1,12 @@
+-- stamp the end of a data load
+-- the API derives its dataset version (and so invalidates its caches) from this + MAX(accident_date),
+-- so run it last after every load/refresh
+--   psql -U postgres -d strek -f /data/dataset_version.sql
+
+CREATE TABLE IF NOT EXISTS dataset_version (
+    id         BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),   -- single row
+    loaded_at  TIMESTAMPTZ NOT NULL
+);
+
+INSERT INTO dataset_version (loaded_at) VALUES (now())
+ON CONFLICT (id) DO UPDATE SET loaded_at = EXCLUDED.loaded_at;
@@ -1,99 +1,100 @@
 -- final updates after ogr2ogr commands
+-- safe to rerun: loader.py runs it again after re-importing any one of the shapefiles (--redo roads)
 
 -- delete unwanted columns
+-- ogc_fid is kept on vicmap_road as the segment id (referenced by accident_road_snap)
 ALTER TABLE vicmap_road
-DROP COLUMN ogc_fid,
-DROP COLUMN ufi,
-DROP COLUMN pfi,
-DROP COLUMN nfeat_id,
-DROP COLUMN ezi_rdname,
-DROP COLUMN road_name,
-DROP COLUMN rd_suf,
-DROP COLUMN rdnameuse,
-DROP COLUMN rd_name1,
-DROP COLUMN rd_type1,
-DROP COLUMN rd_suf1,
-DROP COLUMN rdnameuse1,
-DROP COLUMN rd_name2,
-DROP COLUMN rd_type2,
-DROP COLUMN rd_suf2,
-DROP COLUMN rdnameuse2,
-DROP COLUMN rd_name3,
-DROP COLUMN rd_type3,
-DROP COLUMN rd_suf3,
-DROP COLUMN rdnameuse3,
-DROP COLUMN rd_name4,
-DROP COLUMN rd_type4,
-DROP COLUMN rd_suf4,
-DROP COLUMN rdnameuse4,
-DROP COLUMN rd_name5,
-DROP COLUMN rd_type5,
-DROP COLUMN rd_suf5,
-DROP COLUMN rdnameuse5,
-DROP COLUMN rd_name6,
-DROP COLUMN rd_type6,
-DROP COLUMN rd_suf6,
-DROP COLUMN rdnameuse6,
-DROP COLUMN rd_name7,
-DROP COLUMN rd_type7,
-DROP COLUMN rd_suf7,
-DROP COLUMN rdnameuse7,
-DROP COLUMN left_loc,
-DROP COLUMN right_loc,
-DROP COLUMN class_code,
-DROP COLUMN dir_code,
-DROP COLUMN route_no,
-DROP COLUMN ht_limit,
-DROP COLUMN restrictn,
-DROP COLUMN const_type,
-DROP COLUMN road_seal,
-DROP COLUMN rd_status,
-DROP COLUMN vecaccess,
-DROP COLUMN seasopendt,
-DROP COLUMN seasclsedt,
-DROP COLUMN load_limit,
-DROP COLUMN ldlmtassdt,
-DROP COLUMN cons_mat,
-DROP COLUMN length_m,
-DROP COLUMN width_m,
-DROP COLUMN deck_area,
-DROP COLUMN respauthcd,
-DROP COLUMN coordauthc,
-DROP COLUMN urban,
-DROP COLUMN nre_route,
-DROP COLUMN from_ufi,
-DROP COLUMN to_ufi,
-DROP COLUMN fqid,
-DROP COLUMN task_id,
-DROP COLUMN crdate_pfi,
-DROP COLUMN super_pfi,
-DROP COLUMN crdate_ufi;
+DROP COLUMN IF EXISTS ufi,
+DROP COLUMN IF EXISTS pfi,
+DROP COLUMN IF EXISTS nfeat_id,
+DROP COLUMN IF EXISTS ezi_rdname,
+DROP COLUMN IF EXISTS road_name,
+DROP COLUMN IF EXISTS rd_suf,
+DROP COLUMN IF EXISTS rdnameuse,
+DROP COLUMN IF EXISTS rd_name1,
+DROP COLUMN IF EXISTS rd_type1,
+DROP COLUMN IF EXISTS rd_suf1,
+DROP COLUMN IF EXISTS rdnameuse1,
+DROP COLUMN IF EXISTS rd_name2,
+DROP COLUMN IF EXISTS rd_type2,
+DROP COLUMN IF EXISTS rd_suf2,
+DROP COLUMN IF EXISTS rdnameuse2,
+DROP COLUMN IF EXISTS rd_name3,
+DROP COLUMN IF EXISTS rd_type3,
+DROP COLUMN IF EXISTS rd_suf3,
+DROP COLUMN IF EXISTS rdnameuse3,
+DROP COLUMN IF EXISTS rd_name4,
+DROP COLUMN IF EXISTS rd_type4,
+DROP COLUMN IF EXISTS rd_suf4,
+DROP COLUMN IF EXISTS rdnameuse4,
+DROP COLUMN IF EXISTS rd_name5,
+DROP COLUMN IF EXISTS rd_type5,
+DROP COLUMN IF EXISTS rd_suf5,
+DROP COLUMN IF EXISTS rdnameuse5,
+DROP COLUMN IF EXISTS rd_name6,
+DROP COLUMN IF EXISTS rd_type6,
+DROP COLUMN IF EXISTS rd_suf6,
+DROP COLUMN IF EXISTS rdnameuse6,
+DROP COLUMN IF EXISTS rd_name7,
+DROP COLUMN IF EXISTS rd_type7,
+DROP COLUMN IF EXISTS rd_suf7,
+DROP COLUMN IF EXISTS rdnameuse7,
+DROP COLUMN IF EXISTS left_loc,
+DROP COLUMN IF EXISTS right_loc,
+DROP COLUMN IF EXISTS class_code,
+DROP COLUMN IF EXISTS dir_code,
+DROP COLUMN IF EXISTS route_no,
+DROP COLUMN IF EXISTS ht_limit,
+DROP COLUMN IF EXISTS restrictn,
+DROP COLUMN IF EXISTS const_type,
+DROP COLUMN IF EXISTS road_seal,
+DROP COLUMN IF EXISTS rd_status,
+DROP COLUMN IF EXISTS vecaccess,
+DROP COLUMN IF EXISTS seasopendt,
+DROP COLUMN IF EXISTS seasclsedt,
+DROP COLUMN IF EXISTS load_limit,
+DROP COLUMN IF EXISTS ldlmtassdt,
+DROP COLUMN IF EXISTS cons_mat,
+DROP COLUMN IF EXISTS length_m,
+DROP COLUMN IF EXISTS width_m,
+DROP COLUMN IF EXISTS deck_area,
+DROP COLUMN IF EXISTS respauthcd,
+DROP COLUMN IF EXISTS coordauthc,
+DROP COLUMN IF EXISTS urban,
+DROP COLUMN IF EXISTS nre_route,
+DROP COLUMN IF EXISTS from_ufi,
+DROP COLUMN IF EXISTS to_ufi,
+DROP COLUMN IF EXISTS fqid,
+DROP COLUMN IF EXISTS task_id,
+DROP COLUMN IF EXISTS crdate_pfi,
+DROP COLUMN IF EXISTS super_pfi,
+DROP COLUMN IF EXISTS crdate_ufi;
 
 ALTER TABLE vicmap_road_structures
-DROP COLUMN ogc_fid,
-DROP COLUMN ufi,
-DROP COLUMN pfi,
-DROP COLUMN nfeat_id,
-DROP COLUMN rotation,
-DROP COLUMN deck_area,
-DROP COLUMN coordauthc,
-DROP COLUMN urban,
-DROP COLUMN conpfi1,
-DROP COLUMN conpfi2,
-DROP COLUMN fqid,
-DROP COLUMN task_id,
-DROP COLUMN crdate_pfi,
-DROP COLUMN super_pfi,
-DROP COLUMN crdate_ufi;
-
--- adding index(es)
-CREATE INDEX idx_mesh_geom ON mesh_block_vic_21 USING GIST (geom);
+DROP COLUMN IF EXISTS ogc_fid,
+DROP COLUMN IF EXISTS ufi,
+DROP COLUMN IF EXISTS pfi,
+DROP COLUMN IF EXISTS nfeat_id,
+DROP COLUMN IF EXISTS rotation,
+DROP COLUMN IF EXISTS deck_area,
+DROP COLUMN IF EXISTS coordauthc,
+DROP COLUMN IF EXISTS urban,
+DROP COLUMN IF EXISTS conpfi1,
+DROP COLUMN IF EXISTS conpfi2,
+DROP COLUMN IF EXISTS fqid,
+DROP COLUMN IF EXISTS task_id,
+DROP COLUMN IF EXISTS crdate_pfi,
+DROP COLUMN IF EXISTS super_pfi,
+DROP COLUMN IF EXISTS crdate_ufi;
+
+-- adding index(es) - loader.py may already have built them, in parallel with the other imports
+CREATE INDEX IF NOT EXISTS idx_mesh_geom ON mesh_block_vic_21 USING GIST (geom);
 VACUUM analyze mesh_block_vic_21;
 
-CREATE INDEX idx_vicmap_road_geom ON vicmap_road USING GIST (geom);
+CREATE INDEX IF NOT EXISTS idx_vicmap_road_geom ON vicmap_road USING GIST (geom);
 VACUUM ANALYZE vicmap_road;
 
-CREATE INDEX idx_accident_road_name_lower ON accident(LOWER(road_name));
+CREATE INDEX IF NOT EXISTS idx_accident_road_name_lower ON accident(LOWER(road_name));
 
 -- update vicmap_road table to store sa2, sa3, sa4 info
 
@@ -103,9 +104,9 @@ CREATE INDEX idx_accident_road_name_lower ON accident(LOWER(road_name));
 --drop column sa4_name21;
 
 ALTER TABLE vicmap_road
-ADD COLUMN sa2_name21 VARCHAR(50),
-ADD COLUMN sa3_name21 VARCHAR(50),
-ADD COLUMN sa4_name21 VARCHAR(50)
+ADD COLUMN IF NOT EXISTS sa2_name21 VARCHAR(50),
+ADD COLUMN IF NOT EXISTS sa3_name21 VARCHAR(50),
+ADD COLUMN IF NOT EXISTS sa4_name21 VARCHAR(50)
 ;
 
 UPDATE vicmap_road r
@@ -118,14 +119,33 @@ WHERE ST_Contains(m.geom, ST_Centroid(r.geom));
 
 delete from vicmap_road r where (r.sa2_name21 is null) or (r.sa3_name21 is null);
 
--- Index for SA2 area name
-CREATE INDEX idx_vicmap_road_sa2_name ON vicmap_road(sa2_name21);
+-- metre-based copies of the road geometries in GDA2020 / Vicgrid (EPSG 7899)
+-- generated columns, so postgres keeps them in sync with geom
+-- plus the normalized name keys the API matches road and region names on (see name_key.sql),
+-- added in the same ALTER so the table is only rewritten once
+ALTER TABLE vicmap_road
+ADD COLUMN IF NOT EXISTS geom_vg geometry(MultiLineString, 7899)
+    GENERATED ALWAYS AS (ST_Transform(geom, 7899)) STORED,
+ADD COLUMN IF NOT EXISTS road_key TEXT GENERATED ALWAYS AS (name_key(ezirdnmlbl)) STORED,
+ADD COLUMN IF NOT EXISTS sa2_key  TEXT GENERATED ALWAYS AS (name_key(sa2_name21)) STORED,
+ADD COLUMN IF NOT EXISTS sa3_key  TEXT GENERATED ALWAYS AS (name_key(sa3_name21)) STORED,
+ADD COLUMN IF NOT EXISTS sa4_key  TEXT GENERATED ALWAYS AS (name_key(sa4_name21)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_vicmap_road_geom_vg ON vicmap_road USING GIST (geom_vg);
+
+ALTER TABLE vicmap_road_structures
+ADD COLUMN IF NOT EXISTS geom_vg geometry(Point, 7899)
+    GENERATED ALWAYS AS (ST_Transform(geom, 7899)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_vicmap_road_structures_geom_vg ON vicmap_road_structures USING GIST (geom_vg);
+VACUUM ANALYZE vicmap_road_structures;
 
--- Index for SA3 area name
-CREATE INDEX idx_vicmap_road_sa3_name ON vicmap_road(sa3_name21);
+-- Indexes for SA2/SA3 area name (+ road name - the corridor lookups filter on both)
+CREATE INDEX IF NOT EXISTS idx_vicmap_road_sa2_road ON vicmap_road(sa2_key, road_key);
+CREATE INDEX IF NOT EXISTS idx_vicmap_road_sa3_road ON vicmap_road(sa3_key, road_key);
 
 -- Index for SA4 area name
-CREATE INDEX idx_vicmap_road_sa4_name ON vicmap_road(sa4_name21);
+CREATE INDEX IF NOT EXISTS idx_vicmap_road_sa4_key ON vicmap_road(sa4_key);
 
 -- update vicmap_road to store higher classifications of road_types
 
@@ -133,7 +153,7 @@ CREATE INDEX idx_vicmap_road_sa4_name ON vicmap_road(sa4_name21);
 
 -- Step 1: Add the new column
 ALTER TABLE vicmap_road
-ADD COLUMN h_road_type varchar(50);
+ADD COLUMN IF NOT EXISTS h_road_type varchar(50);
 
 -- Step 2: Populate it based on road_type
 UPDATE vicmap_road
@@ -148,7 +168,40 @@ SET h_road_type = CASE
   ELSE NULL
 END;
 
-CREATE INDEX idx_vicmap_road_hroadtype ON vicmap_road(h_road_type);
+CREATE INDEX IF NOT EXISTS idx_vicmap_road_hroadtype ON vicmap_road(h_road_type);
+
+-- per-region road catalogue for the road picker (/roads_by_region): every road of every SA2 with
+-- its merged length and segment count, so the API never unions road geometries per request.
+-- SA3 lists sum the SA2 rows (segments are assigned to one SA2 by their centroid)
+DROP TABLE IF EXISTS road_summary;
+CREATE TABLE road_summary (
+    sa2_name21    VARCHAR(50) NOT NULL,
+    sa3_name21    VARCHAR(50) NOT NULL,
+    road_name     VARCHAR(100),
+    h_road_type   VARCHAR(50) NOT NULL,
+    length_km     DOUBLE PRECISION NOT NULL,
+    segments      INTEGER NOT NULL,
+
+    -- normalized names the API matches on (see name_key.sql)
+    sa2_key       TEXT GENERATED ALWAYS AS (name_key(sa2_name21)) STORED,
+    sa3_key       TEXT GENERATED ALWAYS AS (name_key(sa3_name21)) STORED,
+    road_key      TEXT GENERATED ALWAYS AS (name_key(road_name)) STORED
+);
+
+INSERT INTO road_summary (sa2_name21, sa3_name21, road_name, h_road_type, length_km, segments)
+SELECT vr.sa2_name21,
+       vr.sa3_name21,
+       vr.ezirdnmlbl,
+       vr.h_road_type,
+       ST_Length(ST_Union(vr.geom_vg))/1000,
+       COUNT(*)
+FROM vicmap_road vr
+WHERE vr.h_road_type IS NOT NULL
+GROUP BY vr.sa2_name21, vr.sa3_name21, vr.ezirdnmlbl, vr.h_road_type;
+
+CREATE INDEX IF NOT EXISTS idx_road_summary_sa2 ON road_summary(sa2_key, length_km DESC);
+CREATE INDEX IF NOT EXISTS idx_road_summary_sa3 ON road_summary(sa3_key);
+ANALYZE road_summary;
 
 ALTER SYSTEM RESET max_wal_size;
 SELECT pg_reload_conf();
@@ -0,0 +1,46 @@
+#!/bin/sh
+# append a new crash data release to an existing database, without rebuilding it
+# only new/changed crashes are written (see ingest_crashes.sql), then the derived tables catch up
+#   docker exec strek-db /data/ingest_crashes.sh \
+#       /data/victorian_road_crash_data.csv /data/person.csv /data/atmospheric_cond.csv
+set -e
+
+PGUSER=${POSTGRES_USER:-postgres}
+PGDB=${POSTGRES_DB:-strek}
+PGPASSWORD=${POSTGRES_PASSWORD:-pass}
+SCRIPTS=$(dirname "$0")
+
+ACCIDENT_CSV=${1:-/data/victorian_road_crash_data.csv}
+PERSON_CSV=${2:-/data/person.csv}
+CONDITIONS_CSV=${3:-/data/atmospheric_cond.csv}
+
+export PGPASSWORD="$PGPASSWORD"
+PSQL="psql -v ON_ERROR_STOP=1 -U $PGUSER -d $PGDB"
+
+echo "Staging the release..."
+$PSQL -c "TRUNCATE accident_staging, person_staging, accident_conditions_staging;"
+$PSQL -c "\copy accident_staging FROM '$ACCIDENT_CSV' WITH (FORMAT csv, HEADER true, DELIMITER ',', NULL '')"
+$PSQL -c "\copy person_staging FROM '$PERSON_CSV' WITH (FORMAT csv, HEADER true, NULL '')"
+$PSQL -c "\copy accident_conditions_staging(accident_no, atmosph_cond, atmosph_cond_seq, atmosph_cond_desc) FROM '$CONDITIONS_CSV' DELIMITER ',' CSV HEADER"
+
+echo "Merging new and changed crashes (ingest_crashes.sql)..."
+$PSQL -f "$SCRIPTS/ingest_crashes.sql"
+
+echo "Assigning new crashes to SA2/SA3/SA4 regions (accident_regions.sql)..."
+$PSQL -f "$SCRIPTS/accident_regions.sql"
+
+echo "Snapping new crashes to road segments (accident_road_snap.sql)..."
+$PSQL -f "$SCRIPTS/accident_road_snap.sql"
+
+# earliest crash date the merge touched - the rollups are recomputed from there, in one pass each
+SINCE=$($PSQL -tA -c "SELECT since FROM crash_ingest_log ORDER BY id DESC LIMIT 1")
+SINCE_ARG=${SINCE:+-v since=$SINCE}
+
+echo "Rolling up daily crash totals from the earliest changed day (crash_daily.sql)..."
+$PSQL $SINCE_ARG -f "$SCRIPTS/crash_daily.sql"
+
+echo "Rolling up the heatmap grid from the earliest changed month (crash_grid.sql)..."
+$PSQL $SINCE_ARG -f "$SCRIPTS/crash_grid.sql"
+
+echo "Stamping dataset version (dataset_version.sql)..."
+$PSQL -f "$SCRIPTS/dataset_version.sql"
@@ -0,0 +1,177 @@
+-- merge a crash data release from the staging tables into accident / person / accident_conditions
+-- (read_csvs.sql runs it for the first load, ingest_crashes.sh for every later release)
+-- every crash is fingerprinted together with its persons and conditions, and only crashes that are
+-- new, changed or gone are written - so a release that adds a month of crashes only touches the
+-- current year's partition instead of reloading everything.
+-- afterwards run accident_regions.sql, accident_road_snap.sql, crash_daily.sql (from
+-- crash_ingest_log.since) and dataset_version.sql - ingest_crashes.sh does all of it
+
+-- fingerprint of every loaded crash (row + persons + conditions), to diff releases against
+CREATE TABLE IF NOT EXISTS accident_row_hash (
+    accident_no    CHAR(12) PRIMARY KEY,
+    accident_date  DATE NOT NULL,
+    row_hash       TEXT NOT NULL
+);
+
+-- one row per ingest
+CREATE TABLE IF NOT EXISTS crash_ingest_log (
+    id          SERIAL PRIMARY KEY,
+    loaded_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    inserted    INTEGER NOT NULL,
+    updated     INTEGER NOT NULL,
+    deleted     INTEGER NOT NULL,
+    years       INTEGER[] NOT NULL,   -- partitions written
+    since       DATE                  -- earliest crash date touched - derived tables refresh from here
+);
+
+-- create the yearly partitions (accident_y2024, ...) covering first_day..last_day
+CREATE OR REPLACE FUNCTION ensure_accident_partitions(first_day DATE, last_day DATE)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF first_day IS NULL OR last_day IS NULL THEN
+        RETURN;
+    END IF;
+    FOR y IN EXTRACT(YEAR FROM first_day)::int .. EXTRACT(YEAR FROM last_day)::int LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF accident FOR VALUES FROM (%L) TO (%L)',
+            'accident_y' || y, make_date(y, 1, 1), make_date(y + 1, 1, 1)
+        );
+    END LOOP;
+END;
+$$;
+
+ANALYZE accident_staging;
+ANALYZE person_staging;
+ANALYZE accident_conditions_staging;
+
+-- all or nothing, so the API never sees half a release
+BEGIN;
+
+CREATE TEMP TABLE release_hash ON COMMIT DROP AS
+SELECT s.accident_no,
+       s.accident_date,
+       md5(s::text || COALESCE(p.rows, '') || COALESCE(c.rows, '')) AS row_hash
+FROM accident_staging s
+LEFT JOIN (
+    SELECT ps.accident_no, string_agg(ps::text, '|' ORDER BY ps.person_id) AS rows
+    FROM person_staging ps
+    GROUP BY ps.accident_no
+) p ON p.accident_no = s.accident_no
+LEFT JOIN (
+    SELECT cs.accident_no, string_agg(cs::text, '|' ORDER BY cs.atmosph_cond_seq, cs.atmosph_cond) AS rows
+    FROM accident_conditions_staging cs
+    GROUP BY cs.accident_no
+) c ON c.accident_no = s.accident_no;
+
+-- new or changed crashes (old_date is where a changed crash lived, its date may have moved)
+CREATE TEMP TABLE changed ON COMMIT DROP AS
+SELECT r.accident_no, r.accident_date, h.accident_date AS old_date, h.accident_no IS NULL AS is_new
+FROM release_hash r
+LEFT JOIN accident_row_hash h ON h.accident_no = r.accident_no
+WHERE h.row_hash IS DISTINCT FROM r.row_hash;
+
+-- crashes missing from the release - only within the years it covers, so a release of just the
+-- latest year(s) leaves older years alone
+CREATE TEMP TABLE removed ON COMMIT DROP AS
+SELECT h.accident_no, h.accident_date
+FROM accident_row_hash h
+WHERE EXTRACT(YEAR FROM h.accident_date) IN (
+        SELECT DISTINCT EXTRACT(YEAR FROM accident_date) FROM accident_staging
+      )
+  AND NOT EXISTS (SELECT 1 FROM accident_staging s WHERE s.accident_no = h.accident_no);
+
+CREATE TEMP TABLE touched ON COMMIT DROP AS
+SELECT accident_no FROM changed WHERE NOT is_new
+UNION ALL
+SELECT accident_no FROM removed;
+
+SELECT ensure_accident_partitions(MIN(accident_date), MAX(accident_date)) FROM changed;
+
+-- replace rather than update in place: a corrected crash date moves the row to another partition,
+-- and the region codes / road snap have to be recomputed for the new row anyway
+DELETE FROM accident a USING touched t WHERE a.accident_no = t.accident_no;
+DELETE FROM person p USING touched t WHERE p.accident_no = t.accident_no;
+DELETE FROM accident_conditions ac USING touched t WHERE ac.accident_no = t.accident_no;
+
+DO $$
+BEGIN
+    IF to_regclass('accident_road_snap') IS NOT NULL THEN
+        DELETE FROM accident_road_snap snap USING touched t WHERE snap.accident_no = t.accident_no;
+    END IF;
+END;
+$$;
+
+-- in date order, so each partition's heap follows its date index
+INSERT INTO accident (
+    accident_no, accident_date, accident_time, accident_type, day_of_week, dca_code,
+    dca_code_description, light_condition, police_attend, road_geometry, severity, speed_zone,
+    run_offroad, road_name, road_type, latitude, longitude, total_persons, inj_or_fatal, fatality,
+    seriousinjury, otherinjury, noninjured, males, females, bicyclist, passenger, driver, pedestrian,
+    pillion, motorcyclist, unknown, ped_cyclist_5_12, ped_cyclist_13_18, old_ped_65_over,
+    old_driver_75_over, young_driver_18_25, no_of_vehicles, heavyvehicle, passengervehicle,
+    motorcycle, pt_vehicle, deg_urban_name, srns, rma, divided
+)
+SELECT
+    s.accident_no, s.accident_date, s.accident_time, s.accident_type, s.day_of_week, s.dca_code,
+    s.dca_code_description, s.light_condition, s.police_attend, s.road_geometry, s.severity, s.speed_zone,
+    s.run_offroad, s.road_name, s.road_type, s.latitude, s.longitude, s.total_persons, s.inj_or_fatal, s.fatality,
+    s.seriousinjury, s.otherinjury, s.noninjured, s.males, s.females, s.bicyclist, s.passenger, s.driver, s.pedestrian,
+    s.pillion, s.motorcyclist, s.unknown, s.ped_cyclist_5_12, s.ped_cyclist_13_18, s.old_ped_65_over,
+    s.old_driver_75_over, s.young_driver_18_25, s.no_of_vehicles, s.heavyvehicle, s.passengervehicle,
+    s.motorcycle, s.pt_vehicle, s.deg_urban_name, s.srns, s.rma, s.divided
+FROM accident_staging s
+JOIN changed c ON c.accident_no = s.accident_no
+ORDER BY s.accident_date, s.accident_no;
+
+INSERT INTO person
+SELECT ps.*
+FROM person_staging ps
+JOIN changed c ON c.accident_no = ps.accident_no;
+
+INSERT INTO accident_conditions
+SELECT cs.*
+FROM accident_conditions_staging cs
+JOIN changed c ON c.accident_no = cs.accident_no;
+
+DELETE FROM accident_row_hash h USING removed r WHERE h.accident_no = r.accident_no;
+
+INSERT INTO accident_row_hash (accident_no, accident_date, row_hash)
+SELECT r.accident_no, r.accident_date, r.row_hash
+FROM release_hash r
+JOIN changed c ON c.accident_no = r.accident_no
+ON CONFLICT (accident_no) DO UPDATE
+SET accident_date = EXCLUDED.accident_date,
+    row_hash = EXCLUDED.row_hash;
+
+INSERT INTO crash_ingest_log (inserted, updated, deleted, years, since)
+SELECT
+    (SELECT COUNT(*) FROM changed WHERE is_new),
+    (SELECT COUNT(*) FROM changed WHERE NOT is_new),
+    (SELECT COUNT(*) FROM removed),
+    COALESCE(ARRAY(
+        SELECT DISTINCT EXTRACT(YEAR FROM d)::int
+        FROM (
+            SELECT accident_date AS d FROM changed
+            UNION ALL SELECT old_date FROM changed
+            UNION ALL SELECT accident_date FROM removed
+        ) days
+        WHERE d IS NOT NULL
+        ORDER BY 1
+    ), '{}'),
+    (SELECT MIN(d) FROM (
+        SELECT accident_date AS d FROM changed
+        UNION ALL SELECT old_date FROM changed
+        UNION ALL SELECT accident_date FROM removed
+    ) days);
+
+COMMIT;
+
+TRUNCATE accident_staging, person_staging, accident_conditions_staging;
+
+ANALYZE accident;
+ANALYZE person;
+ANALYZE accident_conditions;
+
+SELECT inserted, updated, deleted, years, since FROM crash_ingest_log ORDER BY id DESC LIMIT 1;
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""Build the STREK database from the raw data - in parallel, resumably, with timings.
+
+The same steps as the manual instructions (instructions.md), run as a dependency graph:
+
+  - the crash CSVs (read_csvs.sql) and the three shapefile imports (ogr2ogr) run concurrently
+  - shapefiles are imported into UNLOGGED tables without indexes, then switched to logged; the
+    crash CSVs go through the UNLOGGED staging tables of read_csvs.sql
+  - indexes are built once their table is loaded, each in its own session (crash_indexes.sql
+    and the spatial indexes of the imported tables)
+  - final_db_updates.sql, then accident_regions.sql and accident_road_snap.sql side by side, then
+    crash_daily.sql; sa_regions.sql as soon as the mesh blocks are in, crash_grid.sql as soon as
+    the crashes are; dataset_version.sql last
+
+--jobs stages run at once, and the timing of every stage is printed as it finishes and again
+in a summary at the end.
+
+Every finished stage is recorded in the load_progress table, so after a failure rerunning the
+loader picks up where it stopped. --redo STAGE reruns a stage and everything after it, --restart
+starts over:
+
+    docker exec strek-db python3 /data/loader.py              # resume
+    docker exec strek-db python3 /data/loader.py --redo roads # re-import the roads and redo what depends on them
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PGUSER = os.environ.get("POSTGRES_USER", "postgres")
+PGDB = os.environ.get("POSTGRES_DB", "strek")
+PGPASSWORD = os.environ.get("POSTGRES_PASSWORD", "pass")
+
+# shapefile imports: stage -> (table, source, extra ogr2ogr arguments)
+SHAPEFILES = {
+    "mesh_blocks": ("mesh_block_vic_21", "MB_2021_AUST_SHP_GDA2020/MB_2021_AUST_GDA2020.shp",
+                    ["-where", "STE_CODE21 = '2'", "-nlt", "MULTIPOLYGON"]),
+    "roads": ("vicmap_road", "vicmap_road/TR_ROAD.shp", ["-nlt", "MULTILINESTRING"]),
+    "structures": ("vicmap_road_structures", "vicmap_road/TR_ROAD_INFRASTRUCTURE.shp", ["-nlt", "POINT"]),
+}
+
+# spatial indexes of the imported tables (ogr2ogr's own are switched off; names as in final_db_updates.sql)
+SHAPEFILE_INDEXES = {
+    "mesh_blocks": "CREATE INDEX IF NOT EXISTS idx_mesh_geom ON mesh_block_vic_21 USING GIST (geom);",
+    "roads": "CREATE INDEX IF NOT EXISTS idx_vicmap_road_geom ON vicmap_road USING GIST (geom);",
+    "structures": "CREATE INDEX IF NOT EXISTS idx_vicmap_road_structures_geom ON vicmap_road_structures USING GIST (geom);",
+}
+
+# tables holding ids of an import's rows, dropped when it is (re)imported - the stages that build them
+# run after it and start over (accident_road_snap keys crashes to vicmap_road.ogc_fid)
+SHAPEFILE_DEPENDENTS = {
+    "roads": "DROP TABLE IF EXISTS accident_road_snap;",
+}
+
+_print_lock = threading.Lock()
+_started = time.perf_counter()
+
+
+def log(message: str):
+    with _print_lock:
+        print(f"[{time.perf_counter() - _started:8.1f}s] {message}", flush=True)
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], None]
+    after: List[str] = field(default_factory=list)
+
+
+class StageFailed(Exception):
+    pass
+
+
+def run(cmd: List[str], stage: str):
+    """Run a command, keeping its output quiet unless it fails."""
+    proc = subprocess.run(cmd, cwd=DATA_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        output = (proc.stdout + proc.stderr).strip().splitlines()
+        raise StageFailed(f"{stage}: {' '.join(cmd[:3])}... exited with {proc.returncode}\n" + "\n".join(output[-40:]))
+
+
+def psql_cmd(*args: str) -> List[str]:
+    return ["psql", "-X", "-q", "-v", "ON_ERROR_STOP=1", "-U", PGUSER, "-d", PGDB, *args]
+
+
+def psql_file(stage: str, script: str, *args: str) -> Callable[[], None]:
+    return lambda: run(psql_cmd(*args, "-f", os.path.join(DATA_DIR, script)), stage)
+
+
+def psql_sql(stage: str, sql: str, maintenance_work_mem: Optional[str] = None) -> Callable[[], None]:
+    if maintenance_work_mem:
+        sql = f"SET maintenance_work_mem = '{maintenance_work_mem}'; {sql}"
+    return lambda: run(psql_cmd("-c", sql), stage)
+
+
+def ogr2ogr(stage: str, table: str, source: str, extra: List[str]) -> Callable[[], None]:
+    cmd = [
+        "ogr2ogr", "-f", "PostgreSQL", f"PG:dbname={PGDB} user={PGUSER}", os.path.join(DATA_DIR, source),
+        "-nln", table, "-overwrite",
+        "-lco", "GEOMETRY_NAME=geom",
+        "-lco", "SPATIAL_INDEX=NONE",  # built afterwards, in parallel
+        "-lco", "UNLOGGED=ON",  # switched to logged once loaded
+        "--config", "PG_USE_COPY", "YES",
+        "-gt", "65536",
+        *extra,
+    ]
+    return lambda: run(cmd, stage)
+
+
+def crash_indexes() -> Dict[str, str]:
+    """index name -> statement, from crash_indexes.sql."""
+    with open(os.path.join(DATA_DIR, "crash_indexes.sql")) as f:
+        statements = [line.strip() for line in f if line.strip().upper().startswith("CREATE INDEX")]
+    return {re.search(r"EXISTS\s+(\w+)", s).group(1): s for s in statements}
+
+
+def build_stages(maintenance_work_mem: str) -> List[Stage]:
+    stages = [Stage("crash_csvs", psql_file("crash_csvs", "read_csvs.sql", "-v", "skip_indexes=1"))]
+
+    for name, (table, source, extra) in SHAPEFILES.items():
+        stages += [
+            Stage(name, ogr2ogr(name, table, source, extra)),
+            Stage(f"{name}_logged",
+                  psql_sql(f"{name}_logged", f"ALTER TABLE {table} SET LOGGED; {SHAPEFILE_DEPENDENTS.get(name, '')}"),
+                  [name]),
+            Stage(f"{name}_index", psql_sql(f"{name}_index", SHAPEFILE_INDEXES[name], maintenance_work_mem),
+                  [f"{name}_logged"]),
+        ]
+
+    index_stages = [f"index_{index}" for index in crash_indexes()]
+    stages += [
+        Stage(f"index_{index}", psql_sql(f"index_{index}", sql, maintenance_work_mem), ["crash_csvs"])
+        for index, sql in crash_indexes().items()
+    ]
+
+    shapefile_indexes = [f"{name}_index" for name in SHAPEFILES]
+    stages += [
+        # name_key() is created once up front - the two scripts using it run side by side
+        Stage("name_key", psql_file("name_key", "name_key.sql")),
+        Stage("final_db_updates", psql_file("final_db_updates", "final_db_updates.sql"),
+              ["crash_csvs", "name_key"] + shapefile_indexes),
+        Stage("sa_regions", psql_file("sa_regions", "sa_regions.sql"), ["mesh_blocks_index", "name_key"]),
+        Stage("accident_regions", psql_file("accident_regions", "accident_regions.sql"),
+              ["final_db_updates"] + index_stages),
+        Stage("accident_road_snap", psql_file("accident_road_snap", "accident_road_snap.sql"),
+              ["final_db_updates"] + index_stages),
+        Stage("crash_daily", psql_file("crash_daily", "crash_daily.sql"), ["accident_regions"]),
+        Stage("crash_grid", psql_file("crash_grid", "crash_grid.sql"), ["crash_csvs"]),
+    ]
+    stages.append(Stage("dataset_version", psql_file("dataset_version", "dataset_version.sql"),
+                        [s.name for s in stages]))
+    return stages
+
+
+# --- checkpoints ---
+
+def query(sql: str, **variables: str) -> List[str]:
+    """Run sql (read from stdin, so psql interpolates the variables into :'name') and return its rows."""
+    args = [arg for name, value in variables.items() for arg in ("-v", f"{name}={value}")]
+    proc = subprocess.run(psql_cmd("-tA", *args, "-f", "-"), input=sql, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise StageFailed(f"psql exited with {proc.returncode}\n{(proc.stdout + proc.stderr).strip()}")
+    return [line for line in proc.stdout.splitlines() if line]
+
+
+def init_progress():
+    query("""
+        CREATE TABLE IF NOT EXISTS load_progress (
+            stage        TEXT PRIMARY KEY,
+            seconds      DOUBLE PRECISION NOT NULL,
+            finished_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+
+
+def finished_stages() -> Dict[str, float]:
+    return {stage: float(seconds) for stage, seconds in
+            (line.split("|") for line in query("SELECT stage, seconds FROM load_progress;"))}
+
+
+def mark_finished(stage: str, seconds: float):
+    query("""
+        INSERT INTO load_progress (stage, seconds) VALUES (:'stage', :'seconds')
+        ON CONFLICT (stage) DO UPDATE SET seconds = EXCLUDED.seconds, finished_at = now();
+    """, stage=stage, seconds=str(seconds))
+
+
+def forget(stages: List[str]):
+    # stage names come from build_stages - none of them has a comma
+    if stages:
+        query("DELETE FROM load_progress WHERE stage = ANY(string_to_array(:'stages', ','));", stages=",".join(stages))
+
+
+def downstream(stages: List[Stage], roots: List[str]) -> List[str]:
+    """The stages in roots and every stage that (transitively) runs after them."""
+    selected = set(roots)
+    changed = True
+    while changed:
+        changed = False
+        for stage in stages:
+            if stage.name not in selected and selected.intersection(stage.after):
+                selected.add(stage.name)
+                changed = True
+    return [s.name for s in stages if s.name in selected]
+
+
+# --- scheduling ---
+
+def run_stages(stages: List[Stage], done: Dict[str, float], jobs: int, timings: Dict[str, float]):
+    """Run every stage not in `done` once its dependencies are, recording timings as they finish."""
+    pending = {s.name: s for s in stages if s.name not in done}
+    finished = set(done)
+    failure: Optional[StageFailed] = None
+
+    def execute(stage: Stage) -> float:
+        log(f"start  {stage.name}")
+        start = time.perf_counter()
+        stage.run()
+        seconds = time.perf_counter() - start
+        mark_finished(stage.name, seconds)
+        log(f"done   {stage.name} ({seconds:.1f}s)")
+        return seconds
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+        while pending or running:
+            if failure is None:
+                for name, stage in list(pending.items()):
+                    if len(running) < jobs and all(dep in finished for dep in stage.after):
+                        running[pool.submit(execute, stage)] = name
+                        del pending[name]
+            if not running:
+                break
+
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                name = running.pop(future)
+                try:
+                    timings[name] = future.result()
+                    finished.add(name)
+                except Exception as e:  # the stage itself, or recording its checkpoint
+                    log(f"FAILED {name}")
+                    failure = failure or (e if isinstance(e, StageFailed) else StageFailed(f"{name}: {e!r}"))
+
+    if failure:
+        raise failure
+
+
+def report(stages: List[Stage], done: Dict[str, float], timings: Dict[str, float], wall: float):
+    print(f"\n{'stage':<40} {'seconds':>9}  status")
+    for stage in stages:
+        if stage.name in timings:
+            print(f"{stage.name:<40} {timings[stage.name]:>9.1f}  done")
+        elif stage.name in done:
+            print(f"{stage.name:<40} {done[stage.name]:>9.1f}  done earlier")
+        else:
+            print(f"{stage.name:<40} {'-':>9}  not run")
+    print(f"{'total (wall clock)':<40} {wall:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=4, help="stages run at once")
+    parser.add_argument("--maintenance-work-mem", default="256MB", help="per index build")
+    parser.add_argument("--restart", action="store_true", help="ignore earlier progress and build everything")
+    parser.add_argument("--redo", nargs="+", default=[], metavar="STAGE", help="rerun these stages and what follows them")
+    parser.add_argument("--list", action="store_true", help="list the stages and exit")
+    args = parser.parse_args()
+
+    os.environ["PGPASSWORD"] = PGPASSWORD
+    stages = build_stages(args.maintenance_work_mem)
+
+    if args.list:
+        for stage in stages:
+            print(f"{stage.name:<40} after: {', '.join(stage.after) or '-'}")
+        return 0
+    unknown = set(args.redo) - {s.name for s in stages}
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))} (see --list)")
+
+    query("CREATE EXTENSION IF NOT EXISTS postgis;")
+    init_progress()
+    if args.restart:
+        query("TRUNCATE load_progress;")
+    forget(downstream(stages, args.redo))
+
+    done = finished_stages()
+    if done:
+        log(f"resuming - {len(done)} of {len(stages)} stages already done")
+
+    timings: Dict[str, float] = {}
+    try:
+        run_stages(stages, done, args.jobs, timings)
+    except StageFailed as e:
+        print(f"\n{e}", file=sys.stderr)
+        report(stages, done, timings, time.perf_counter() - _started)
+        print("\nRerun the loader to resume from the failed stage.", file=sys.stderr)
+        return 1
+
+    report(stages, done, timings, time.perf_counter() - _started)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+-- name_key(): the normalized form region and road names are matched on - lowercased, trimmed, runs
+-- of whitespace folded to one space. final_db_updates.sql and sa_regions.sql store it next to the
+-- names (vicmap_road.road_key / sa2_key / ..., sa_region.sa_key / ...) with btree indexes, and the
+-- API compares `<col>_key = name_key(:name)`, so a case-insensitive lookup is an index seek.
+-- keep in sync with name_key() in backend/names.py
+-- run once before final_db_updates.sql and sa_regions.sql (loader.py does)
+
+CREATE OR REPLACE FUNCTION name_key(name TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE STRICT PARALLEL SAFE
+AS $$
+    SELECT lower(btrim(regexp_replace(name, '\s+', ' ', 'g')))
+$$;
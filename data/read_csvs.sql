@@ -9,10 +9,13 @@ ALTER SYSTEM SET shared_buffers = '512MB';
 SELECT pg_reload_conf();
 
 -- accident/crash data
+-- range-partitioned by accident_date, one partition per year (accident_y2012, ...) - date-bounded
+-- queries only read the years they cover, and a new release only rewrites the years it changes.
+-- partitions are created on demand by ensure_accident_partitions() (see ingest_crashes.sql)
 DROP TABLE IF EXISTS accident;
 CREATE TABLE accident (
-    accident_no        CHAR(12) PRIMARY KEY,  
-    accident_date      DATE,
+    accident_no        CHAR(12) NOT NULL,
+    accident_date      DATE NOT NULL,
     accident_time      TIME,
     accident_type      VARCHAR(100),          
     day_of_week        VARCHAR(30),
@@ -26,13 +29,8 @@ CREATE TABLE accident (
     run_offroad        VARCHAR(3),
     road_name          VARCHAR(50),
     road_type          VARCHAR(22),
-    road_route_1       INTEGER,
-    lga_name           VARCHAR(100),
-    dtp_region         VARCHAR(35),
     latitude           DECIMAL(10,6),
     longitude          DECIMAL(10,6),
-    vicgrid_x          NUMERIC(20,6),
-    vicgrid_y          NUMERIC(20,6),
     total_persons      INTEGER,
     inj_or_fatal       INTEGER,
     fatality           INTEGER,
@@ -62,7 +60,11 @@ CREATE TABLE accident (
     srns               VARCHAR(1),
     rma                VARCHAR(16),
     divided            VARCHAR(9),
-    stat_div_name      VARCHAR(40),
+
+    -- region codes, stamped by accident_regions.sql
+    sa2_code21         INTEGER,
+    sa3_code21         INTEGER,
+    sa4_code21         INTEGER,
 
     -- Generated geometry fields (WGS84: EPSG 4326)
     geom geometry(Point, 7844)
@@ -73,36 +75,22 @@ CREATE TABLE accident (
             END
         ) STORED,
 
+    -- same point in GDA2020 / Vicgrid (EPSG 7899), metres - for distance predicates without geography casts
+    geom_vg geometry(Point, 7899)
+        GENERATED ALWAYS AS (
+            CASE
+              WHEN longitude IS NULL OR latitude IS NULL THEN NULL
+              ELSE ST_Transform(ST_SetSRID(ST_MakePoint(longitude, latitude), 7844), 7899)
+            END
+        ) STORED,
+
     -- check
     CONSTRAINT chk_lat CHECK (latitude  IS NULL OR (latitude  BETWEEN -90  AND 90)),
-    CONSTRAINT chk_lon CHECK (longitude IS NULL OR (longitude BETWEEN -180 AND 180))
-);
+    CONSTRAINT chk_lon CHECK (longitude IS NULL OR (longitude BETWEEN -180 AND 180)),
 
--- indexes
-CREATE INDEX crash_date_idx ON accident(accident_date);
-CREATE INDEX crash_geom_gix ON accident USING GIST (geom);
-
-COPY accident 
---FROM '/data/crash_data_2020_2024_clean.csv'
-from '/data/victorian_road_crash_data.csv'
-WITH (
-    FORMAT csv,
-    HEADER true,
-    DELIMITER ',',
-    NULL ''
-);
-
--- drop unwanted columns
-BEGIN;
-
-ALTER TABLE accident DROP COLUMN road_route_1;
-ALTER TABLE accident DROP COLUMN lga_name;
-ALTER TABLE accident DROP COLUMN dtp_region;
-ALTER TABLE accident DROP COLUMN vicgrid_x;
-ALTER TABLE accident DROP COLUMN vicgrid_y;
-ALTER TABLE accident DROP COLUMN stat_div_name;
-
-COMMIT;
+    -- the partition key has to be part of the key; accident_no alone is still unique
+    PRIMARY KEY (accident_no, accident_date)
+) PARTITION BY RANGE (accident_date);
 
 -- person
 DROP TABLE IF EXISTS person;
@@ -121,21 +109,9 @@ CREATE TABLE person (
     licence_state       char(1),
     taken_hospital      char(1),                    
     ejected_code        char(1),                    
-    PRIMARY KEY (accident_no, person_id),
-    FOREIGN KEY (accident_no) REFERENCES accident(accident_no) on delete cascade
-);
-
--- index
-CREATE INDEX person_accident_idx ON person(accident_no);
-CREATE INDEX person_role_idx     ON person(road_user_type);
-CREATE INDEX person_injury_idx   ON person(inj_level);
-
-COPY person
-FROM '/data/person.csv'
-WITH (
-    FORMAT csv,
-    HEADER true,
-    NULL ''
+    PRIMARY KEY (accident_no, person_id)
+    -- no foreign key to accident: its key now includes accident_date. ingest_crashes.sql replaces
+    -- a crash's persons whenever the crash changes
 );
 
 -- atmos
@@ -145,10 +121,104 @@ CREATE TABLE accident_conditions (
     accident_no char(12) not null,
     atmosph_cond INTEGER,
     atmosph_cond_seq INTEGER,
-    atmosph_cond_desc TEXT,
-    FOREIGN KEY (accident_no) REFERENCES accident(accident_no) on delete cascade
+    atmosph_cond_desc TEXT
 );
 
-COPY accident_conditions(accident_no, atmosph_cond, atmosph_cond_seq, atmosph_cond_desc)
+-- the tables above start out empty, so everything derived from the previous load goes too: the
+-- crash fingerprints (ingest_crashes.sql would otherwise see every crash as unchanged and insert
+-- nothing), and the road snaps and rollups (their scripts recreate and refill them afterwards)
+DROP TABLE IF EXISTS accident_row_hash, accident_road_snap, crash_daily, crash_grid;
+
+-- staging: every release is copied here first and merged by ingest_crashes.sql, which only
+-- writes the crashes that are new or changed (so this first load and later refreshes share a path)
+DROP TABLE IF EXISTS accident_staging, person_staging, accident_conditions_staging;
+
+-- the CSV's columns, including the ones accident doesn't keep
+CREATE UNLOGGED TABLE accident_staging (
+    accident_no        CHAR(12) PRIMARY KEY,
+    accident_date      DATE NOT NULL,
+    accident_time      TIME,
+    accident_type      VARCHAR(100),
+    day_of_week        VARCHAR(30),
+    dca_code           CHAR(3),
+    dca_code_description VARCHAR(100),
+    light_condition    VARCHAR(100),
+    police_attend      VARCHAR(100),
+    road_geometry      VARCHAR(100),
+    severity           VARCHAR(100),
+    speed_zone         VARCHAR(100),
+    run_offroad        VARCHAR(3),
+    road_name          VARCHAR(50),
+    road_type          VARCHAR(22),
+    road_route_1       INTEGER,
+    lga_name           VARCHAR(100),
+    dtp_region         VARCHAR(35),
+    latitude           DECIMAL(10,6),
+    longitude          DECIMAL(10,6),
+    vicgrid_x          NUMERIC(20,6),
+    vicgrid_y          NUMERIC(20,6),
+    total_persons      INTEGER,
+    inj_or_fatal       INTEGER,
+    fatality           INTEGER,
+    seriousinjury      INTEGER,
+    otherinjury        INTEGER,
+    noninjured         INTEGER,
+    males              INTEGER,
+    females            INTEGER,
+    bicyclist          INTEGER,
+    passenger          INTEGER,
+    driver             INTEGER,
+    pedestrian         INTEGER,
+    pillion            INTEGER,
+    motorcyclist       INTEGER,
+    unknown            INTEGER,
+    ped_cyclist_5_12   INTEGER,
+    ped_cyclist_13_18  INTEGER,
+    old_ped_65_over    INTEGER,
+    old_driver_75_over INTEGER,
+    young_driver_18_25 INTEGER,
+    no_of_vehicles     INTEGER,
+    heavyvehicle       INTEGER,
+    passengervehicle   INTEGER,
+    motorcycle         INTEGER,
+    pt_vehicle         INTEGER,
+    deg_urban_name     VARCHAR(40),
+    srns               VARCHAR(1),
+    rma                VARCHAR(16),
+    divided            VARCHAR(9),
+    stat_div_name      VARCHAR(40)
+);
+
+CREATE UNLOGGED TABLE person_staging (LIKE person INCLUDING DEFAULTS);
+CREATE UNLOGGED TABLE accident_conditions_staging (LIKE accident_conditions INCLUDING DEFAULTS);
+
+COPY accident_staging
+--FROM '/data/crash_data_2020_2024_clean.csv'
+from '/data/victorian_road_crash_data.csv'
+WITH (
+    FORMAT csv,
+    HEADER true,
+    DELIMITER ',',
+    NULL ''
+);
+
+COPY person_staging
+FROM '/data/person.csv'
+WITH (
+    FORMAT csv,
+    HEADER true,
+    NULL ''
+);
+
+COPY accident_conditions_staging(accident_no, atmosph_cond, atmosph_cond_seq, atmosph_cond_desc)
 FROM '/data/atmospheric_cond.csv'
 DELIMITER ',' CSV HEADER;
+
+\ir ingest_crashes.sql
+
+-- indexes - built once the data is in, which is much faster than maintaining them while loading
+-- (loader.py builds them itself, in parallel, and passes -v skip_indexes=1)
+\if :{?skip_indexes}
+\else
+\ir crash_indexes.sql
+\endif
@@ -0,0 +1,112 @@
+-- precomputed SA2/SA3/SA4 region boundaries
+-- one dissolved geometry per region, so the API never has to ST_Union mesh blocks per request
+-- plus topology-preserving simplified copies of each boundary for map display (sa_region_simplified)
+-- (re)build after every mesh block import with (name_key.sql must have been run once):
+--   psql -U postgres -d strek -f /data/sa_regions.sql
+
+BEGIN;
+
+DROP TABLE IF EXISTS sa_region_simplified;
+DROP TABLE IF EXISTS sa_region;
+CREATE TABLE sa_region (
+    sa_level      VARCHAR(3)  NOT NULL,   -- 'sa2' | 'sa3' | 'sa4'
+    sa_code       INTEGER     NOT NULL,   -- ABS code of the region at sa_level
+    sa_name       VARCHAR(50) NOT NULL,
+
+    -- the region itself and its parents (NULL below sa_level)
+    sa2_name21    VARCHAR(50),
+    sa3_name21    VARCHAR(50),
+    sa4_name21    VARCHAR(50),
+
+    -- normalized names the API matches on (see name_key.sql)
+    sa_key        TEXT GENERATED ALWAYS AS (name_key(sa_name)) STORED,
+    sa2_key       TEXT GENERATED ALWAYS AS (name_key(sa2_name21)) STORED,
+    sa3_key       TEXT GENERATED ALWAYS AS (name_key(sa3_name21)) STORED,
+    sa4_key       TEXT GENERATED ALWAYS AS (name_key(sa4_name21)) STORED,
+
+    geom          geometry(MultiPolygon, 7844) NOT NULL,
+    area_sq_km    DOUBLE PRECISION,
+    centroid_lat  DOUBLE PRECISION,
+    centroid_lon  DOUBLE PRECISION,
+
+    PRIMARY KEY (sa_level, sa_code)
+);
+
+-- SA2s are dissolved from mesh blocks...
+INSERT INTO sa_region (sa_level, sa_code, sa_name, sa2_name21, sa3_name21, sa4_name21, geom)
+SELECT 'sa2',
+       mbv.sa2_code21::int,
+       mbv.sa2_name21,
+       mbv.sa2_name21,
+       mbv.sa3_name21,
+       mbv.sa4_name21,
+       ST_Multi(ST_CollectionExtract(ST_Union(mbv.geom), 3))
+FROM mesh_block_vic_21 mbv
+WHERE mbv.geom IS NOT NULL
+  AND mbv.sa2_name21 IS NOT NULL
+GROUP BY mbv.sa2_code21, mbv.sa2_name21, mbv.sa3_name21, mbv.sa4_name21;
+
+-- ...and SA3s/SA4s from the (much fewer) SA2 polygons
+INSERT INTO sa_region (sa_level, sa_code, sa_name, sa3_name21, sa4_name21, geom)
+SELECT 'sa3',
+       mbv.sa3_code21::int,
+       s.sa3_name21,
+       s.sa3_name21,
+       s.sa4_name21,
+       ST_Multi(ST_CollectionExtract(ST_Union(s.geom), 3))
+FROM sa_region s
+JOIN (SELECT DISTINCT sa3_code21, sa3_name21 FROM mesh_block_vic_21) mbv
+  ON mbv.sa3_name21 = s.sa3_name21
+WHERE s.sa_level = 'sa2'
+GROUP BY mbv.sa3_code21, s.sa3_name21, s.sa4_name21;
+
+INSERT INTO sa_region (sa_level, sa_code, sa_name, sa4_name21, geom)
+SELECT 'sa4',
+       mbv.sa4_code21::int,
+       s.sa4_name21,
+       s.sa4_name21,
+       ST_Multi(ST_CollectionExtract(ST_Union(s.geom), 3))
+FROM sa_region s
+JOIN (SELECT DISTINCT sa4_code21, sa4_name21 FROM mesh_block_vic_21) mbv
+  ON mbv.sa4_name21 = s.sa4_name21
+WHERE s.sa_level = 'sa3'
+GROUP BY mbv.sa4_code21, s.sa4_name21;
+
+UPDATE sa_region
+SET area_sq_km   = ST_Area(geom::geography)/1000000,
+    centroid_lat = ST_Y(ST_Centroid(ST_Transform(geom, 4326))),
+    centroid_lon = ST_X(ST_Centroid(ST_Transform(geom, 4326)));
+
+-- indexes
+CREATE INDEX idx_sa_region_geom ON sa_region USING GIST (geom);
+CREATE INDEX idx_sa_region_name ON sa_region(sa_level, sa_key);
+CREATE INDEX idx_sa_region_sa3 ON sa_region(sa_level, sa3_key);
+CREATE INDEX idx_sa_region_sa4 ON sa_region(sa_level, sa4_key);
+
+-- simplified boundaries, one row per region and resolution (tolerances in degrees, GDA2020):
+--   1 = high   (~10 m)  - suburb-level zooms
+--   2 = medium (~50 m)  - SA3 views
+--   3 = low    (~200 m) - SA4 / state-wide views
+-- full resolution stays in sa_region.geom
+CREATE TABLE sa_region_simplified (
+    sa_level      VARCHAR(3)  NOT NULL,
+    sa_code       INTEGER     NOT NULL,
+    resolution    SMALLINT    NOT NULL,
+    geom          geometry(MultiPolygon, 7844) NOT NULL,
+
+    PRIMARY KEY (sa_level, sa_code, resolution),
+    FOREIGN KEY (sa_level, sa_code) REFERENCES sa_region(sa_level, sa_code) ON DELETE CASCADE
+);
+
+INSERT INTO sa_region_simplified (sa_level, sa_code, resolution, geom)
+SELECT s.sa_level,
+       s.sa_code,
+       t.resolution,
+       ST_Multi(ST_CollectionExtract(ST_SimplifyPreserveTopology(s.geom, t.tolerance), 3))
+FROM sa_region s
+CROSS JOIN (VALUES (1, 0.0001), (2, 0.0005), (3, 0.002)) AS t(resolution, tolerance);
+
+COMMIT;
+
+ANALYZE sa_region;
+ANALYZE sa_region_simplified;
@@ -0,0 +1,31 @@
+from cache import _MISSING, ResponseCache
+
+
+def test_new_version_clears_the_cache():
+    cache = ResponseCache(10 ** 6)
+    cache.get("a", "v1")
+    cache.put("a", 1, "v1")
+    assert cache.get("a", "v1") == 1
+    assert cache.get("a", "v2") is _MISSING
+
+
+def test_late_put_under_the_old_version_is_dropped():
+    # a request that started before a data load and finishes after it
+    cache = ResponseCache(10 ** 6)
+    cache.get("a", "v1")
+    cache.get("b", "v2")
+    cache.put("b", 2, "v2")
+    cache.put("a", 1, "v1")
+
+    assert cache.get("b", "v2") == 2
+    assert cache.stats()["version"] == "v2"
+
+
+def test_old_version_never_moves_the_cache_back():
+    cache = ResponseCache(10 ** 6)
+    cache.get("a", "v1")
+    cache.get("b", "v2")
+    cache.put("b", 2, "v2")
+
+    assert cache.get("b", "v1") is _MISSING
+    assert cache.get("b", "v2") == 2
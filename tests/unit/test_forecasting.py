@@ -0,0 +1,95 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import forecasting  # noqa: E402
+
+YEARS = list(range(2012, 2024))
+
+
+def test_z_score():
+    assert forecasting.z_score(0.95) == pytest.approx(1.959964, abs=1e-6)
+    assert forecasting.z_score(0.8) == pytest.approx(1.281552, abs=1e-6)
+
+
+def test_ols_matches_closed_form():
+    rng = np.random.default_rng(1)
+    ys = np.array([50 + 3 * i + rng.normal(0, 4) for i in range(len(YEARS))])
+    yhat, se = forecasting.fit_yearly("ols", YEARS, ys[None, :], 2025)
+
+    # textbook simple regression and its prediction standard error
+    x = np.array(YEARS, dtype=float)
+    n = len(x)
+    sxx = ((x - x.mean()) ** 2).sum()
+    b = ((x - x.mean()) * (ys - ys.mean())).sum() / sxx
+    a = ys.mean() - b * x.mean()
+    s2 = ((ys - (a + b * x)) ** 2).sum() / (n - 2)
+    expected_se = math.sqrt(s2 * (1 + 1 / n + (2025 - x.mean()) ** 2 / sxx))
+
+    assert yhat[0] == pytest.approx(a + b * 2025)
+    assert se[0] == pytest.approx(expected_se)
+
+
+def test_ols_exact_line_has_no_error():
+    ys = np.array([[10.0 + 2 * i for i in range(len(YEARS))]])
+    yhat, se = forecasting.fit_yearly("ols", YEARS, ys, 2024)
+    assert yhat[0] == pytest.approx(10.0 + 2 * len(YEARS))
+    assert se[0] == pytest.approx(0, abs=1e-6)
+
+
+def test_mean_matches_closed_form():
+    ys = np.array([[4.0, 7.0, 5.0, 8.0, 6.0]])
+    yhat, se = forecasting.fit_yearly("mean", list(range(2019, 2024)), ys, 2026)
+    s = ys[0].std(ddof=1)
+    assert yhat[0] == pytest.approx(6.0)
+    assert se[0] == pytest.approx(s * math.sqrt(1 + 1 / 5))
+
+
+def test_series_are_fitted_independently():
+    rng = np.random.default_rng(2)
+    ys = rng.poisson(40, size=(5, len(YEARS))).astype(float)
+    batched, batched_se = forecasting.fit_yearly("ols", YEARS, ys, 2025)
+    for i in range(len(ys)):
+        one, one_se = forecasting.fit_yearly("ols", YEARS, ys[i:i + 1], 2025)
+        assert batched[i] == pytest.approx(one[0])
+        assert batched_se[i] == pytest.approx(one_se[0])
+
+
+def test_poisson_recovers_exponential_trend():
+    x = np.array(YEARS, dtype=float) - np.mean(YEARS)
+    ys = 30 * np.exp(0.1 * x)
+    yhat, _ = forecasting.fit_yearly("poisson", YEARS, ys[None, :], 2026)
+    assert yhat[0] == pytest.approx(30 * math.exp(0.1 * (2026 - np.mean(YEARS))), rel=1e-6)
+
+
+def test_poisson_solves_score_equations():
+    # the maximum likelihood fit matches the observed total and the observed x-weighted total
+    rng = np.random.default_rng(3)
+    ys = rng.poisson(25, size=len(YEARS)).astype(float)
+    mu = np.array([forecasting.fit_yearly("poisson", YEARS, ys[None, :], year)[0][0] for year in YEARS])
+    x = np.array(YEARS, dtype=float)
+    assert (ys - mu).sum() == pytest.approx(0, abs=1e-6)
+    assert (x * (ys - mu)).sum() == pytest.approx(0, abs=1e-4)
+
+
+def test_seasonal_recovers_trend_and_season():
+    season = np.array([5, -3, 0, 2, 1, -4, 6, 0, -2, 3, -1, -7], dtype=float)
+    months = np.arange(12 * 6)
+    ys = 100 + 0.5 * months + season[months % 12]
+    yhat, se = forecasting.fit_seasonal(2018, ys[None, :], 2025)
+
+    target = np.arange(12 * 7, 12 * 8)  # 2025's months, counted from January 2018
+    assert yhat[0] == pytest.approx((100 + 0.5 * target + season).sum())
+    assert se[0] == pytest.approx(0, abs=1e-6)
+
+
+def test_forecast_intervals_are_ordered_and_non_negative():
+    rng = np.random.default_rng(4)
+    series = np.vstack([rng.poisson(3, len(YEARS)), rng.poisson(300, len(YEARS))]).astype(float)
+    for method in ("ols", "mean", "poisson"):
+        result = forecasting.forecast(method, YEARS[0], YEARS[-1], 2025, series, 0.9)
+        assert (result["lower"] >= 0).all()
+        assert (result["lower"] <= result["forecast"]).all()
+        assert (result["forecast"] <= result["upper"]).all()
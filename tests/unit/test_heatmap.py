@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+
+from api.heatmap import cell_for_zoom, next_month, parse_bbox, split_months
+
+
+@pytest.mark.parametrize("day, expected", [
+    (date(2024, 1, 1), date(2024, 2, 1)),
+    (date(2024, 1, 31), date(2024, 2, 1)),
+    (date(2024, 2, 29), date(2024, 3, 1)),
+    (date(2023, 12, 15), date(2024, 1, 1)),
+])
+def test_next_month(day, expected):
+    assert next_month(day) == expected
+
+
+def test_split_whole_months():
+    assert split_months(date(2023, 11, 1), date(2024, 1, 31)) == ((date(2023, 11, 1), date(2024, 2, 1)), [])
+
+
+def test_split_across_year_boundary():
+    months, partial = split_months(date(2023, 12, 15), date(2024, 2, 10))
+    assert months == (date(2024, 1, 1), date(2024, 2, 1))
+    assert partial == [(date(2023, 12, 15), date(2023, 12, 31)), (date(2024, 2, 1), date(2024, 2, 10))]
+
+
+def test_split_ending_on_new_years_eve():
+    assert split_months(date(2023, 12, 1), date(2023, 12, 31)) == ((date(2023, 12, 1), date(2024, 1, 1)), [])
+
+
+def test_split_partial_start_only():
+    months, partial = split_months(date(2024, 2, 10), date(2024, 4, 30))
+    assert months == (date(2024, 3, 1), date(2024, 5, 1))
+    assert partial == [(date(2024, 2, 10), date(2024, 2, 29))]
+
+
+@pytest.mark.parametrize("start, end", [
+    (date(2024, 3, 5), date(2024, 3, 20)),   # inside one month
+    (date(2024, 1, 15), date(2024, 2, 14)),  # straddling two, neither whole
+    (date(2024, 3, 1), date(2024, 3, 30)),   # a month short of its last day
+])
+def test_split_without_whole_months(start, end):
+    assert split_months(start, end) == (None, [(start, end)])
+
+
+def test_split_open_ended():
+    assert split_months(None, None) == ((None, None), [])
+    assert split_months(None, date(2024, 3, 15)) == ((None, date(2024, 3, 1)), [(date(2024, 3, 1), date(2024, 3, 15))])
+    assert split_months(date(2024, 3, 15), None) == ((date(2024, 4, 1), None), [(date(2024, 3, 15), date(2024, 3, 31))])
+
+
+def test_split_covers_every_day_once():
+    start, end = date(2022, 11, 17), date(2024, 2, 3)
+    (month_from, month_until), partial = split_months(start, end)
+    days = (month_until - month_from).days + sum((b - a).days + 1 for a, b in partial)
+    assert days == (end - start).days + 1
+    assert all(b < month_from or a >= month_until for a, b in partial)
+
+
+def test_cell_for_zoom():
+    assert cell_for_zoom(3) == 20000
+    assert cell_for_zoom(10) == 2000
+    assert cell_for_zoom(18) == 250
+
+
+def test_parse_bbox():
+    assert parse_bbox("144.9,-37.9,145.1,-37.7") == (144.9, -37.9, 145.1, -37.7)
+    for bad in ("144.9,-37.9,145.1", "a,b,c,d", "145.1,-37.9,144.9,-37.7"):
+        with pytest.raises(HTTPException):
+            parse_bbox(bad)
@@ -0,0 +1,108 @@
+import math
+import struct
+import zlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import kde  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+from api.heatmap import parse_bbox  # noqa: E402
+
+
+def test_mercator():
+    assert kde.mercator(0, 0) == pytest.approx((0, 0), abs=1e-6)
+    x, _ = kde.mercator(180, 0)
+    assert x == pytest.approx(math.pi * kde.EARTH_RADIUS)
+    # symmetric about the equator
+    assert kde.mercator(145, -37.8)[1] == pytest.approx(-kde.mercator(145, 37.8)[1])
+
+
+@pytest.mark.parametrize("sigma_px", [0.4, 1, 2.5, 10])
+def test_kernel_has_unit_mass(sigma_px):
+    kernel = kde.gaussian_kernel(sigma_px)
+    assert kernel.sum() == pytest.approx(1)
+    assert kernel.shape[0] == kernel.shape[1] and kernel.shape[0] % 2 == 1
+    assert np.allclose(kernel, kernel.T) and np.allclose(kernel, kernel[::-1, ::-1])
+    centre = kernel.shape[0] // 2
+    assert kernel[centre, centre] == kernel.max()
+
+
+def test_convolve_matches_direct_sum():
+    rng = np.random.default_rng(5)
+    counts = rng.poisson(1, size=(23, 31)).astype(float)
+    kernel = kde.gaussian_kernel(1.5)
+    r = kernel.shape[0] // 2
+
+    padded = np.pad(counts, r)
+    direct = np.zeros_like(counts)
+    for dy in range(kernel.shape[0]):
+        for dx in range(kernel.shape[1]):
+            direct += kernel[dy, dx] * padded[dy:dy + counts.shape[0], dx:dx + counts.shape[1]]
+
+    assert np.allclose(kde.convolve(counts, kernel), direct, atol=1e-9)
+
+
+def test_density_keeps_each_crash_mass_and_puts_north_first():
+    margin, sigma_px, pixel_km2 = 8, 2, 0.25
+    counts = np.zeros((20 + 2 * margin, 30 + 2 * margin))
+    counts[margin + 8, margin + 15] = 4  # 4 crashes in the south half, clear of the edges
+
+    values = kde.density(counts, sigma_px, margin, pixel_km2)
+    assert values.shape == (20, 30)
+    assert values.sum() * pixel_km2 == pytest.approx(4, rel=1e-3)
+    assert np.unravel_index(values.argmax(), values.shape) == (20 - 1 - 8, 15)
+
+
+def test_density_counts_crashes_outside_the_raster():
+    margin = 6
+    counts = np.zeros((10 + 2 * margin, 10 + 2 * margin))
+    counts[margin + 5, margin - 1] = 1  # a pixel west of the raster
+    values = kde.density(counts, 2, margin, 1)
+    assert values[:, 0].sum() > values[:, -1].sum() > 0
+
+
+def test_to_uint16():
+    values = np.array([[0, 5, 10, 20]], dtype=float)
+    assert kde.to_uint16(values, 10).tolist() == [[0, 32768, 65535, 65535]]
+    assert kde.to_uint16(values, 0).tolist() == [[0, 0, 0, 0]]
+
+
+def test_colorize_ramp_ends():
+    image = kde.colorize(np.array([[0.0, 1.0]]), 1.0)
+    assert image.shape == (1, 2, 4) and image.dtype == np.uint8
+    assert tuple(image[0, 0]) == kde.RAMP[0][1]
+    assert tuple(image[0, 1]) == kde.RAMP[-1][1]
+
+
+def test_encode_png_round_trip():
+    rng = np.random.default_rng(6)
+    image = rng.integers(0, 256, size=(7, 5, 4), dtype=np.uint8)
+    png = kde.encode_png(image)
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+
+    chunks, pos = {}, 8
+    while pos < len(png):
+        (length,) = struct.unpack(">I", png[pos:pos + 4])
+        kind, data = png[pos + 4:pos + 8], png[pos + 8:pos + 8 + length]
+        (crc,) = struct.unpack(">I", png[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(kind + data)
+        chunks[kind] = data
+        pos += 12 + length
+
+    assert struct.unpack(">IIBBBBB", chunks[b"IHDR"]) == (5, 7, 8, 6, 0, 0, 0)
+    scanlines = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(7, 1 + 5 * 4)
+    assert (scanlines[:, 0] == 0).all()
+    assert (scanlines[:, 1:].reshape(7, 5, 4) == image).all()
+    assert chunks[b"IEND"] == b""
+
+
+@pytest.mark.parametrize("bbox", ["0,80,10,95", "0,-90,10,-80", "-181,-38,144,-37", "170,-38,181,-37"])
+def test_bbox_outside_web_mercator_is_rejected(bbox):
+    # latitudes past the limit would reach kde.mercator (a math domain error beyond 90)
+    with pytest.raises(HTTPException) as e:
+        parse_bbox(bbox)
+    assert e.value.status_code == 400
+    parse_bbox("-180,-85,180,85")
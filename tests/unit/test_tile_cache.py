@@ -0,0 +1,31 @@
+from tile_cache import TileCache
+
+
+def test_put_and_get(tmp_path):
+    cache = TileCache(str(tmp_path))
+    cache.put("v1", "sa2", 10, 1, 2, b"tile")
+    assert cache.get("v1", "sa2", 10, 1, 2) == b"tile"
+    assert cache.get("v1", "sa2", 10, 1, 3) is None
+    assert cache.get("v2", "sa2", 10, 1, 2) is None
+
+
+def test_prune_keeps_only_the_current_version(tmp_path):
+    # during a reload workers on either version store tiles side by side - writes never prune
+    new_worker, old_worker = TileCache(str(tmp_path)), TileCache(str(tmp_path))
+    old_worker.put("v1", "sa2", 10, 1, 2, b"old")
+    new_worker.put("v2", "sa2", 10, 1, 2, b"new")
+    old_worker.put("v1", "sa2", 10, 1, 3, b"old")
+    assert old_worker.get("v1", "sa2", 10, 1, 2) == b"old"
+    assert new_worker.get("v2", "sa2", 10, 1, 2) == b"new"
+
+    new_worker.prune("v2")
+    assert new_worker.get("v1", "sa2", 10, 1, 2) is None
+    assert new_worker.get("v2", "sa2", 10, 1, 2) == b"new"
+
+    # a straggler on the old version re-creating its directory doesn't touch the new tiles
+    old_worker.put("v1", "sa2", 10, 1, 4, b"old")
+    assert new_worker.get("v2", "sa2", 10, 1, 2) == b"new"
+
+
+def test_prune_without_a_cache_directory(tmp_path):
+    TileCache(str(tmp_path / "missing")).prune("v1")